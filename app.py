@@ -1,11 +1,11 @@
 import os
 import uuid
-from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_from_directory
+from datetime import datetime, timedelta
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_from_directory, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager, current_user
-from models import db, Customer, Service, Employee, Category, ServiceHistory, ServiceHistoryImage, Settings
+from models import db, Customer, Service, Employee, Category, ServiceHistory, ServiceHistoryImage, Settings, RevenueDaily
 from config import Config
 from werkzeug.utils import secure_filename
 from flask_moment import Moment
@@ -21,6 +21,52 @@ from cloudinary_utils import configure_cloudinary, upload_to_cloudinary, delete_
 # Import filters
 from filters import init_app as init_filters
 
+# Truy vấn dùng chung cho các danh sách lịch sử dịch vụ
+from history_queries import service_history_listing, service_history_feed, decode_history_cursor, history_date_criteria
+from timezone_utils import salon_today, BUCKET_GRANULARITIES
+
+# Tìm kiếm khách hàng không phân biệt dấu
+from customer_search import search_customers
+from birthdays import birthday_filter, upcoming_birthdays_query, days_until_birthday
+
+# Bảng doanh thu tổng hợp (cập nhật cùng transaction với lịch sử dịch vụ)
+from revenue_rollup import revenue_cli
+from revenue_series import revenue_series, split_labels, SPLIT_COLUMNS
+
+# Bộ đếm cho trang chủ
+from dashboard_counters import counters_cli, read_dashboard_stats
+
+# Cache cài đặt
+from settings_cache import get_settings, load_settings, invalidate_settings
+
+# Gợi ý khi nhập (typeahead) cho form lịch sử dịch vụ
+from typeahead import TYPEAHEAD_SOURCES, TYPEAHEAD_LIMIT, TYPEAHEAD_MAX_LIMIT
+
+# Nhập dữ liệu hàng loạt từ CSV/XLSX
+from bulk_import import import_cli, run_import, IMPORT_KINDS, IMPORT_EXTENSIONS
+
+# Xuất lịch sử dịch vụ ra CSV
+from history_export import export_cli, iter_history_csv, gzip_chunks, export_filename
+
+# Biên nhận PDF
+from pdf_receipts import build_receipts
+
+# Import lưu trữ ảnh tải lên
+from storage import init_storage, get_storage, store_file, media_cli
+from image_uploads import upload_images, stored_locations, release_locations, release_images
+from media_serving import init_media_serving, send_media
+from responsive_images import send_resized_image
+import storage_gc  # lệnh flask media gc
+
+# Xóa khách hàng và chuyển lịch sử nhân viên bằng câu SQL hàng loạt
+from bulk_operations import delete_customer, reassign_employee
+
+# Đo thời gian SQL và render của request (bật bằng PROFILER_ENABLED)
+from request_profiler import init_profiler
+
+# Metrics Prometheus (/metrics)
+from metrics import init_metrics
+
 # This is a dummy comment to force re-parsing of the file.
 
 # Định nghĩa các phần mở rộng cho phép
@@ -33,6 +79,9 @@ def allowed_file(filename):
 app = Flask(__name__, static_url_path='')
 app.config.from_object(Config)
 
+# Metrics phải được khởi tạo trước database để engine dùng pool có đo thời gian chờ kết nối
+init_metrics(app)
+
 # Đảm bảo thư mục uploads được phục vụ tĩnh
 app.static_folder = 'static'
 app.static_url_path = ''
@@ -54,9 +103,23 @@ login_manager.login_view = 'login'
 # Khởi tạo Flask-Moment
 moment = Moment(app)
 
+# Lệnh CLI: flask revenue rebuild, flask counters reconcile, flask import customers|histories, flask export histories
+app.cli.add_command(revenue_cli)
+app.cli.add_command(counters_cli)
+app.cli.add_command(import_cli)
+app.cli.add_command(export_cli)
+app.cli.add_command(media_cli)
+
 # Cấu hình Cloudinary
 configure_cloudinary(app)
 
+# Cấu hình nơi lưu ảnh tải lên
+init_storage(app)
+init_media_serving(app)
+
+# Đo thời gian request
+init_profiler(app)
+
 # Tạo một user ảo để tương thích với code hiện tại
 class DummyUser:
     def __init__(self):
@@ -85,32 +148,17 @@ def inject_moment():
 # Context processor để cung cấp cài đặt cho tất cả các template
 @app.context_processor
 def inject_settings():
-    settings = Settings.query.first()
-    if not settings:
-        settings = Settings() # Tạo cài đặt mặc định nếu chưa có
-        db.session.add(settings)
-        db.session.commit()
-    return {'settings': settings}
+    # Bản sao cài đặt đã cache trong worker, không truy vấn bảng settings ở mỗi lần render
+    return {'settings': get_settings()}
 
 # Tạo thư mục uploads nếu chưa tồn tại
 if not os.path.exists(app.config['UPLOAD_FOLDER']):
     os.makedirs(app.config['UPLOAD_FOLDER'])
 
-# Route tĩnh cho thư mục uploads
+# Route tĩnh cho thư mục uploads (đường dẫn cũ, giữ lại cho các liên kết đã có)
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    print(f"\n=== DEBUG ===")
-    print(f"Requested filename: {filename}")
-    print(f"Upload folder: {app.config['UPLOAD_FOLDER']}")
-    full_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    print(f"Full path: {full_path}")
-    print(f"File exists: {os.path.exists(full_path)}")
-    
-    try:
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
-    except Exception as e:
-        print(f"Error serving {filename}: {str(e)}")
-        return str(e), 404
+    return send_media(filename)
 
 # Tạo một đối tượng user ảo
 def get_current_user():
@@ -123,17 +171,16 @@ def get_current_user():
 def index():
     # Không cần đăng nhập
     
-    # Lấy thống kê
-    total_customers = Customer.query.count()
-    total_employees = Employee.query.count()
-    total_services = Service.query.count()
-    total_service_history = ServiceHistory.query.count()
+    # Lấy thống kê từ bộ đếm, không chạy COUNT(*) trên các bảng
+    stats = read_dashboard_stats()
     
     return render_template('index.html',
-                         total_customers=total_customers,
-                         total_employees=total_employees,
-                         total_services=total_services,
-                         total_service_history=total_service_history)
+                         total_customers=stats['customers'],
+                         total_employees=stats['employees'],
+                         total_services=stats['services'],
+                         total_service_history=stats['service_histories'],
+                         today_visits=stats['today_visits'],
+                         today_revenue=stats['today_revenue'])
 
 # Routes cho quản lý khách hàng
 @app.route('/customers')
@@ -143,20 +190,14 @@ def customer_list():
     birth_day = request.args.get('birth_day', type=int)
     birth_month = request.args.get('birth_month', type=int)
 
-    query = Customer.query
-
     if search:
-        query = query.filter(or_(
-            Customer.name.ilike(f'%{search}%'),
-            Customer.phone.ilike(f'%{search}%')
-        ))
+        # Tìm theo tên không dấu hoặc số điện thoại, xếp theo độ giống
+        query = search_customers(search)
+    else:
+        query = Customer.query.order_by(Customer.name.asc())
     
     if birth_month:
-        query = query.filter(db.extract('month', Customer.birth_date) == birth_month)
-        if birth_day:
-            query = query.filter(db.extract('day', Customer.birth_date) == birth_day)
-
-    query = query.order_by(Customer.name.asc())
+        query = query.filter(birthday_filter(birth_month, birth_day))
 
     pagination = query.paginate(
         page=page, per_page=app.config['ITEMS_PER_PAGE'], error_out=False)
@@ -278,7 +319,7 @@ def customer_view(id):
     
     # Thêm phân trang cho lịch sử dịch vụ
     page = request.args.get('page', 1, type=int)
-    pagination = ServiceHistory.query.filter_by(customer_id=id).order_by(ServiceHistory.service_date.desc()).paginate(page=page, per_page=app.config['ITEMS_PER_PAGE'])
+    pagination = service_history_listing(customer_id=id).paginate(page=page, per_page=app.config['ITEMS_PER_PAGE'])
     
     return render_template('customers/view.html', 
                          customer=customer, 
@@ -288,14 +329,85 @@ def customer_view(id):
 def customer_delete(id):
     customer = Customer.query.get_or_404(id)
     try:
-        db.session.delete(customer)
+        # Xóa cả lịch sử dịch vụ và ảnh của khách hàng bằng các câu SQL hàng loạt
+        deleted_histories = delete_customer(customer.id)
+        if deleted_histories is None:
+            # Khách hàng vừa bị xóa bởi một request khác
+            db.session.rollback()
+            flash('Khách hàng không tồn tại.', 'danger')
+            return redirect(url_for('customer_list'))
         db.session.commit()
-        flash('Xóa khách hàng thành công!', 'success')
+        flash(f'Xóa khách hàng thành công! (kèm {deleted_histories} lịch sử dịch vụ)', 'success')
     except Exception as e:
         db.session.rollback()
         flash(f'Có lỗi xảy ra khi xóa khách hàng: {str(e)}', 'danger')
     return redirect(url_for('customer_list'))
 
+@app.route('/api/customers/upcoming-birthdays')
+def api_upcoming_birthdays():
+    # Số ngày tới cần xem (mặc định 7 ngày, tối đa 1 năm)
+    days = min(max(request.args.get('days', 7, type=int), 0), 366)
+    limit = min(max(request.args.get('limit', 500, type=int), 1), 5000)
+    today = salon_today()
+
+    customers = upcoming_birthdays_query(days, today).limit(limit).all()
+
+    return jsonify({
+        'success': True,
+        'days': days,
+        'customers': [{
+            'id': customer.id,
+            'name': customer.name,
+            'phone': customer.phone,
+            # Năm 1900 nghĩa là khách hàng không cung cấp năm sinh
+            'birth_date': customer.birth_date.strftime('%d-%m' if customer.birth_date.year == 1900 else '%d-%m-%Y'),
+            'days_until': days_until_birthday(customer.birth_date, today),
+            'url': url_for('customer_view', id=customer.id),
+        } for customer in customers]
+    })
+
+@app.route('/import', methods=['GET', 'POST'])
+def data_import():
+    if request.method == 'POST':
+        kind = request.form.get('kind')
+        file = request.files.get('file')
+        if kind not in IMPORT_KINDS or not file or not file.filename:
+            flash('Vui lòng chọn loại dữ liệu và file cần nhập.', 'danger')
+            return redirect(url_for('data_import'))
+        if file.filename.rsplit('.', 1)[-1].lower() not in IMPORT_EXTENSIONS:
+            flash('Chỉ hỗ trợ file CSV hoặc XLSX.', 'danger')
+            return redirect(url_for('data_import'))
+
+        # File được đọc theo luồng và ghi theo từng lô, báo cáo lỗi lưu riêng để tải về
+        os.makedirs(app.config['IMPORT_REPORT_FOLDER'], exist_ok=True)
+        report_name = f'{uuid.uuid4().hex}.csv'
+        try:
+            report = run_import(kind, file.stream, file.filename,
+                                os.path.join(app.config['IMPORT_REPORT_FOLDER'], report_name),
+                                create_missing=request.form.get('create_missing') == '1')
+        except Exception as e:
+            flash(f'Có lỗi xảy ra khi nhập dữ liệu (các lô trước đó đã được lưu): {str(e)}', 'danger')
+            return redirect(url_for('data_import'))
+
+        flash(f'Đã thêm {report.inserted} dòng, bỏ qua {report.duplicates} dòng trùng, {report.errors} dòng lỗi.', 'success')
+        return redirect(url_for('data_import', report=report_name if report.has_error_file else None))
+
+    return render_template('import/index.html', report=request.args.get('report'))
+
+@app.route('/import/reports/<filename>')
+def import_report(filename):
+    return send_from_directory(app.config['IMPORT_REPORT_FOLDER'], filename,
+                               as_attachment=True, download_name='bao_cao_loi_nhap_du_lieu.csv')
+
+@app.route('/api/customers/typeahead', defaults={'source': 'customers'})
+@app.route('/api/services/typeahead', defaults={'source': 'services'})
+@app.route('/api/employees/typeahead', defaults={'source': 'employees'})
+def api_typeahead(source):
+    # Trả về tối đa `limit` kết quả gọn nhẹ cho ô chọn trên form
+    limit = min(max(request.args.get('limit', TYPEAHEAD_LIMIT, type=int), 1), TYPEAHEAD_MAX_LIMIT)
+    items = TYPEAHEAD_SOURCES[source](request.args.get('q', ''), limit)
+    return jsonify({'success': True, 'items': items})
+
 # Routes cho quản lý dịch vụ
 @app.route('/services')
 def service_list():
@@ -347,10 +459,11 @@ def service_view(id):
     service = Service.query.get_or_404(id)
     page = request.args.get('page', 1, type=int)
     # Lấy lịch sử dịch vụ của dịch vụ này, sắp xếp theo ngày dịch vụ giảm dần
-    service_histories_query = ServiceHistory.query.filter_by(service_id=service.id).order_by(ServiceHistory.service_date.desc())
+    service_histories_query = service_history_listing(service_id=service.id)
     pagination = service_histories_query.paginate(page=page, per_page=app.config['ITEMS_PER_PAGE'])
     return render_template('services/view.html', 
                          service=service,
+                         service_histories=pagination.items,
                          pagination=pagination)
 
 @app.route('/services/<int:id>/edit', methods=['GET', 'POST'])
@@ -399,14 +512,19 @@ def employee_list():
     page = request.args.get('page', 1, type=int)
     search = request.args.get('search', '')
     
-    query = Employee.query
+    # Nhân viên đã nghỉ việc (đã lưu trữ) không hiện trong danh sách
+    query = Employee.query.filter(Employee.archived_at.is_(None))
     if search:
         query = query.filter(Employee.name.ilike(f'%{search}%'))
         
     pagination = query.paginate(page=page, per_page=app.config['ITEMS_PER_PAGE'])
+    # Danh sách chọn nhân viên nhận lịch sử dịch vụ khi cho một nhân viên nghỉ việc
+    active_employees = db.session.query(Employee.id, Employee.name).filter(
+        Employee.archived_at.is_(None)).order_by(Employee.name).all()
     return render_template('employees/index.html', 
                          employees=pagination.items,
-                         pagination=pagination)
+                         pagination=pagination,
+                         active_employees=active_employees)
 
 @app.route('/employees/add', methods=['GET', 'POST'])
 def employee_add():
@@ -484,6 +602,10 @@ def employee_edit(id):
 @app.route('/employees/<int:id>/delete', methods=['POST'])
 def employee_delete(id):
     employee = Employee.query.get_or_404(id)
+    # Nhân viên còn lịch sử dịch vụ phải chuyển lịch sử cho người khác (employee_reassign) trước
+    if db.session.query(ServiceHistory.id).filter(ServiceHistory.employee_id == employee.id).first():
+        flash('Nhân viên còn lịch sử dịch vụ. Hãy chọn nhân viên nhận lịch sử để chuyển và cho nghỉ việc.', 'danger')
+        return redirect(url_for('employee_list'))
     try:
         db.session.delete(employee)
         db.session.commit()
@@ -493,12 +615,29 @@ def employee_delete(id):
         flash(f'Có lỗi xảy ra khi xóa nhân viên: {str(e)}', 'danger')
     return redirect(url_for('employee_list'))
 
+@app.route('/employees/<int:id>/reassign', methods=['POST'])
+def employee_reassign(id):
+    employee = Employee.query.get_or_404(id)
+    target_id = request.form.get('target_id', type=int)
+    try:
+        # Một câu UPDATE cho toàn bộ lịch sử, sau đó lưu trữ nhân viên cũ
+        moved = reassign_employee(employee.id, target_id)
+        db.session.commit()
+        flash(f'Đã chuyển {moved} lịch sử dịch vụ và cho nhân viên {employee.name} nghỉ việc.', 'success')
+    except ValueError as e:
+        db.session.rollback()
+        flash(str(e), 'danger')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Có lỗi xảy ra khi chuyển lịch sử dịch vụ: {str(e)}', 'danger')
+    return redirect(url_for('employee_list'))
+
 @app.route('/employees/<int:id>/view')
 def employee_view(id):
     employee = Employee.query.get_or_404(id)
     page = request.args.get('page', 1, type=int)
     # Lấy lịch sử dịch vụ của nhân viên, sắp xếp theo ngày dịch vụ giảm dần
-    service_histories_query = ServiceHistory.query.filter_by(employee_id=employee.id).order_by(ServiceHistory.service_date.desc())
+    service_histories_query = service_history_listing(employee_id=employee.id)
     service_histories_pagination = service_histories_query.paginate(page=page, per_page=app.config['ITEMS_PER_PAGE'])
     return render_template('employees/view.html', 
                            employee=employee,
@@ -563,51 +702,69 @@ def category_delete(id):
 
 
 # Routes cho quản lý lịch sử dịch vụ
-@app.route('/service-histories')
-def service_history_list():
-    date_from_str = request.args.get('date_from')
-    date_to_str = request.args.get('date_to')
-
-    query = ServiceHistory.query
-
-    if date_from_str:
+def service_history_filters(args):
+    """Điều kiện lọc lịch sử dịch vụ từ query string, dùng chung cho danh sách và xuất CSV.
+
+    Trả về (criteria, danh sách lỗi); ngày không hợp lệ bị bỏ qua.
+    """
+    errors = []
+    date_from = date_to = None
+    if args.get('date_from'):
         try:
-            date_from = datetime.strptime(date_from_str, '%Y-%m-%d')
-            query = query.filter(ServiceHistory.service_date >= date_from)
+            date_from = datetime.strptime(args['date_from'], '%Y-%m-%d').date()
         except ValueError:
-            flash('Định dạng ngày bắt đầu không hợp lệ.', 'danger')
-
-    if date_to_str:
+            errors.append('Định dạng ngày bắt đầu không hợp lệ.')
+    if args.get('date_to'):
         try:
-            date_to = datetime.strptime(date_to_str, '%Y-%m-%d')
-            query = query.filter(ServiceHistory.service_date <= date_to)
+            date_to = datetime.strptime(args['date_to'], '%Y-%m-%d').date()
         except ValueError:
-            flash('Định dạng ngày kết thúc không hợp lệ.', 'danger')
+            errors.append('Định dạng ngày kết thúc không hợp lệ.')
+    return history_date_criteria(date_from, date_to), errors
 
-    service_histories = query.order_by(ServiceHistory.service_date.desc()).all()
-
-    # Nhóm lịch sử dịch vụ theo ngày
-    grouped_histories = {}
-    for history in service_histories:
-        date_str = history.service_date.strftime('%Y-%m-%d')
-        if date_str not in grouped_histories:
-            grouped_histories[date_str] = []
-        grouped_histories[date_str].append(history)
-
-    # Sắp xếp các ngày giảm dần
-    sorted_dates = sorted(grouped_histories.keys(), reverse=True)
-
-    return render_template('service_histories/index.html', grouped_histories=grouped_histories, sorted_dates=sorted_dates)
+@app.route('/service-histories')
+def service_history_list():
+    criteria, errors = service_history_filters(request.args)
+    for error in errors:
+        flash(error, 'danger')
+
+    # Phân trang theo cursor (service_date, id), mỗi trang gồm trọn các ngày
+    cursor = decode_history_cursor(request.args.get('cursor'))
+    grouped_histories, next_cursor = service_history_feed(
+        *criteria, cursor=cursor, per_page=app.config['HISTORY_FEED_PER_PAGE'])
+
+    # Các ngày đã được sắp xếp giảm dần
+    sorted_dates = list(grouped_histories)
+
+    return render_template('service_histories/index.html',
+                         grouped_histories=grouped_histories,
+                         sorted_dates=sorted_dates,
+                         next_cursor=next_cursor)
+
+@app.route('/service-histories/export.csv')
+def service_history_export():
+    criteria, errors = service_history_filters(request.args)
+    if errors:
+        for error in errors:
+            flash(error, 'danger')
+        return redirect(url_for('service_history_list'))
+
+    # Gửi dần từng khối CSV, nén gzip khi trình duyệt hỗ trợ
+    chunks = iter_history_csv(*criteria)
+    headers = {
+        'Content-Disposition': 'attachment; filename=' + export_filename(request.args.get('date_from'),
+                                                                         request.args.get('date_to')),
+        'Vary': 'Accept-Encoding',
+    }
+    if 'gzip' in request.accept_encodings:
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(stream_with_context(chunks), mimetype='text/csv', headers=headers)
 
 @app.route('/service-histories/add', methods=['GET', 'POST'])
 @app.route('/service-histories/add/<int:customer_id>', methods=['GET', 'POST'])
 def service_history_add(customer_id=None):
     # customer_id có thể được truyền từ trang chi tiết khách hàng
-    # Lấy danh sách khách hàng để chọn (cho trường hợp không truyền customer_id)
-    # Bỏ lọc theo status vì lỗi xảy ra khi truy cập thuộc tính status
-    customers = Customer.query.all()
-    services = Service.query.order_by(Service.name).all()
-    employees = Employee.query.order_by(Employee.name).all()
+    # Danh sách khách hàng, dịch vụ, nhân viên được tải khi người dùng gõ tìm (api_typeahead)
 
     # Nếu customer_id được truyền, tìm khách hàng tương ứng
     selected_customer = None
@@ -618,10 +775,12 @@ def service_history_add(customer_id=None):
             return redirect(url_for('customer_list')) # Or appropriate fallback
 
     if request.method == 'POST':
+        stored = []
         try:
             # Use customer_id from URL if available, otherwise from form
             customer_id_to_save = customer_id if customer_id else request.form['customer_id']
 
+            # Kiểm tra dữ liệu form trước khi tải ảnh, để form sai không để lại file ảnh không dùng đến
             service_history = ServiceHistory(
                 customer_id=customer_id_to_save,
                 service_id=request.form['service_id'],
@@ -631,21 +790,18 @@ def service_history_add(customer_id=None):
                 price=float(request.form['amount_raw']),
                 notes=request.form.get('notes')
             )
-            db.session.add(service_history)
-            db.session.commit()
 
-            # Xử lý upload hình ảnh
-            files = request.files.getlist('images')
-            for file in files:
-                if file and file.filename:
-                    # Tạo tên file duy nhất bằng UUID
-                    original_filename = secure_filename(file.filename)
-                    file_extension = os.path.splitext(original_filename)[1]
-                    unique_filename = str(uuid.uuid4().hex) + file_extension
-                    filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                    file.save(filepath)
-                    image = ServiceHistoryImage(service_history_id=service_history.id, image_url='static/uploads/' + unique_filename)
-                    db.session.add(image)
+            # Chuẩn hóa và lưu ảnh, để file không phải ảnh bị từ chối ngay
+            uploads = [(file.filename, file.read()) for file in request.files.getlist('images') if file and file.filename]
+            outcomes = upload_images(get_storage(app), uploads, app.config)
+            stored = [outcome.columns for outcome in outcomes if not outcome.error]
+            failed = [f'{outcome.filename}: {outcome.error}' for outcome in outcomes if outcome.error]
+            if failed:
+                raise ValueError('; '.join(failed))
+
+            # Lịch sử dịch vụ và ảnh được lưu trong cùng một transaction
+            service_history.images.extend(ServiceHistoryImage(**columns) for columns in stored)
+            db.session.add(service_history)
             db.session.commit()
             flash('Thêm lịch sử dịch vụ thành công!', 'success')
             # Redirect to customer view if coming from customer page, else to list
@@ -655,21 +811,22 @@ def service_history_add(customer_id=None):
                 return redirect(url_for('service_history_list'))
         except Exception as e:
             db.session.rollback()
+            # Xếp hàng xóa các ảnh vừa tải lên (nếu không có ảnh nào khác dùng chung)
+            if stored:
+                try:
+                    release_locations(stored_locations(stored))
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
             flash(f'Có lỗi xảy ra: {str(e)}', 'danger')
 
     return render_template('service_histories/add.html',
-                         customers=customers, # Pass all customers even if one is preselected (for context)
-                         services=services,
-                         employees=employees,
                          now=datetime.now(),
                          customer_preselected=selected_customer) # Pass the preselected customer object
 
 @app.route('/service-histories/<int:id>/edit', methods=['GET', 'POST'])
 def service_history_edit(id):
     history = ServiceHistory.query.get_or_404(id)
-    customers = Customer.query.all()
-    services = Service.query.order_by(Service.name).all()
-    employees = Employee.query.order_by(Employee.name).all()
 
     if request.method == 'POST':
         try:
@@ -690,17 +847,12 @@ def service_history_edit(id):
             history.payment_method = request.form.get('payment_method', history.payment_method)
             history.notes = request.form.get('notes', history.notes)
 
-            # Xử lý xóa ảnh
-            delete_image_ids = request.form.getlist('delete_images')
+            # Xử lý xóa ảnh; file được xếp hàng xóa trong cùng transaction (outbox)
+            delete_image_ids = [int(img_id) for img_id in request.form.getlist('delete_images')]
             if delete_image_ids:
-                for img_id in delete_image_ids:
-                    img = ServiceHistoryImage.query.get(int(img_id))
-                    if img:
-                        # Xóa file vật lý nếu tồn tại
-                        img_path = os.path.join(app.config['UPLOAD_FOLDER'], os.path.basename(img.image_url))
-                        if os.path.exists(img_path):
-                            os.remove(img_path)
-                        db.session.delete(img)
+                images = ServiceHistoryImage.query.filter(ServiceHistoryImage.id.in_(delete_image_ids),
+                                                          ServiceHistoryImage.service_history_id == history.id).all()
+                release_images(images)
 
             db.session.commit()
 
@@ -727,10 +879,7 @@ def service_history_edit(id):
             history = ServiceHistory.query.get_or_404(id)
 
     return render_template('service_histories/edit.html',
-                           history=history,
-                           customers=customers,
-                           services=services,
-                           employees=employees)
+                           history=history)
 
 @app.route('/service-histories/<int:id>/upload-images', methods=['POST'])
 def upload_service_history_images(id):
@@ -744,44 +893,71 @@ def upload_service_history_images(id):
     if not files or not any(files):
         return jsonify({'success': False, 'message': 'Không có hình ảnh nào được chọn.'}), 400
     
+    # Đọc file trong request, sau đó xử lý và tải lên song song trong pool
+    uploads = []
+    rejected = {}
+    for index, file in enumerate(files):
+        if not file or not file.filename:
+            continue
+        if allowed_file(file.filename):
+            uploads.append((file.filename, file.read()))
+        else:
+            rejected[index] = file.filename
+    outcomes = upload_images(get_storage(app), uploads, app.config)
+
+    # Lưu các ảnh tải lên thành công trong một lần INSERT
+    stored = [outcome.columns for outcome in outcomes if not outcome.error]
+    images = [ServiceHistoryImage(service_history_id=history.id, **columns) for columns in stored]
     try:
-        for file in files:
-            if file and file.filename and allowed_file(file.filename):
-                # Tải lên Cloudinary
-                upload_result = upload_to_cloudinary(
-                    file,
-                    folder=app.config.get('CLOUDINARY_FOLDER')
-                )
-                
-                # Lưu thông tin ảnh vào database
-                image = ServiceHistoryImage(
-                    service_history_id=history.id,
-                    image_url=upload_result['url'],
-                    cloudinary_public_id=upload_result['public_id']
-                )
-                db.session.add(image)
-                db.session.flush()  # Lấy ID trước khi commit
-                
-                new_images_data.append({
-                    'id': image.id, 
-                    'image_url': upload_result['url']
-                })
-        
+        db.session.add_all(images)
         db.session.commit()
-        return jsonify({
-            'success': True, 
-            'new_images': new_images_data, 
-            'message': 'Hình ảnh đã được tải lên thành công!'
-        })
-        
     except Exception as e:
         db.session.rollback()
         app.logger.error(f"Error uploading images: {str(e)}")
+        # Không lưu được vào DB thì xếp hàng xóa các ảnh vừa tải lên (nếu không có ảnh nào khác dùng chung)
+        try:
+            release_locations(stored_locations(stored))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
         return jsonify({
             'success': False, 
             'message': f'Lỗi khi tải lên hình ảnh: {str(e)}'
         }), 500
 
+    # Kết quả từng file theo đúng thứ tự gửi lên
+    results = []
+    new_images = iter(images)
+    pending = iter(outcomes)
+    for index, file in enumerate(files):
+        if index in rejected:
+            results.append({'filename': rejected[index], 'success': False, 'message': 'Định dạng file không hợp lệ.'})
+            continue
+        if not file or not file.filename:
+            continue
+        outcome = next(pending)
+        if outcome.error:
+            results.append({'filename': outcome.filename, 'success': False, 'message': outcome.error})
+        else:
+            image = next(new_images)
+            results.append({'filename': outcome.filename, 'success': True, 'id': image.id})
+            new_images_data.append({
+                'id': image.id, 
+                'image_url': image.image_url,
+                'thumbnail_url': image.variant_url('thumb')
+            })
+
+    failed = [result for result in results if not result['success']]
+    if not new_images_data:
+        return jsonify({'success': False, 'results': results, 'message': 'Không tải lên được hình ảnh nào.'}), 400
+    return jsonify({
+        'success': True, 
+        'new_images': new_images_data, 
+        'results': results,
+        'message': (f'Đã tải lên {len(new_images_data)} ảnh, {len(failed)} ảnh bị lỗi.' if failed
+                    else 'Hình ảnh đã được tải lên thành công!')
+    })
+
 
 @app.route('/service-histories/<int:id>/replace-image/<int:image_id>', methods=['POST'])
 def replace_service_history_image(id, image_id):
@@ -798,27 +974,27 @@ def replace_service_history_image(id, image_id):
     if not allowed_file(file.filename):
         return jsonify({'success': False, 'message': 'Định dạng file không hợp lệ.'}), 400
     
+    if image_to_replace.service_history_id != history.id:
+        return jsonify({'success': False, 'message': 'Ảnh không thuộc lịch sử dịch vụ này.'}), 403
+
+    # Chuẩn hóa và lưu ảnh mới trước khi bỏ ảnh cũ
+    outcome = upload_images(get_storage(app), [(file.filename, file.read())], app.config)[0]
+    if outcome.error:
+        return jsonify({'success': False, 'message': outcome.error}), 400
+
     try:
-        # Xóa ảnh cũ trên Cloudinary nếu có
-        if image_to_replace.cloudinary_public_id:
-            delete_from_cloudinary(image_to_replace.cloudinary_public_id)
-        
-        # Tải lên ảnh mới lên Cloudinary
-        upload_result = upload_to_cloudinary(
-            file,
-            folder=app.config.get('CLOUDINARY_FOLDER')
-        )
-        
-        # Cập nhật thông tin ảnh trong database
-        image_to_replace.image_url = upload_result['url']
-        image_to_replace.cloudinary_public_id = upload_result['public_id']
-        
+        # Cập nhật thông tin ảnh trong database; ảnh cũ chỉ bị xóa khi không còn dòng nào dùng chung
+        old_locations = stored_locations([image_to_replace])
+        for column, value in outcome.columns.items():
+            setattr(image_to_replace, column, value)
+        db.session.flush()
+        release_locations(old_locations)
         db.session.commit()
         
         return jsonify({
             'success': True, 
             'message': 'Thay thế ảnh thành công!', 
-            'new_image_url': upload_result['url']
+            'new_image_url': image_to_replace.image_url
         })
         
     except Exception as e:
@@ -830,9 +1006,6 @@ def replace_service_history_image(id, image_id):
         }), 500
 
 
-
-
-
 @app.route('/service-histories/<int:id>/details')
 def service_history_details(id):
     history = ServiceHistory.query.get_or_404(id)
@@ -842,60 +1015,137 @@ def service_history_details(id):
 @app.route('/service-histories/<int:id>/export-pdf')
 def export_service_history_pdf(id):
     history = ServiceHistory.query.get_or_404(id)
-    html_content = render_template('service_histories/pdf_template.html', history=history)
-
-    # Tạo PDF từ HTML (sử dụng xhtml2pdf hoặc thư viện tương tự)
-    # Đây là ví dụ, bạn cần cài đặt xhtml2pdf: pip install xhtml2pdf
-    pdf = HTML(string=html_content).write_pdf()
-
-    response = make_response(pdf)
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'attachment; filename=lich_su_dich_vu_{history.id}.pdf'
-    return response
+    pdf, _ = build_receipts([ServiceHistory.id == history.id])
+    return Response(pdf, mimetype='application/pdf', headers={
+        'Content-Disposition': f'attachment; filename=bien_nhan_{history.id}.pdf'})
+
+@app.route('/service-histories/receipts')
+def export_service_history_receipts():
+    # Biên nhận theo khoảng ngày (cùng bộ lọc với danh sách) hoặc toàn bộ lịch sử của một khách hàng
+    criteria, errors = service_history_filters(request.args)
+    customer_id = request.args.get('customer_id', type=int)
+    if customer_id:
+        criteria.append(ServiceHistory.customer_id == customer_id)
+    back_url = url_for('customer_view', id=customer_id) if customer_id else url_for('service_history_list')
+    if errors:
+        for error in errors:
+            flash(error, 'danger')
+        return redirect(back_url)
+
+    count = ServiceHistory.query.filter(*criteria).count()
+    if not count:
+        flash('Không có lịch sử dịch vụ nào để xuất biên nhận.', 'danger')
+        return redirect(back_url)
+    if count > app.config['PDF_MAX_RECEIPTS']:
+        flash(f'Có {count} biên nhận, vượt quá {app.config["PDF_MAX_RECEIPTS"]} biên nhận mỗi lần xuất. '
+              'Vui lòng chọn khoảng ngày ngắn hơn hoặc dùng lệnh flask export receipts.', 'danger')
+        return redirect(back_url)
+
+    as_zip = request.args.get('format') == 'zip'
+    data, _ = build_receipts(criteria, as_zip)
+    filename = 'bien_nhan' + (f'_khach_hang_{customer_id}' if customer_id else '')
+    return Response(data, mimetype='application/zip' if as_zip else 'application/pdf', headers={
+        'Content-Disposition': f'attachment; filename={filename}.{"zip" if as_zip else "pdf"}'})
 
 
 @app.route('/revenue')
 def revenue():
+    # Chỉ đọc bảng tổng hợp theo ngày, chi phí phụ thuộc số ngày chứ không phụ thuộc số lượt khách
+    start_date_str = request.args.get('start_date')
+    end_date_str = request.args.get('end_date')
+    service_id = request.args.get('service', type=int)
+
+    criteria = []
+    if start_date_str:
+        try:
+            criteria.append(RevenueDaily.day >= datetime.strptime(start_date_str, '%Y-%m-%d').date())
+        except ValueError:
+            flash('Định dạng ngày bắt đầu không hợp lệ.', 'danger')
+    if end_date_str:
+        try:
+            criteria.append(RevenueDaily.day <= datetime.strptime(end_date_str, '%Y-%m-%d').date())
+        except ValueError:
+            flash('Định dạng ngày kết thúc không hợp lệ.', 'danger')
+    if service_id:
+        criteria.append(RevenueDaily.service_id == service_id)
+
     # Lấy thống kê doanh thu
-    total_revenue = db.session.query(db.func.sum(ServiceHistory.price)).scalar() or 0
-    total_services = ServiceHistory.query.count()
-    avg_revenue = total_revenue / total_services if total_services > 0 else 0
+    total_revenue, total_services = db.session.query(
+        db.func.coalesce(db.func.sum(RevenueDaily.revenue_total), 0),
+        db.func.coalesce(db.func.sum(RevenueDaily.visit_count), 0)
+    ).filter(*criteria).one()
+    average_revenue = total_revenue / total_services if total_services > 0 else 0
 
     # Thống kê doanh thu theo dịch vụ
     revenue_by_service = db.session.query(
         Service.name,
-        db.func.count(ServiceHistory.id).label('count'),
-        db.func.sum(ServiceHistory.price).label('total')
-    ).join(ServiceHistory).group_by(Service.name).all()
+        db.func.sum(RevenueDaily.visit_count).label('count'),
+        db.func.sum(RevenueDaily.revenue_total).label('total')
+    ).join(RevenueDaily, RevenueDaily.service_id == Service.id).filter(*criteria).group_by(
+        Service.id, Service.name).order_by(db.desc('total')).all()
 
     # Thống kê doanh thu theo nhân viên
     revenue_by_employee = db.session.query(
         Employee.name,
-        db.func.count(ServiceHistory.id).label('count'),
-        db.func.sum(ServiceHistory.price).label('total')
-    ).join(ServiceHistory).group_by(Employee.name).all()
+        db.func.sum(RevenueDaily.visit_count).label('count'),
+        db.func.sum(RevenueDaily.revenue_total).label('total')
+    ).join(RevenueDaily, RevenueDaily.employee_id == Employee.id).filter(*criteria).group_by(
+        Employee.id, Employee.name).order_by(db.desc('total')).all()
+
+    services = Service.query.order_by(Service.name).all()
 
     return render_template('revenue.html',
                          total_revenue=total_revenue,
                          total_services=total_services,
-                         avg_revenue=avg_revenue,
+                         average_revenue=average_revenue,
                          revenue_by_service=revenue_by_service,
-                         revenue_by_employee=revenue_by_employee)
+                         revenue_by_employee=revenue_by_employee,
+                         services=services)
+
+@app.route('/api/revenue/series')
+def api_revenue_series():
+    granularity = request.args.get('granularity', 'day')
+    split = request.args.get('split') or None
+    if granularity not in BUCKET_GRANULARITIES:
+        return jsonify({'success': False, 'message': 'Kỳ thống kê không hợp lệ (day, week hoặc month).'}), 400
+    if split and split not in SPLIT_COLUMNS:
+        return jsonify({'success': False, 'message': 'Cách tách không hợp lệ (service, employee hoặc payment_method).'}), 400
+
+    # Mặc định: 30 ngày, 26 tuần hoặc 12 tháng gần nhất
+    default_days = {'day': 29, 'week': 7 * 26 - 1, 'month': 365}
+    try:
+        date_to = datetime.strptime(request.args['date_to'], '%Y-%m-%d').date() if request.args.get('date_to') else salon_today()
+        date_from = (datetime.strptime(request.args['date_from'], '%Y-%m-%d').date() if request.args.get('date_from')
+                     else date_to - timedelta(days=default_days[granularity]))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Định dạng ngày không hợp lệ (YYYY-MM-DD).'}), 400
+    if date_from > date_to:
+        return jsonify({'success': False, 'message': 'Ngày bắt đầu phải trước ngày kết thúc.'}), 400
+
+    series = revenue_series(granularity, date_from, date_to, split=split,
+                            service_id=request.args.get('service', type=int),
+                            employee_id=request.args.get('employee', type=int))
+    if split:
+        labels = split_labels(split, {row['key'] for row in series})
+        series = [dict(row, label=labels.get(row['key'])) for row in series]
+
+    return jsonify({
+        'success': True,
+        'granularity': granularity,
+        'split': split,
+        'date_from': date_from.isoformat(),
+        'date_to': date_to.isoformat(),
+        'series': series,
+    })
 
 @app.route('/static/uploads/<path:filename>')
 def serve_uploaded_file(filename):
-    print(f"\n=== DEBUG ===")
-    print(f"Requested filename: {filename}")
-    print(f"Upload folder: {app.config['UPLOAD_FOLDER']}")
-    full_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    print(f"Full path: {full_path}")
-    print(f"File exists: {os.path.exists(full_path)}")
-    
-    try:
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
-    except Exception as e:
-        print(f"Error serving {filename}: {str(e)}")
-        return str(e), 404
+    return send_media(filename)
+
+@app.route('/media/<int:width>/<path:filename>')
+def resized_image(width, filename):
+    # Ảnh local thu nhỏ cho srcset
+    return send_resized_image(filename, width)
 
 @app.route('/test_image')
 def test_image():
@@ -915,17 +1165,12 @@ def test_image():
 def service_history_delete(id):
     history = ServiceHistory.query.get_or_404(id)
     try:
-        # Xóa tất cả hình ảnh liên quan
-        for image in history.images:
-            # Xóa file vật lý
-            filename = os.path.basename(image.image_url)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            if os.path.exists(filepath):
-                os.remove(filepath)
-            db.session.delete(image)
-        
-        # Xóa lịch sử dịch vụ
+        # Xóa lịch sử dịch vụ, hình ảnh liên quan bị xóa theo (cascade)
+        locations = stored_locations(history.images)
         db.session.delete(history)
+        db.session.flush()
+        # File được xếp hàng xóa trong cùng transaction, chỉ khi không còn ảnh nào dùng chung
+        release_locations(locations)
         db.session.commit()
         flash('Xóa lịch sử dịch vụ thành công!', 'success')
     except Exception as e:
@@ -943,12 +1188,8 @@ def delete_service_history_image(id, image_id):
         return jsonify({'success': False, 'message': 'Ảnh không thuộc lịch sử dịch vụ này.'}), 403
 
     try:
-        # Xóa ảnh từ Cloudinary nếu có
-        if image.cloudinary_public_id:
-            delete_from_cloudinary(image.cloudinary_public_id)
-        
-        # Xóa bản ghi trong database
-        db.session.delete(image)
+        # Xóa bản ghi trong database; file được xếp hàng xóa trong cùng transaction (outbox)
+        release_images([image])
         db.session.commit()
         
         return jsonify({
@@ -967,11 +1208,7 @@ def delete_service_history_image(id, image_id):
 # Routes cho trang cài đặt
 @app.route('/settings', methods=['GET', 'POST'])
 def settings_page():
-    settings = Settings.query.first()
-    if not settings:
-        settings = Settings() # Tạo cài đặt mặc định nếu chưa có
-        db.session.add(settings)
-        db.session.commit()
+    settings = load_settings()
 
     if request.method == 'POST':
         action = request.form.get('action')
@@ -980,10 +1217,7 @@ def settings_page():
         if 'company_logo' in request.files and request.files['company_logo'].filename != '':
             logo_file = request.files['company_logo']
             if logo_file and allowed_file(logo_file.filename):
-                logo_filename = secure_filename(f"{uuid.uuid4()}.{logo_file.filename.rsplit('.', 1)[1].lower()}")
-                logo_filepath = os.path.join(app.config['UPLOAD_FOLDER'], logo_filename)
-                logo_file.save(logo_filepath)
-                settings.company_logo_url = url_for('uploaded_file', filename=logo_filename)
+                settings.company_logo_url = store_file(get_storage(app), logo_file).url
             else:
                 flash('Định dạng tệp logo không hợp lệ.', 'danger')
         elif request.form.get('company_logo_clear') == '1': # Thêm một cách để xóa logo
@@ -993,10 +1227,7 @@ def settings_page():
         if 'favicon' in request.files and request.files['favicon'].filename != '':
             favicon_file = request.files['favicon']
             if favicon_file and allowed_file(favicon_file.filename):
-                favicon_filename = secure_filename(f"{uuid.uuid4()}.{favicon_file.filename.rsplit('.', 1)[1].lower()}")
-                favicon_filepath = os.path.join(app.config['UPLOAD_FOLDER'], favicon_filename)
-                favicon_file.save(favicon_filepath)
-                settings.favicon_url = url_for('uploaded_file', filename=favicon_filename)
+                settings.favicon_url = store_file(get_storage(app), favicon_file).url
             else:
                 flash('Định dạng tệp Favicon không hợp lệ.', 'danger')
         elif request.form.get('favicon_clear') == '1': # Thêm một cách để xóa favicon
@@ -1015,6 +1246,8 @@ def settings_page():
         settings.youtube_url = request.form.get('youtube_url')
         
         try:
+            db.session.flush()
+            invalidate_settings(db.session.connection())
             db.session.commit()
             flash('Cài đặt đã được lưu thành công!', 'success')
         except Exception as e:
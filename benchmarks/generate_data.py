@@ -0,0 +1,201 @@
+"""Sinh dữ liệu salon giả lập cho benchmark (cùng tham số và seed luôn cho cùng dữ liệu).
+
+Chạy từ thư mục dự án, với DATABASE_URL trỏ tới một database riêng cho benchmark:
+
+    DATABASE_URL=postgresql+psycopg://... python -m benchmarks.generate_data --histories 2000000
+"""
+import random
+import time
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+import click
+from sqlalchemy import text
+from app import app
+from models import db, Customer, Service, Employee, ServiceHistory, birth_month_day
+from db_utils import copy_rows
+# Cùng thứ tự cột với lệnh nhập dữ liệu, để dòng sinh ra có đúng bố cục COPY như khi nhập thật
+from bulk_import import CUSTOMER_COLUMNS, HISTORY_COLUMNS, _chunks
+from text_utils import fold_text, digits_only
+from timezone_utils import local_day_start
+from revenue_rollup import rebuild_revenue_daily
+from dashboard_counters import reconcile_counters
+from settings_cache import ensure_settings
+
+# Số dòng sinh và nạp trong một lần
+CHUNK_SIZE = 50000
+
+# Họ phổ biến và tỉ lệ ước lượng (%)
+SURNAMES = [('Nguyễn', 38), ('Trần', 11), ('Lê', 9.5), ('Phạm', 7), ('Hoàng', 5), ('Huỳnh', 4), ('Phan', 4.5),
+            ('Vũ', 3.9), ('Võ', 3), ('Đặng', 2.1), ('Bùi', 2), ('Đỗ', 1.4), ('Hồ', 1.3), ('Ngô', 1.3),
+            ('Dương', 1), ('Lý', 0.5), ('Trương', 1), ('Đinh', 0.8), ('Lâm', 0.6), ('Mai', 0.5)]
+MALE_MIDDLE = ['Văn', 'Minh', 'Đức', 'Hữu', 'Quốc', 'Thanh', 'Hoàng', 'Gia', 'Công', 'Tuấn']
+FEMALE_MIDDLE = ['Thị', 'Ngọc', 'Thu', 'Thanh', 'Kim', 'Bảo', 'Mỹ', 'Hồng', 'Phương', 'Khánh']
+MALE_GIVEN = ['An', 'Bình', 'Cường', 'Dũng', 'Đạt', 'Hải', 'Hiếu', 'Hùng', 'Huy', 'Khang', 'Khoa', 'Long',
+              'Lộc', 'Nam', 'Nghĩa', 'Phát', 'Phong', 'Phúc', 'Quân', 'Sơn', 'Tài', 'Thắng', 'Thành', 'Tiến',
+              'Toàn', 'Trung', 'Tùng', 'Việt', 'Vinh', 'Vũ']
+FEMALE_GIVEN = ['Anh', 'Châu', 'Chi', 'Dung', 'Duyên', 'Giang', 'Hà', 'Hạnh', 'Hằng', 'Hoa', 'Hương', 'Lan',
+                'Linh', 'Loan', 'Mai', 'My', 'Nga', 'Ngân', 'Nhung', 'Oanh', 'Phương', 'Quyên', 'Tâm', 'Thảo',
+                'Thủy', 'Trang', 'Trinh', 'Uyên', 'Vân', 'Yến']
+STREETS = ['Lê Lợi', 'Nguyễn Huệ', 'Trần Hưng Đạo', 'Hai Bà Trưng', 'Lý Thường Kiệt', 'Phan Đình Phùng',
+           'Điện Biên Phủ', 'Cách Mạng Tháng Tám', 'Võ Văn Tần', 'Nguyễn Trãi', 'Lê Văn Sỹ', 'Pasteur']
+DISTRICTS = ['Quận 1', 'Quận 3', 'Quận 5', 'Quận 10', 'Bình Thạnh', 'Phú Nhuận', 'Tân Bình', 'Gò Vấp', 'Thủ Đức']
+PHONE_PREFIXES = ['090', '091', '093', '094', '096', '097', '098', '032', '033', '035', '038', '070', '077', '079',
+                  '081', '083', '085', '086', '088', '089']
+
+# Dịch vụ: (tên, mô tả, giá thấp nhất, giá cao nhất, tần suất tương đối)
+SERVICES = [
+    ('Cắt tóc nam', 'Cắt, gội và tạo kiểu', 80000, 150000, 30),
+    ('Cắt tóc nữ', 'Cắt và sấy tạo kiểu', 120000, 300000, 18),
+    ('Gội đầu dưỡng sinh', 'Gội đầu kết hợp massage cổ vai gáy', 60000, 120000, 22),
+    ('Nhuộm tóc', 'Nhuộm màu thời trang', 350000, 1200000, 8),
+    ('Uốn tóc', 'Uốn lạnh hoặc uốn nóng', 400000, 1500000, 5),
+    ('Duỗi tóc', 'Duỗi thẳng tự nhiên', 400000, 1200000, 4),
+    ('Phục hồi tóc', 'Hấp dầu, phục hồi tóc hư tổn', 200000, 600000, 6),
+    ('Làm móng tay', 'Cắt da, sơn thường', 80000, 150000, 12),
+    ('Làm móng chân', 'Cắt da, sơn thường', 80000, 150000, 8),
+    ('Sơn gel', 'Sơn gel và vẽ móng', 150000, 400000, 9),
+    ('Chăm sóc da mặt', 'Làm sạch, đắp mặt nạ', 250000, 700000, 6),
+    ('Massage body', 'Massage toàn thân 60 phút', 300000, 600000, 4),
+    ('Tẩy tế bào chết', 'Tẩy tế bào chết toàn thân', 200000, 400000, 2),
+    ('Wax lông', 'Wax tay, chân hoặc nách', 100000, 400000, 3),
+]
+PAYMENT_METHODS = [('Tiền mặt', 55), ('Chuyển khoản', 35), ('Thẻ', 10)]
+# Giờ mở cửa 9h-20h và mức đông khách theo giờ; thứ Hai..Chủ nhật
+HOUR_WEIGHTS = {9: 3, 10: 5, 11: 6, 12: 4, 13: 4, 14: 6, 15: 7, 16: 8, 17: 9, 18: 9, 19: 7, 20: 4}
+WEEKDAY_WEIGHTS = [0.8, 0.75, 0.8, 0.85, 1.0, 1.45, 1.5]
+
+# Ngày cuối mặc định cố định để hai lần chạy cho cùng dữ liệu; đổi bằng --end-date
+DEFAULT_END_DATE = '2025-06-30'
+
+
+def _weighted(rng, items):
+    names, weights = zip(*items)
+    return rng.choices(names, weights)[0]
+
+
+def person_name(rng, female):
+    surname = _weighted(rng, SURNAMES)
+    middle = rng.choice(FEMALE_MIDDLE if female else MALE_MIDDLE)
+    given = rng.choice(FEMALE_GIVEN if female else MALE_GIVEN)
+    return f'{surname} {middle} {given}'
+
+
+def customer_rows(rng, count, first_day):
+    """Các dòng khách hàng; số điện thoại không trùng nhau nhờ tính từ số thứ tự"""
+    for index in range(count):
+        name = person_name(rng, rng.random() < 0.65)
+        # 7919 nguyên tố cùng nhau với 10^7 nên mỗi số thứ tự cho một số thuê bao khác nhau
+        phone = f'{rng.choice(PHONE_PREFIXES)}{(index * 7919 + 1234567) % 10 ** 7:07d}'
+        birth_date = None
+        if rng.random() < 0.7:
+            birth_date = date(rng.randint(1960, 2006), 1, 1) + timedelta(days=rng.randrange(365))
+        address = None
+        if rng.random() < 0.5:
+            address = f'{rng.randint(1, 400)} {rng.choice(STREETS)}, {rng.choice(DISTRICTS)}, TP. Hồ Chí Minh'
+        notes = rng.choice([None, None, None, 'Khách quen', 'Da nhạy cảm', 'Thích tóc ngắn', 'Hay đặt lịch trước'])
+        created_at = datetime.combine(first_day, datetime.min.time()) + timedelta(minutes=index)
+        yield (name, phone, birth_date, address, notes, fold_text(name), digits_only(phone),
+               birth_month_day(birth_date), created_at, created_at)
+
+
+def day_weights(first_day, days):
+    """Mức đông khách của từng ngày: tăng dần theo thời gian, cuối tuần và tháng cuối năm đông hơn"""
+    weights = []
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        growth = 0.6 + 0.4 * offset / max(days - 1, 1)
+        season = 1.3 if day.month in (12, 1) else 1.0
+        weights.append(growth * season * WEEKDAY_WEIGHTS[day.weekday()])
+    return weights
+
+
+def history_rows(rng, count, customer_ids, service_ids, employee_ids, first_day, days):
+    """Các dòng lịch sử dịch vụ; một số khách quen chiếm phần lớn lượt đến (phân bố Pareto)"""
+    customer_weights = list(accumulate(rng.paretovariate(1.2) for _ in customer_ids))
+    day_cumulative = list(accumulate(day_weights(first_day, days)))
+    day_starts = [local_day_start(first_day + timedelta(days=offset)) for offset in range(days)]
+    service_weights = [service[4] for service in SERVICES]
+    hours, hour_weights = zip(*HOUR_WEIGHTS.items())
+    methods, method_weights = zip(*PAYMENT_METHODS)
+
+    remaining = count
+    while remaining:
+        size = min(CHUNK_SIZE, remaining)
+        remaining -= size
+        customers = rng.choices(customer_ids, cum_weights=customer_weights, k=size)
+        day_offsets = rng.choices(range(days), cum_weights=day_cumulative, k=size)
+        service_indexes = rng.choices(range(len(service_ids)), service_weights, k=size)
+        chosen_hours = rng.choices(hours, hour_weights, k=size)
+        chosen_methods = rng.choices(methods, method_weights, k=size)
+        rows = []
+        for customer_id, offset, service_index, hour, method in zip(
+                customers, day_offsets, service_indexes, chosen_hours, chosen_methods):
+            _, _, low, high, _ = SERVICES[service_index]
+            service_date = day_starts[offset] + timedelta(hours=hour, minutes=5 * rng.randrange(12))
+            price = float(rng.randrange(low, high + 1, 10000))
+            rows.append((customer_id, service_ids[service_index], rng.choice(employee_ids), service_date, price,
+                         method, None, service_date, service_date))
+        yield rows
+
+
+def _inserted_ids(connection, model, count):
+    # Database trống trước khi sinh nên id của các dòng vừa nạp là `count` id lớn nhất
+    ids = connection.execute(db.select(model.id).order_by(model.id.desc()).limit(count)).scalars().all()
+    return sorted(ids)
+
+
+@click.command()
+@click.option('--customers', default=50000, show_default=True, help='Số khách hàng.')
+@click.option('--employees', default=25, show_default=True, help='Số nhân viên.')
+@click.option('--histories', default=1000000, show_default=True, help='Số lịch sử dịch vụ.')
+@click.option('--days', default=3 * 365, show_default=True, help='Số ngày có lịch sử dịch vụ, tính lùi từ --end-date.')
+@click.option('--end-date', default=DEFAULT_END_DATE, show_default=True,
+              type=click.DateTime(formats=['%Y-%m-%d']), help='Ngày cuối cùng có lịch sử dịch vụ.')
+@click.option('--seed', default=42, show_default=True, help='Seed của bộ sinh số ngẫu nhiên.')
+def generate(customers, employees, histories, days, end_date, seed):
+    """Sinh dữ liệu giả lập vào database trống (DATABASE_URL)."""
+    rng = random.Random(seed)
+    first_day = end_date.date() - timedelta(days=days - 1)
+    started = time.perf_counter()
+    with app.app_context():
+        db.create_all()
+        ensure_settings()
+        if db.session.query(Customer.id).first() or db.session.query(ServiceHistory.id).first():
+            raise click.ClickException('Database đã có dữ liệu; hãy dùng một database trống cho benchmark.')
+        db.session.remove()
+
+        with db.engine.begin() as connection:
+            copy_rows(connection, Service.__table__, ('name', 'description'),
+                      [(name, description) for name, description, _, _, _ in SERVICES])
+            copy_rows(connection, Employee.__table__, ('name', 'hire_date'),
+                      [(person_name(rng, rng.random() < 0.6), first_day - timedelta(days=rng.randrange(1000)))
+                       for _ in range(employees)])
+            service_ids = _inserted_ids(connection, Service, len(SERVICES))
+            employee_ids = _inserted_ids(connection, Employee, employees)
+
+        for chunk in _chunks(customer_rows(rng, customers, first_day), CHUNK_SIZE):
+            with db.engine.begin() as connection:
+                copy_rows(connection, Customer.__table__, CUSTOMER_COLUMNS, chunk)
+        with db.engine.connect() as connection:
+            customer_ids = _inserted_ids(connection, Customer, customers)
+        click.echo(f'Đã nạp {len(service_ids)} dịch vụ, {employees} nhân viên, {customers} khách hàng.')
+
+        loaded = 0
+        for chunk in history_rows(rng, histories, customer_ids, service_ids, employee_ids, first_day, days):
+            with db.engine.begin() as connection:
+                copy_rows(connection, ServiceHistory.__table__, HISTORY_COLUMNS, chunk)
+            loaded += len(chunk)
+            click.echo(f'Lịch sử dịch vụ: {loaded}/{histories}', err=True)
+
+        # Dữ liệu nạp thẳng vào bảng nên bảng tổng hợp và bộ đếm phải được tính lại
+        with db.engine.begin() as connection:
+            rebuild_revenue_daily(connection)
+            reconcile_counters(connection)
+        with db.engine.connect() as connection:
+            # Cập nhật thống kê để planner chọn đúng index như trên database thật
+            connection.execution_options(isolation_level='AUTOCOMMIT').execute(text('ANALYZE'))
+    click.echo(f'Hoàn tất sau {time.perf_counter() - started:.1f} giây.')
+
+
+if __name__ == '__main__':
+    generate()
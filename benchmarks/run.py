@@ -0,0 +1,207 @@
+"""Chạy các kịch bản benchmark qua Flask test client và in kết quả JSON (độ trễ p50/p95/p99, số truy vấn SQL).
+
+Dùng database đã sinh bằng benchmarks.generate_data:
+
+    DATABASE_URL=... python -m benchmarks.run --iterations 200 --output before.json
+"""
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+import click
+from flask import url_for
+from sqlalchemy import event, func
+from app import app
+from models import db, Customer, Service, Employee, ServiceHistory
+
+# Kịch bản chỉ đọc, chạy mặc định; history_add_submit ghi thêm lịch sử dịch vụ nên phải chọn riêng
+READ_SCENARIOS = ('index', 'customer_list_search', 'customer_view', 'service_history_list', 'revenue',
+                  'history_add_form')
+WRITE_SCENARIOS = ('history_add_submit',)
+
+_query_count = 0
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    global _query_count
+    _query_count += 1
+
+
+class Fixtures:
+    """Tham số của các request (khách hàng, từ khóa tìm kiếm, khoảng ngày), chọn cố định theo seed"""
+
+    def __init__(self, rng, size=200):
+        first_id, last_id = db.session.query(func.min(Customer.id), func.max(Customer.id)).one()
+        if first_id is None or not db.session.query(ServiceHistory.id).first():
+            raise click.ClickException('Database chưa có dữ liệu; chạy python -m benchmarks.generate_data trước.')
+        # Tra theo khóa chính thay vì OFFSET để không phải duyệt bảng khách hàng lớn
+        customers = db.session.query(Customer.id, Customer.name, Customer.phone_digits).order_by(Customer.id)
+        rows = [customers.filter(Customer.id >= rng.randint(first_id, last_id)).first() for _ in range(size)]
+        self.customer_ids = [row.id for row in rows]
+        # Tìm theo tên đầy đủ, tên gọi, tên không dấu và một phần số điện thoại như người dùng hay gõ
+        self.search_terms = []
+        for row in rows:
+            words = row.name.split()
+            self.search_terms.append(rng.choice([
+                row.name, words[-1], ' '.join(words[-2:]), row.phone_digits[-4:], row.phone_digits[:6],
+            ]))
+        self.service_ids = [id for (id,) in db.session.query(Service.id)]
+        self.employee_ids = [id for (id,) in db.session.query(Employee.id).filter(Employee.archived_at.is_(None))]
+        first, last = db.session.query(func.min(ServiceHistory.service_date),
+                                       func.max(ServiceHistory.service_date)).one()
+        self.first_day, self.last_day = first.date(), last.date()
+        db.session.remove()
+
+    def date_range(self, rng, max_days):
+        span = (self.last_day - self.first_day).days
+        length = rng.randint(1, min(max_days, span + 1))
+        start = self.first_day + timedelta(days=rng.randint(0, span + 1 - length))
+        return start.isoformat(), (start + timedelta(days=length - 1)).isoformat()
+
+
+def scenario_request(name, rng, fixtures):
+    """(phương thức, endpoint, tham số URL, dữ liệu form) của một lần chạy kịch bản"""
+    if name == 'index':
+        return 'GET', 'index', {}, None
+    if name == 'customer_list_search':
+        return 'GET', 'customer_list', {'search': rng.choice(fixtures.search_terms)}, None
+    if name == 'customer_view':
+        return 'GET', 'customer_view', {'id': rng.choice(fixtures.customer_ids)}, None
+    if name == 'service_history_list':
+        if rng.random() < 0.5:
+            return 'GET', 'service_history_list', {}, None
+        date_from, date_to = fixtures.date_range(rng, 31)
+        return 'GET', 'service_history_list', {'date_from': date_from, 'date_to': date_to}, None
+    if name == 'revenue':
+        start_date, end_date = fixtures.date_range(rng, 366)
+        return 'GET', 'revenue', {'start_date': start_date, 'end_date': end_date}, None
+    if name == 'history_add_form':
+        return 'GET', 'service_history_add', {'customer_id': rng.choice(fixtures.customer_ids)}, None
+    if name == 'history_add_submit':
+        return 'POST', 'service_history_add', {'customer_id': rng.choice(fixtures.customer_ids)}, {
+            'service_id': rng.choice(fixtures.service_ids),
+            'employee_id': rng.choice(fixtures.employee_ids),
+            'service_date': fixtures.last_day.isoformat(),
+            'payment_method': 'Tiền mặt',
+            'amount_raw': '150000',
+            'notes': 'benchmark',
+        }
+    raise ValueError(name)
+
+
+def percentile(values, percent):
+    """Phân vị theo thứ hạng gần nhất của danh sách đã sắp xếp"""
+    if not values:
+        return None
+    rank = max(int(-(-percent * len(values) // 100)), 1)
+    return values[rank - 1]
+
+
+def summarize(latencies, queries, errors):
+    latencies = sorted(latencies)
+    queries = sorted(queries)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'latency_ms': {
+            'min': round(latencies[0], 2),
+            'mean': round(sum(latencies) / len(latencies), 2),
+            'p50': round(percentile(latencies, 50), 2),
+            'p95': round(percentile(latencies, 95), 2),
+            'p99': round(percentile(latencies, 99), 2),
+            'max': round(latencies[-1], 2),
+        },
+        'queries': {
+            'mean': round(sum(queries) / len(queries), 2),
+            'p50': percentile(queries, 50),
+            'p95': percentile(queries, 95),
+            'max': queries[-1],
+        },
+    }
+
+
+def run_scenario(client, name, rng, fixtures, iterations, warmup):
+    global _query_count
+    latencies, queries, errors = [], [], 0
+    for iteration in range(warmup + iterations):
+        method, endpoint, values, data = scenario_request(name, rng, fixtures)
+        with app.test_request_context():
+            url = url_for(endpoint, **values)
+        _query_count = 0
+        started = time.perf_counter()
+        response = client.open(url, method=method, data=data)
+        elapsed = (time.perf_counter() - started) * 1000
+        # Trang thêm lịch sử chuyển hướng (302) sau khi lưu thành công
+        if response.status_code >= 400:
+            errors += 1
+        if iteration >= warmup:
+            latencies.append(elapsed)
+            queries.append(_query_count)
+    return summarize(latencies, queries, errors)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _dataset_size():
+    return {name: db.session.query(func.count(model.id)).scalar()
+            for name, model in (('customers', Customer), ('services', Service), ('employees', Employee),
+                                ('service_histories', ServiceHistory))}
+
+
+@click.command()
+@click.option('--scenario', 'scenarios', multiple=True, type=click.Choice(READ_SCENARIOS + WRITE_SCENARIOS),
+              help='Kịch bản cần chạy (lặp lại để chọn nhiều); mặc định tất cả kịch bản chỉ đọc.')
+@click.option('--iterations', default=100, show_default=True, help='Số request đo của mỗi kịch bản.')
+@click.option('--warmup', default=10, show_default=True, help='Số request chạy trước, không tính (làm nóng cache).')
+@click.option('--seed', default=1, show_default=True, help='Seed chọn tham số request.')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), help='Ghi JSON ra file thay vì stdout.')
+def run(scenarios, iterations, warmup, seed, output):
+    """Đo độ trễ và số truy vấn SQL của các trang chính."""
+    scenarios = scenarios or READ_SCENARIOS
+    with app.app_context():
+        engine = db.engine
+        fixtures = Fixtures(random.Random(seed))
+        dataset = _dataset_size()
+        db.session.remove()
+    event.listen(engine, 'before_cursor_execute', _count_query)
+
+    client = app.test_client()
+    results = {}
+    for name in scenarios:
+        # Mỗi kịch bản có bộ sinh riêng để thêm/bớt kịch bản không đổi tham số của kịch bản khác
+        results[name] = run_scenario(client, name, random.Random(f'{seed}:{name}'), fixtures, iterations, warmup)
+        click.echo(f"{name}: p50 {results[name]['latency_ms']['p50']} ms, "
+                   f"p95 {results[name]['latency_ms']['p95']} ms, "
+                   f"{results[name]['queries']['mean']} truy vấn", err=True)
+    event.remove(engine, 'before_cursor_execute', _count_query)
+
+    report = {
+        'started_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'database': engine.dialect.name,
+        'dataset': dataset,
+        'iterations': iterations,
+        'warmup': warmup,
+        'seed': seed,
+        'scenarios': results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if output:
+        with open(output, 'w', encoding='utf-8') as file:
+            file.write(text + '\n')
+    else:
+        sys.stdout.write(text + '\n')
+
+
+if __name__ == '__main__':
+    run()
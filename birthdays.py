@@ -0,0 +1,48 @@
+from datetime import timedelta
+from sqlalchemy import case, or_
+from models import Customer, birth_month_day
+from timezone_utils import salon_today
+
+
+def birthday_filter(month, day=None):
+    """Điều kiện lọc khách hàng theo tháng (và ngày) sinh, dùng index birth_month_day"""
+    if day:
+        return Customer.birth_month_day == month * 100 + day
+    return Customer.birth_month_day.between(month * 100 + 1, month * 100 + 31)
+
+
+def upcoming_birthdays_query(days, today=None):
+    """Khách hàng có sinh nhật trong `days` ngày tới (tính cả hôm nay), theo giờ salon.
+
+    Khoảng thời gian vắt qua năm mới (tháng 12 -> tháng 1) được tách thành hai
+    khoảng khóa; kết quả xếp theo sinh nhật gần nhất trước.
+    """
+    today = today or salon_today()
+    if days >= 365:
+        return Customer.query.filter(Customer.birth_month_day.isnot(None)).order_by(
+            case((Customer.birth_month_day >= birth_month_day(today), 0), else_=1),
+            Customer.birth_month_day, Customer.name)
+
+    start_key = birth_month_day(today)
+    end_key = birth_month_day(today + timedelta(days=days))
+    if start_key <= end_key:
+        return Customer.query.filter(Customer.birth_month_day.between(start_key, end_key)).order_by(
+            Customer.birth_month_day, Customer.name)
+
+    return Customer.query.filter(or_(
+        Customer.birth_month_day >= start_key,
+        Customer.birth_month_day <= end_key,
+    )).order_by(
+        case((Customer.birth_month_day >= start_key, 0), else_=1),
+        Customer.birth_month_day, Customer.name)
+
+
+def days_until_birthday(birth_date, today):
+    """Số ngày từ hôm nay tới sinh nhật kế tiếp (29/02 được tính là 28/02 vào năm không nhuận)"""
+    for year in (today.year, today.year + 1):
+        try:
+            next_birthday = birth_date.replace(year=year)
+        except ValueError:
+            next_birthday = birth_date.replace(year=year, day=28)
+        if next_birthday >= today:
+            return (next_birthday - today).days
@@ -0,0 +1,407 @@
+import csv
+import io
+import time
+from collections import defaultdict
+from datetime import date, datetime
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, insert, select
+from models import db, Customer, Service, Employee, ServiceHistory, birth_month_day
+from db_utils import copy_rows
+from text_utils import fold_text, digits_only
+from timezone_utils import to_local_date
+from revenue_rollup import apply_revenue_deltas
+from dashboard_counters import adjust_counters
+
+# Số dòng xử lý và ghi trong một transaction
+CHUNK_SIZE = 5000
+# Số khóa tối đa trong một câu IN khi tra cứu
+LOOKUP_BATCH_SIZE = 1000
+
+IMPORT_KINDS = ('customers', 'histories')
+IMPORT_EXTENSIONS = {'csv', 'xlsx'}
+
+# Tên cột trong file (đã bỏ dấu, khoảng trắng thành '_') -> tên trường
+HEADER_ALIASES = {
+    'ten': 'name', 'ho_ten': 'name', 'ho_va_ten': 'name', 'ten_khach_hang': 'name', 'khach_hang': 'name',
+    'so_dien_thoai': 'phone', 'dien_thoai': 'phone', 'sdt': 'phone', 'customer_phone': 'phone',
+    'ngay_sinh': 'birth_date',
+    'dia_chi': 'address',
+    'ghi_chu': 'notes', 'note': 'notes',
+    'dich_vu': 'service', 'service_name': 'service',
+    'nhan_vien': 'employee', 'employee_name': 'employee',
+    'ngay': 'service_date', 'ngay_su_dung': 'service_date', 'ngay_dich_vu': 'service_date', 'date': 'service_date',
+    'gia': 'price', 'so_tien': 'price', 'thanh_tien': 'price', 'amount': 'price',
+    'thanh_toan': 'payment_method', 'phuong_thuc_thanh_toan': 'payment_method',
+}
+
+DEFAULT_PAYMENT_METHOD = 'Tiền mặt'
+
+CUSTOMER_COLUMNS = ('name', 'phone', 'birth_date', 'address', 'notes', 'search_name', 'phone_digits',
+                    'birth_month_day', 'created_at', 'updated_at')
+HISTORY_COLUMNS = ('customer_id', 'service_id', 'employee_id', 'service_date', 'price', 'payment_method',
+                   'notes', 'created_at', 'updated_at')
+
+import_cli = AppGroup('import', help='Nhập dữ liệu hàng loạt từ file CSV/XLSX.')
+
+
+class RowError(ValueError):
+    """Lỗi dữ liệu của một dòng, được ghi vào báo cáo lỗi"""
+
+
+class ImportReport:
+    """Kết quả nhập: số dòng đã thêm, bị bỏ qua, bị lỗi và file CSV liệt kê từng dòng không được nhập"""
+
+    def __init__(self, error_path):
+        self.error_path = error_path
+        self.inserted = 0
+        self.duplicates = 0
+        self.errors = 0
+        self._file = None
+        self._writer = None
+
+    def _write(self, row_number, message, row):
+        if self._writer is None:
+            self._file = open(self.error_path, 'w', newline='', encoding='utf-8-sig')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(['dong', 'loi', 'du_lieu'])
+        values = '; '.join(f'{key}={value}' for key, value in row.items() if value not in (None, ''))
+        self._writer.writerow([row_number, message, values])
+
+    def add_error(self, row_number, message, row):
+        self.errors += 1
+        self._write(row_number, message, row)
+
+    def add_duplicate(self, row_number, row):
+        self.duplicates += 1
+        self._write(row_number, 'Bỏ qua: trùng số điện thoại', row)
+
+    @property
+    def has_error_file(self):
+        return self._writer is not None
+
+    def close(self):
+        if self._file:
+            self._file.close()
+
+
+def _field_name(header):
+    key = fold_text(str(header or '')).replace(' ', '_')
+    return HEADER_ALIASES.get(key, key)
+
+
+def read_rows(stream, filename):
+    """Đọc lần lượt các dòng của file CSV/XLSX (stream nhị phân), trả về (số dòng, dict theo tên trường).
+
+    Không đọc cả file vào bộ nhớ; số dòng tính cả dòng tiêu đề như khi mở file bằng Excel.
+    """
+    extension = filename.rsplit('.', 1)[-1].lower()
+    if extension == 'csv':
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        reader = csv.reader(text)
+    elif extension == 'xlsx':
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise RuntimeError('Cần cài openpyxl để nhập file XLSX (pip install openpyxl).')
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+        reader = workbook.active.iter_rows(values_only=True)
+    else:
+        raise RuntimeError(f'Không hỗ trợ định dạng .{extension}, chỉ nhận CSV hoặc XLSX.')
+
+    header = None
+    for row_number, values in enumerate(reader, start=1):
+        if header is None:
+            header = [_field_name(value) for value in values]
+            continue
+        if not any(value not in (None, '') for value in values):
+            continue
+        yield row_number, {field: value for field, value in zip(header, values)}
+
+
+def _text(row, field):
+    value = row.get(field)
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def parse_birth_date(value):
+    """Ngày sinh dd-mm-yyyy, dd/mm/yyyy, yyyy-mm-dd hoặc dd-mm (năm 1900 như form thêm khách hàng)"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    value = str(value or '').strip().replace('/', '-')
+    if not value:
+        return None
+    for fmt in ('%d-%m-%Y', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    try:
+        return datetime.strptime(value, '%d-%m').date().replace(year=1900)
+    except ValueError:
+        raise RowError(f'Ngày sinh không hợp lệ: {value}')
+
+
+def parse_service_date(value):
+    """Ngày/giờ sử dụng dịch vụ: ô ngày của Excel, yyyy-mm-dd[ HH:MM] hoặc dd-mm-yyyy[ HH:MM]"""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time())
+    value = str(value or '').strip().replace('/', '-').replace('T', ' ')
+    if not value:
+        raise RowError('Thiếu ngày sử dụng dịch vụ')
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d', '%d-%m-%Y %H:%M', '%d-%m-%Y'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise RowError(f'Ngày sử dụng dịch vụ không hợp lệ: {value}')
+
+
+def parse_price(value):
+    """Số tiền: số trong ô Excel hoặc chuỗi như '150.000', '150,000' (dấu phân cách hàng nghìn)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    digits = str(value or '').strip().replace('.', '').replace(',', '').replace(' ', '')
+    if not digits.isdigit():
+        raise RowError(f'Số tiền không hợp lệ: {value}')
+    return float(digits)
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class LookupCache:
+    """Tra id theo khóa đã chuẩn hóa (số điện thoại, tên) cho cả lô dòng một lúc.
+
+    Bảng lớn (khách hàng) được tra bằng các câu IN theo lô, kết quả giữ lại cho các lô sau và bị
+    xóa khi vượt `max_entries`; bảng nhỏ (dịch vụ, nhân viên) được nạp một lần bằng preload().
+    """
+
+    def __init__(self, key_column, id_column, normalize=None, max_entries=100_000):
+        self.key_column = key_column
+        self.id_column = id_column
+        self.normalize = normalize or (lambda value: value)
+        self.max_entries = max_entries
+        self.ids = {}
+
+    def preload(self, connection):
+        # Duyệt id giảm dần để khóa trùng nhận id nhỏ nhất
+        rows = connection.execute(select(self.key_column, self.id_column).order_by(self.id_column.desc()))
+        for key, row_id in rows:
+            self.ids[self.normalize(key)] = row_id
+
+    def resolve(self, connection, keys):
+        """Tra các khóa chưa có trong cache; key_column phải lưu sẵn giá trị đã chuẩn hóa"""
+        missing = [key for key in set(keys) if key and key not in self.ids]
+        if len(self.ids) + len(missing) > self.max_entries:
+            self.ids.clear()
+            missing = [key for key in set(keys) if key]
+        for start in range(0, len(missing), LOOKUP_BATCH_SIZE):
+            batch = missing[start:start + LOOKUP_BATCH_SIZE]
+            found = dict(connection.execute(
+                select(self.key_column, func.min(self.id_column))
+                .where(self.key_column.in_(batch)).group_by(self.key_column)).all())
+            for key in batch:
+                self.ids[key] = found.get(key)
+
+    def get(self, key):
+        return self.ids.get(key)
+
+    def add(self, key, row_id):
+        self.ids[key] = row_id
+
+
+def _name_key(value):
+    return ' '.join((value or '').lower().split())
+
+
+def import_customers(stream, filename, report, chunk_size=CHUNK_SIZE):
+    """Nhập khách hàng; bỏ qua dòng trùng số điện thoại (sau chuẩn hóa) trong file hoặc đã có trong DB.
+
+    Mỗi lô được ghi và commit riêng nên dòng trùng với lô trước cũng được phát hiện qua DB.
+    """
+    for chunk in _chunks(read_rows(stream, filename), chunk_size):
+        now = datetime.utcnow()
+        parsed = []
+        for row_number, row in chunk:
+            try:
+                name = _text(row, 'name')
+                phone = _text(row, 'phone')
+                if not name or not phone:
+                    raise RowError('Thiếu họ tên hoặc số điện thoại')
+                phone_digits = digits_only(phone)
+                if not phone_digits:
+                    raise RowError(f'Số điện thoại không hợp lệ: {phone}')
+                birth_date = parse_birth_date(row.get('birth_date'))
+            except RowError as e:
+                report.add_error(row_number, str(e), row)
+                continue
+            parsed.append((row_number, row, (
+                name, phone, birth_date, _text(row, 'address') or None, _text(row, 'notes') or None,
+                fold_text(name), phone_digits, birth_month_day(birth_date), now, now,
+            )))
+
+        with db.engine.begin() as connection:
+            existing = set()
+            phones = list({values[6] for _, _, values in parsed})
+            for start in range(0, len(phones), LOOKUP_BATCH_SIZE):
+                existing.update(connection.execute(
+                    select(Customer.phone_digits).where(Customer.phone_digits.in_(phones[start:start + LOOKUP_BATCH_SIZE]))
+                ).scalars())
+
+            rows = []
+            for row_number, row, values in parsed:
+                if values[6] in existing:
+                    report.add_duplicate(row_number, row)
+                    continue
+                existing.add(values[6])
+                rows.append(values)
+
+            if rows:
+                copy_rows(connection, Customer.__table__, CUSTOMER_COLUMNS, rows)
+                adjust_counters(connection, {'customers': len(rows)})
+            report.inserted += len(rows)
+    return report
+
+
+def _create_missing(connection, model, cache, names, counter_name):
+    """Thêm dịch vụ/nhân viên chưa có theo tên, cập nhật cache và bộ đếm"""
+    now = datetime.utcnow()
+    created = connection.execute(
+        insert(model).returning(model.id, model.name),
+        [{'name': name, 'created_at': now, 'updated_at': now} for name in names],
+    ).all()
+    for row_id, name in created:
+        cache.add(_name_key(name), row_id)
+    adjust_counters(connection, {counter_name: len(created)})
+
+
+def import_histories(stream, filename, report, chunk_size=CHUNK_SIZE, create_missing=False):
+    """Nhập lịch sử dịch vụ. Khách hàng tra theo số điện thoại (phải có sẵn), dịch vụ và nhân viên tra
+    theo tên (không phân biệt hoa thường); `create_missing` cho phép tạo dịch vụ/nhân viên chưa có.
+
+    Bảng revenue_daily và bộ đếm trang chủ được cập nhật trong cùng transaction với mỗi lô.
+    """
+    customers = LookupCache(Customer.phone_digits, Customer.id)
+    services = LookupCache(Service.name, Service.id, _name_key)
+    employees = LookupCache(Employee.name, Employee.id, _name_key)
+    with db.engine.connect() as connection:
+        services.preload(connection)
+        employees.preload(connection)
+
+    for chunk in _chunks(read_rows(stream, filename), chunk_size):
+        now = datetime.utcnow()
+        parsed = []
+        for row_number, row in chunk:
+            try:
+                phone = digits_only(_text(row, 'phone'))
+                service = _text(row, 'service')
+                employee = _text(row, 'employee')
+                if not phone or not service or not employee:
+                    raise RowError('Thiếu số điện thoại khách hàng, dịch vụ hoặc nhân viên')
+                service_date = parse_service_date(row.get('service_date'))
+                price = parse_price(row.get('price'))
+            except RowError as e:
+                report.add_error(row_number, str(e), row)
+                continue
+            parsed.append((row_number, row, phone, service, employee, service_date, price))
+
+        with db.engine.begin() as connection:
+            customers.resolve(connection, [item[2] for item in parsed])
+
+            if create_missing:
+                for model, cache, index, counter_name in ((Service, services, 3, 'services'),
+                                                          (Employee, employees, 4, 'employees')):
+                    names = {}
+                    for item in parsed:
+                        if cache.get(_name_key(item[index])) is None:
+                            names.setdefault(_name_key(item[index]), item[index])
+                    if names:
+                        _create_missing(connection, model, cache, list(names.values()), counter_name)
+
+            rows = []
+            deltas = defaultdict(lambda: [0, 0.0])
+            for row_number, row, phone, service, employee, service_date, price in parsed:
+                customer_id = customers.get(phone)
+                service_id = services.get(_name_key(service))
+                employee_id = employees.get(_name_key(employee))
+                if customer_id is None:
+                    report.add_error(row_number, f'Không tìm thấy khách hàng có số điện thoại {phone}', row)
+                    continue
+                if service_id is None:
+                    report.add_error(row_number, f'Không tìm thấy dịch vụ: {service}', row)
+                    continue
+                if employee_id is None:
+                    report.add_error(row_number, f'Không tìm thấy nhân viên: {employee}', row)
+                    continue
+                payment_method = _text(row, 'payment_method') or DEFAULT_PAYMENT_METHOD
+                rows.append((customer_id, service_id, employee_id, service_date, price, payment_method,
+                             _text(row, 'notes') or None, now, now))
+                entry = deltas[(to_local_date(service_date), service_id, employee_id, payment_method)]
+                entry[0] += 1
+                entry[1] += price
+
+            if rows:
+                copy_rows(connection, ServiceHistory.__table__, HISTORY_COLUMNS, rows)
+                apply_revenue_deltas(connection, deltas)
+                adjust_counters(connection, {'service_histories': len(rows)})
+            report.inserted += len(rows)
+    return report
+
+
+def run_import(kind, stream, filename, error_path, chunk_size=CHUNK_SIZE, create_missing=False):
+    """Nhập một file theo loại dữ liệu (customers/histories), trả về ImportReport"""
+    report = ImportReport(error_path)
+    try:
+        if kind == 'customers':
+            import_customers(stream, filename, report, chunk_size)
+        else:
+            import_histories(stream, filename, report, chunk_size, create_missing)
+    finally:
+        report.close()
+    return report
+
+
+def _import_command(kind, path, errors, chunk_size, create_missing=False):
+    started = time.monotonic()
+    error_path = errors or f'{path}.errors.csv'
+    with open(path, 'rb') as stream:
+        report = run_import(kind, stream, path, error_path, chunk_size, create_missing)
+    elapsed = time.monotonic() - started
+    click.echo(f'Đã thêm {report.inserted} dòng, bỏ qua {report.duplicates} dòng trùng, '
+               f'{report.errors} dòng lỗi trong {elapsed:.1f} giây.')
+    if report.has_error_file:
+        click.echo(f'Chi tiết các dòng không được nhập: {error_path}')
+
+
+@import_cli.command('customers')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--errors', type=click.Path(dir_okay=False), help='File báo cáo lỗi (mặc định PATH.errors.csv)')
+@click.option('--chunk-size', default=CHUNK_SIZE, show_default=True, help='Số dòng mỗi lô')
+def import_customers_command(path, errors, chunk_size):
+    """Nhập khách hàng (họ tên, số điện thoại, ngày sinh, địa chỉ, ghi chú)."""
+    _import_command('customers', path, errors, chunk_size)
+
+
+@import_cli.command('histories')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--errors', type=click.Path(dir_okay=False), help='File báo cáo lỗi (mặc định PATH.errors.csv)')
+@click.option('--chunk-size', default=CHUNK_SIZE, show_default=True, help='Số dòng mỗi lô')
+@click.option('--create-missing', is_flag=True, help='Tạo dịch vụ và nhân viên chưa có theo tên')
+def import_histories_command(path, errors, chunk_size, create_missing):
+    """Nhập lịch sử dịch vụ (số điện thoại khách, dịch vụ, nhân viên, ngày, số tiền, thanh toán, ghi chú)."""
+    _import_command('histories', path, errors, chunk_size, create_missing)
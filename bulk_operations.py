@@ -0,0 +1,96 @@
+from datetime import datetime
+from sqlalchemy import delete, func, select, update
+from models import db, Customer, Employee, ServiceHistory, ServiceHistoryImage
+from revenue_rollup import apply_revenue_deltas
+from dashboard_counters import adjust_counters
+from image_uploads import stored_locations, release_locations
+from timezone_utils import local_date
+
+# Số ảnh mỗi lần kiểm tra tham chiếu và xếp hàng xóa file
+RELEASE_BATCH_SIZE = 1000
+
+
+def _revenue_groups(connection, criterion):
+    """Số lượt và tổng tiền của các lịch sử thỏa `criterion`, theo khóa của revenue_daily"""
+    day = local_date(ServiceHistory.service_date)
+    rows = connection.execute(
+        select(day, ServiceHistory.service_id, ServiceHistory.employee_id, ServiceHistory.payment_method,
+               func.count(ServiceHistory.id), func.coalesce(func.sum(ServiceHistory.price), 0))
+        .where(criterion)
+        .group_by(day, ServiceHistory.service_id, ServiceHistory.employee_id, ServiceHistory.payment_method)
+    )
+    return {(row[0], row[1], row[2], row[3]): (row[4], float(row[5])) for row in rows}
+
+
+def delete_customer(customer_id):
+    """Xóa khách hàng cùng toàn bộ lịch sử dịch vụ và ảnh bằng vài câu SQL theo tập hợp.
+
+    Các câu DELETE hàng loạt không đi qua session nên bảng doanh thu tổng hợp và bộ đếm trang chủ
+    được cập nhật trực tiếp; file ảnh không còn dùng được xếp hàng xóa (outbox). Trả về số lịch sử
+    đã xóa, hoặc None nếu không có khách hàng. Người gọi commit.
+    """
+    # Khóa dòng khách hàng trước mọi câu DELETE: không có khách hàng thì không xóa gì, và trong lúc xóa
+    # không request nào thêm được lịch sử dịch vụ mới cho khách hàng này
+    customer = db.session.query(Customer.id).filter(Customer.id == customer_id).with_for_update().first()
+    if customer is None:
+        return None
+
+    connection = db.session.connection()
+    histories = select(ServiceHistory.id).where(ServiceHistory.customer_id == customer_id)
+
+    revenue = _revenue_groups(connection, ServiceHistory.customer_id == customer_id)
+    images = db.session.query(
+        ServiceHistoryImage.storage_backend, ServiceHistoryImage.storage_key, ServiceHistoryImage.variants,
+    ).filter(ServiceHistoryImage.service_history_id.in_(histories))
+    locations = stored_locations([row._asdict() for row in images])
+
+    db.session.execute(delete(ServiceHistoryImage).where(ServiceHistoryImage.service_history_id.in_(histories)),
+                       execution_options={'synchronize_session': False})
+    deleted_histories = db.session.execute(
+        delete(ServiceHistory).where(ServiceHistory.customer_id == customer_id),
+        execution_options={'synchronize_session': False}).rowcount
+    db.session.execute(delete(Customer).where(Customer.id == customer_id),
+                       execution_options={'synchronize_session': False})
+
+    apply_revenue_deltas(connection, {key: [-count, -total] for key, (count, total) in revenue.items()})
+    adjust_counters(connection, {'customers': -1, 'service_histories': -deleted_histories})
+
+    # Ảnh trùng nội dung có thể còn được lịch sử của khách hàng khác dùng, chỉ xóa file không còn ai dùng
+    items = list(locations.items())
+    for start in range(0, len(items), RELEASE_BATCH_SIZE):
+        release_locations(dict(items[start:start + RELEASE_BATCH_SIZE]))
+    return deleted_histories
+
+
+def reassign_employee(from_id, to_id, archive=True):
+    """Chuyển toàn bộ lịch sử dịch vụ của nhân viên `from_id` sang `to_id` bằng một câu UPDATE.
+
+    Doanh thu tổng hợp theo nhân viên được chuyển theo. Với `archive`, nhân viên cũ được lưu trữ
+    (ẩn khỏi danh sách) thay vì xóa, để các tham chiếu cũ vẫn hợp lệ. Trả về số lịch sử đã chuyển.
+    Người gọi commit.
+    """
+    if from_id == to_id:
+        raise ValueError('Phải chọn một nhân viên khác để nhận lịch sử dịch vụ.')
+    target = db.session.query(Employee.id).filter(Employee.id == to_id, Employee.archived_at.is_(None)).first()
+    if target is None:
+        raise ValueError('Nhân viên nhận lịch sử dịch vụ không tồn tại hoặc đã nghỉ việc.')
+
+    connection = db.session.connection()
+    revenue = _revenue_groups(connection, ServiceHistory.employee_id == from_id)
+    moved = db.session.execute(
+        update(ServiceHistory).where(ServiceHistory.employee_id == from_id).values(employee_id=to_id),
+        execution_options={'synchronize_session': False}).rowcount
+
+    deltas = {}
+    for (day, service_id, _, payment_method), (count, total) in revenue.items():
+        deltas[(day, service_id, from_id, payment_method)] = [-count, -total]
+        deltas[(day, service_id, to_id, payment_method)] = [count, total]
+    apply_revenue_deltas(connection, deltas)
+
+    if archive:
+        archived = db.session.execute(
+            update(Employee).where(Employee.id == from_id, Employee.archived_at.is_(None))
+            .values(archived_at=datetime.utcnow()),
+            execution_options={'synchronize_session': False}).rowcount
+        adjust_counters(connection, {'employees': -archived})
+    return moved
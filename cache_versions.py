@@ -0,0 +1,18 @@
+from models import db, CacheVersion
+from db_utils import upsert_insert
+
+
+def bump_cache_version(connection, name):
+    """Tăng phiên bản của một nhóm dữ liệu, trong transaction hiện tại của `connection`"""
+    statement = upsert_insert(connection, CacheVersion).values(name=name, version=1)
+    statement = statement.on_conflict_do_update(
+        index_elements=[CacheVersion.name],
+        set_={'version': CacheVersion.version + 1},
+    )
+    connection.execute(statement)
+
+
+def read_cache_version(name):
+    """Phiên bản hiện tại của một nhóm dữ liệu (0 nếu chưa từng thay đổi)"""
+    version = db.session.query(CacheVersion.version).filter(CacheVersion.name == name).scalar()
+    return version or 0
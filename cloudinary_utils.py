@@ -2,6 +2,7 @@ import cloudinary
 import cloudinary.uploader
 import cloudinary.api
 from config import Config
+from metrics import timed_cloudinary_call
 
 def configure_cloudinary(app):
     """Cấu hình Cloudinary với các thông tin từ app config"""
@@ -12,14 +13,21 @@ def configure_cloudinary(app):
         secure=True
     )
 
-def upload_to_cloudinary(file, folder=None):
-    """Tải file lên Cloudinary"""
+def upload_to_cloudinary(file, folder=None, timeout=None, public_id=None):
+    """Tải file lên Cloudinary; `timeout` (giây) giới hạn thời gian chờ phản hồi.
+
+    Khi có `public_id` (khóa theo nội dung), ảnh đã tồn tại sẽ không bị ghi đè.
+    """
     try:
-        upload_result = cloudinary.uploader.upload(
-            file,
-            folder=folder,
-            resource_type="auto"
-        )
+        with timed_cloudinary_call('upload'):
+            upload_result = cloudinary.uploader.upload(
+                file,
+                folder=folder,
+                resource_type="auto",
+                timeout=timeout,
+                public_id=public_id,
+                overwrite=public_id is None
+            )
         return {
             'public_id': upload_result['public_id'],
             'url': upload_result['secure_url']
@@ -34,7 +42,8 @@ def delete_from_cloudinary(public_id):
         if not public_id:
             return False
             
-        result = cloudinary.uploader.destroy(public_id)
+        with timed_cloudinary_call('delete'):
+            result = cloudinary.uploader.destroy(public_id)
         return result.get('result') == 'ok'
     except Exception as e:
         print(f"Error deleting from Cloudinary: {e}")
@@ -30,9 +30,53 @@ class Config:
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads')
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    # Chuẩn hóa ảnh tải lên: cạnh dài nhất (px), chất lượng JPEG và các ảnh thu nhỏ {tên: cạnh dài nhất}
+    IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', 1600))
+    IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', 82))
+    IMAGE_VARIANTS = {'thumb': 200, 'medium': 800}
+    # Các chiều rộng (px) cho srcset; ảnh local được thu nhỏ khi cần và cache trên đĩa tới giới hạn dung lượng
+    IMAGE_SRCSET_WIDTHS = (96, 200, 400, 800)
+    IMAGE_RESIZE_CACHE_MAX_BYTES = int(os.getenv('IMAGE_RESIZE_CACHE_MAX_MB', 512)) * 1024 * 1024
+    # Nơi lưu ảnh tải lên: local, cloudinary hoặc s3 (mặc định Cloudinary nếu đã cấu hình)
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'cloudinary' if os.getenv('CLOUDINARY_CLOUD_NAME') else 'local')
+    # Cấu hình S3 hoặc dịch vụ tương thích S3; thông tin đăng nhập lấy từ biến môi trường AWS_* của boto3
+    S3_BUCKET = os.getenv('S3_BUCKET')
+    S3_PREFIX = os.getenv('S3_PREFIX', 'salon_uploads')
+    S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL')
+    S3_REGION = os.getenv('S3_REGION')
+    S3_PUBLIC_URL = os.getenv('S3_PUBLIC_URL')  # URL công khai của bucket (CDN), để trống thì dùng URL mặc định
+    # Xóa file trong outbox: thời gian chờ (giây) trước lần thử lại đầu tiên, tăng gấp đôi tới mức tối đa
+    OUTBOX_RETRY_DELAY = 30
+    OUTBOX_MAX_RETRY_DELAY = 3600
+    # Chỉ xóa object đã xếp hàng ít nhất bấy nhiêu giây: lần tải lên lại cùng ảnh (khóa theo nội dung) đang dở
+    # sẽ kịp commit tham chiếu mới, khi đó object được giữ lại
+    OUTBOX_GRACE_PERIOD = int(os.getenv('OUTBOX_GRACE_PERIOD', 3600))
+    # Tải ảnh lên song song: số thread, thời hạn mỗi lần thử (giây), số lần thử lại
+    UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', 4))
+    UPLOAD_TIMEOUT = int(os.getenv('UPLOAD_TIMEOUT', 30))
+    UPLOAD_RETRIES = 2
+    UPLOAD_RETRY_BACKOFF = 0.5
+    # Phục vụ file upload: thời gian cache (giây) cho file đặt tên theo nội dung, và chế độ để proxy phía trước
+    # gửi file (x-accel-redirect cho nginx, x-sendfile cho Apache/lighttpd; để trống thì ứng dụng tự gửi)
+    MEDIA_CACHE_MAX_AGE = 365 * 24 * 3600
+    MEDIA_SENDFILE = os.getenv('MEDIA_SENDFILE') or None
+    MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-uploads/')
+    # Đo thời gian SQL/render của request (Server-Timing, trang /_debug/requests): tỉ lệ request được lấy mẫu,
+    # số request giữ lại mỗi worker, số lần lặp một câu SELECT bị coi là N+1, token bảo vệ trang xem kết quả
+    PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', '').lower() in ('1', 'true', 'yes')
+    PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', 1.0))
+    PROFILER_HISTORY = 200
+    PROFILER_N_PLUS_ONE_THRESHOLD = 5
+    PROFILER_TOKEN = os.getenv('PROFILER_TOKEN')
+    # Token (Authorization: Bearer ...) bắt buộc khi đọc /metrics, để trống nếu chỉ mở trong mạng nội bộ
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    # Thư mục lưu báo cáo lỗi khi nhập dữ liệu (không nằm trong static)
+    IMPORT_REPORT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'import_reports')
 
     # Cấu hình phân trang
     ITEMS_PER_PAGE = 10
+    # Số lịch sử tối thiểu mỗi lần tải trang lịch sử dịch vụ (luôn trả về trọn ngày)
+    HISTORY_FEED_PER_PAGE = 50
     
     # Cấu hình Cloudinary
     CLOUDINARY_CLOUD_NAME = os.getenv('CLOUDINARY_CLOUD_NAME')
@@ -40,5 +84,12 @@ class Config:
     CLOUDINARY_API_SECRET = os.getenv('CLOUDINARY_API_SECRET')
     CLOUDINARY_FOLDER = os.getenv('CLOUDINARY_FOLDER', 'salon_uploads')
 
+    # Cấu hình xuất biên nhận PDF
+    PDF_FONT_PATH = os.getenv('PDF_FONT_PATH')  # Font TTF có dấu tiếng Việt, mặc định dùng DejaVu Sans nếu có
+    PDF_WORKERS = int(os.getenv('PDF_WORKERS', min(4, os.cpu_count() or 1)))  # Số tiến trình vẽ PDF song song
+    PDF_MAX_RECEIPTS = 5000  # Số biên nhận tối đa mỗi lần xuất trên web
+
     # Cấu hình thời gian
-    TIMEZONE = 'Asia/Ho_Chi_Minh'
\ No newline at end of file
+    TIMEZONE = 'Asia/Ho_Chi_Minh'
+    # Múi giờ của giá trị service_date lưu trong DB (không kèm múi giờ)
+    SERVICE_DATE_TIMEZONE = os.getenv('SERVICE_DATE_TIMEZONE', TIMEZONE)
@@ -0,0 +1,110 @@
+import re
+from sqlalchemy import case, false, func, or_
+from models import db, Customer
+from text_utils import fold_text, digits_only, escape_like
+
+# Ngưỡng độ giống theo từ, bằng giá trị mặc định pg_trgm.word_similarity_threshold
+WORD_SIMILARITY_THRESHOLD = 0.6
+
+
+def _has_letters(value):
+    return any(ch.isalpha() for ch in value)
+
+
+def search_customers(term):
+    """Truy vấn khách hàng theo tên (không phân biệt dấu) hoặc số điện thoại.
+
+    Kết quả xếp theo độ giống của tên với từ khóa, sau đó theo tên.
+    PostgreSQL dùng index trigram (pg_trgm); database khác (SQLite khi phát triển)
+    dùng CustomerSearchIndex viết bằng Python với cùng quy tắc so khớp.
+    """
+    name_term = fold_text(term)
+    phone_term = digits_only(term)
+    if not _has_letters(name_term):
+        name_term = ''
+    if not name_term and not phone_term:
+        return Customer.query.order_by(Customer.name.asc())
+
+    if db.engine.dialect.name == 'postgresql':
+        return _search_postgresql(name_term, phone_term)
+    return _search_fallback(name_term, phone_term)
+
+
+def _search_postgresql(name_term, phone_term):
+    conditions = []
+    if name_term:
+        conditions.append(Customer.search_name.like(f'%{escape_like(name_term)}%', escape='\\'))
+        # search_name %> term  <=>  word_similarity(term, search_name) >= ngưỡng
+        conditions.append(Customer.search_name.op('%>')(name_term))
+    if phone_term:
+        conditions.append(Customer.phone_digits.like(f'%{phone_term}%'))
+
+    query = Customer.query.filter(or_(*conditions))
+    if name_term:
+        query = query.order_by(func.word_similarity(name_term, Customer.search_name).desc())
+    return query.order_by(Customer.name.asc())
+
+
+def _search_fallback(name_term, phone_term):
+    index = CustomerSearchIndex.build()
+    ranked_ids = index.search(name_term, phone_term)
+    if not ranked_ids:
+        return Customer.query.filter(false())
+    position = case({customer_id: i for i, customer_id in enumerate(ranked_ids)}, value=Customer.id)
+    return Customer.query.filter(Customer.id.in_(ranked_ids)).order_by(position)
+
+
+def trigrams(value):
+    """Tập trigram của chuỗi theo cách pg_trgm: mỗi từ được đệm '  ' phía trước và ' ' phía sau"""
+    result = set()
+    for word in re.findall(r'[0-9a-z]+', value):
+        padded = f'  {word} '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def word_similarity(term, text):
+    """Tỷ lệ trigram của từ khóa có mặt trong chuỗi (xấp xỉ word_similarity của pg_trgm)"""
+    term_trigrams = trigrams(term)
+    if not term_trigrams:
+        return 0.0
+    return len(term_trigrams & trigrams(text)) / len(term_trigrams)
+
+
+class CustomerSearchIndex:
+    """Index trigram trong bộ nhớ, thay thế pg_trgm trên database không phải PostgreSQL"""
+
+    def __init__(self):
+        self.entries = {}   # id -> (search_name, phone_digits, name)
+        self.postings = {}  # trigram -> tập id khách hàng
+
+    @classmethod
+    def build(cls):
+        index = cls()
+        rows = db.session.query(Customer.id, Customer.search_name, Customer.phone_digits, Customer.name)
+        for customer_id, search_name, phone, name in rows:
+            index.add(customer_id, search_name or '', phone or '', name or '')
+        return index
+
+    def add(self, customer_id, search_name, phone, name):
+        self.entries[customer_id] = (search_name, phone, name)
+        for trigram in trigrams(search_name):
+            self.postings.setdefault(trigram, set()).add(customer_id)
+
+    def search(self, name_term, phone_term):
+        """Trả về danh sách id khách hàng khớp, đã xếp hạng"""
+        scores = {}
+        if name_term:
+            # Ứng viên gần đúng: có chung ít nhất một trigram với từ khóa
+            candidates = set()
+            for trigram in trigrams(name_term):
+                candidates |= self.postings.get(trigram, set())
+            for customer_id in candidates:
+                score = word_similarity(name_term, self.entries[customer_id][0])
+                if score >= WORD_SIMILARITY_THRESHOLD:
+                    scores[customer_id] = score
+        # Khớp chuỗi con, tương đương LIKE '%...%'
+        for customer_id, (search_name, phone, _) in self.entries.items():
+            if (name_term and name_term in search_name) or (phone_term and phone_term in phone):
+                scores.setdefault(customer_id, word_similarity(name_term, search_name))
+        return sorted(scores, key=lambda customer_id: (-scores[customer_id], self.entries[customer_id][2]))
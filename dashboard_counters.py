@@ -0,0 +1,93 @@
+from collections import Counter
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from models import db, Customer, Employee, Service, ServiceHistory, RevenueDaily, DashboardCounter
+from db_utils import upsert_insert
+from timezone_utils import salon_today
+
+# Model được đếm -> tên bộ đếm
+COUNTED_MODELS = {
+    Customer: 'customers',
+    Employee: 'employees',
+    Service: 'services',
+    ServiceHistory: 'service_histories',
+}
+
+# Điều kiện để một dòng được đếm: nhân viên đã lưu trữ (nghỉ việc) không được tính
+COUNTED_CRITERIA = {
+    Employee: (Employee.archived_at.is_(None),),
+}
+
+counters_cli = AppGroup('counters', help='Quản lý bộ đếm của trang chủ.')
+
+
+def _is_counted(obj):
+    return getattr(obj, 'archived_at', None) is None
+
+
+def adjust_counters(connection, deltas):
+    """Cộng {tên bộ đếm: số lượng thay đổi} vào dashboard_counter trong transaction hiện tại"""
+    rows = [{'name': name, 'value': delta} for name, delta in deltas.items() if delta]
+    if not rows:
+        return
+    statement = upsert_insert(connection, DashboardCounter)
+    statement = statement.on_conflict_do_update(
+        index_elements=[DashboardCounter.name],
+        set_={'value': DashboardCounter.value + statement.excluded.value},
+    )
+    connection.execute(statement, rows)
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_dashboard_counters(session, flush_context):
+    deltas = Counter()
+    for obj in session.new:
+        name = COUNTED_MODELS.get(type(obj))
+        if name and _is_counted(obj):
+            deltas[name] += 1
+    for obj in session.deleted:
+        name = COUNTED_MODELS.get(type(obj))
+        if name and _is_counted(obj):
+            deltas[name] -= 1
+    if deltas:
+        adjust_counters(session.connection(), deltas)
+
+
+def read_dashboard_stats():
+    """Số liệu cho trang chủ, chỉ đọc bộ đếm và các dòng doanh thu của hôm nay"""
+    counters = dict(db.session.query(DashboardCounter.name, DashboardCounter.value))
+    stats = {name: counters.get(name, 0) for name in COUNTED_MODELS.values()}
+
+    today_rows = db.session.query(RevenueDaily.visit_count, RevenueDaily.revenue_total).filter(
+        RevenueDaily.day == salon_today())
+    stats['today_visits'] = 0
+    stats['today_revenue'] = 0
+    for visit_count, revenue_total in today_rows:
+        stats['today_visits'] += visit_count
+        stats['today_revenue'] += revenue_total
+    return stats
+
+
+def reconcile_counters(connection):
+    """Đếm lại từ đầu và ghi đè các bộ đếm, trả về {tên: giá trị}"""
+    counts = {name: connection.execute(
+                  select(func.count()).select_from(model).where(*COUNTED_CRITERIA.get(model, ()))).scalar()
+              for model, name in COUNTED_MODELS.items()}
+    statement = upsert_insert(connection, DashboardCounter)
+    statement = statement.on_conflict_do_update(
+        index_elements=[DashboardCounter.name],
+        set_={'value': statement.excluded.value},
+    )
+    connection.execute(statement, [{'name': name, 'value': value} for name, value in counts.items()])
+    return counts
+
+
+@counters_cli.command('reconcile')
+def reconcile_command():
+    """Đếm lại số khách hàng, nhân viên, dịch vụ và lịch sử dịch vụ."""
+    with db.engine.begin() as connection:
+        counts = reconcile_counters(connection)
+    for name, value in counts.items():
+        click.echo(f'{name}: {value}')
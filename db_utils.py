@@ -0,0 +1,47 @@
+import io
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+
+def upsert_insert(connection, model):
+    """Câu INSERT hỗ trợ on_conflict_do_update/do_nothing theo loại database đang dùng"""
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        return postgresql_insert(model)
+    if dialect == 'sqlite':
+        return sqlite_insert(model)
+    raise RuntimeError(f'Không hỗ trợ INSERT ... ON CONFLICT trên {dialect}')
+
+
+def _copy_value(value):
+    # Định dạng text của COPY: NULL là \N, thoát dấu \, tab và xuống dòng
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def copy_rows(connection, table, columns, rows):
+    """Nạp nhiều dòng (tuple theo thứ tự `columns`) vào bảng trong transaction hiện tại.
+
+    PostgreSQL dùng COPY ... FROM STDIN (psycopg 3: cursor.copy, psycopg2: copy_expert);
+    database khác dùng executemany.
+    """
+    sql = f'COPY {table.name} ({", ".join(columns)}) FROM STDIN'
+    if connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg':
+        cursor = connection.connection.driver_connection.cursor()
+        with cursor.copy(sql) as copy:
+            for row in rows:
+                copy.write_row(row)
+        return
+    if connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg2':
+        # postgres:// (Render) được đổi thành postgresql:// nên production dùng psycopg2
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(_copy_value(value) for value in row))
+            buffer.write('\n')
+        buffer.seek(0)
+        with connection.connection.driver_connection.cursor() as cursor:
+            cursor.copy_expert(sql, buffer)
+        return
+    connection.execute(table.insert(), [dict(zip(columns, row)) for row in rows])
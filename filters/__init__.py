@@ -1,9 +1,14 @@
 from flask import Blueprint
 from . import number_filters
 from . import string_filters
+from . import image_filters
 
 def init_app(app):
     # Đăng ký các filter từ number_filters
     app.jinja_env.filters['format_number'] = number_filters.format_number
     # Đăng ký các filter từ string_filters
     app.jinja_env.filters['split'] = string_filters.split_string
+    # Đăng ký các filter từ image_filters
+    app.jinja_env.filters['image_src'] = image_filters.image_src
+    app.jinja_env.filters['image_srcset'] = image_filters.image_srcset
+    app.jinja_env.filters['media_url'] = image_filters.media_url
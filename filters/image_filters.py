@@ -0,0 +1,22 @@
+from flask import url_for
+from responsive_images import srcset_candidates
+
+
+def media_url(url):
+    """URL hiển thị của một file đã lưu: URL tuyệt đối (Cloudinary, S3) giữ nguyên, file local phục vụ qua ứng dụng"""
+    if not url or url.startswith(('http://', 'https://')):
+        return url
+    # File tĩnh đi kèm ứng dụng (ví dụ logo mặc định) không nằm trong thư mục upload
+    if url.startswith('static/') and not url.startswith('static/uploads/'):
+        return url_for('static', filename=url[len('static/'):])
+    return url_for('serve_uploaded_file', filename=url.split('/')[-1])
+
+
+def image_src(image, variant=None):
+    """URL hiển thị của một ServiceHistoryImage (hoặc biến thể thu nhỏ `variant` nếu có)"""
+    return media_url(image.variant_url(variant) if variant else image.image_url)
+
+
+def image_srcset(image):
+    """Giá trị thuộc tính srcset của một ServiceHistoryImage (rỗng với ảnh cũ chưa có kích thước)"""
+    return ', '.join(f'{url} {width}w' for url, width in srcset_candidates(image))
@@ -0,0 +1,18 @@
+# Cấu hình gunicorn (tự được đọc khi chạy `gunicorn app:app` từ thư mục dự án)
+import os
+import shutil
+
+
+def on_starting(server):
+    # Metrics nhiều worker: xóa số liệu của lần chạy trước trong PROMETHEUS_MULTIPROC_DIR
+    folder = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if folder:
+        shutil.rmtree(folder, ignore_errors=True)
+        os.makedirs(folder, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Gauge của worker đã thoát không còn được cộng vào /metrics
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
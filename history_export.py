@@ -0,0 +1,90 @@
+import csv
+import io
+import zlib
+import click
+from flask.cli import AppGroup
+from sqlalchemy import select
+from models import db, Customer, Service, Employee, ServiceHistory
+from history_queries import history_date_criteria
+from timezone_utils import to_local_datetime
+
+# Số dòng đọc mỗi lần từ server-side cursor và số dòng CSV gộp thành một khối gửi đi
+EXPORT_BATCH_SIZE = 2000
+
+EXPORT_HEADER = ['Mã', 'Ngày', 'Khách hàng', 'Số điện thoại', 'Dịch vụ', 'Nhân viên', 'Số tiền', 'Thanh toán', 'Ghi chú']
+
+export_cli = AppGroup('export', help='Xuất dữ liệu ra file.')
+
+
+def export_query(*criteria):
+    """Câu SELECT các cột cần xuất, tên khách hàng/dịch vụ/nhân viên lấy bằng JOIN"""
+    return (
+        select(ServiceHistory.id, ServiceHistory.service_date, Customer.name, Customer.phone, Service.name,
+               Employee.name, ServiceHistory.price, ServiceHistory.payment_method, ServiceHistory.notes)
+        .join(Customer, ServiceHistory.customer_id == Customer.id)
+        .join(Service, ServiceHistory.service_id == Service.id)
+        .join(Employee, ServiceHistory.employee_id == Employee.id)
+        .where(*criteria)
+        .order_by(ServiceHistory.service_date, ServiceHistory.id)
+    )
+
+
+def iter_history_csv(*criteria):
+    """Sinh nội dung CSV (bytes, UTF-8 có BOM cho Excel) theo từng khối.
+
+    Dữ liệu đọc qua server-side cursor (yield_per) trên một kết nối riêng, nên bộ nhớ không phụ thuộc
+    số dòng và khối đầu tiên được gửi ngay khi có kết quả.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(EXPORT_HEADER)
+
+    with db.engine.connect() as connection:
+        result = connection.execution_options(yield_per=EXPORT_BATCH_SIZE).execute(export_query(*criteria))
+        for rows in result.partitions():
+            for history_id, service_date, customer, phone, service, employee, price, payment_method, notes in rows:
+                writer.writerow([history_id, to_local_datetime(service_date).strftime('%Y-%m-%d %H:%M'),
+                                 customer, phone, service, employee, f'{price:.0f}', payment_method, notes or ''])
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_chunks(chunks):
+    """Nén gzip từng khối ngay khi sinh ra"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_filename(date_from=None, date_to=None):
+    """Tên file xuất theo khoảng ngày (chuỗi YYYY-MM-DD)"""
+    parts = ['lich_su_dich_vu'] + [value.replace('-', '') for value in (date_from, date_to) if value]
+    return '_'.join(parts) + '.csv'
+
+
+@export_cli.command('histories')
+@click.option('--date-from', type=click.DateTime(formats=['%Y-%m-%d']), help='Ngày bắt đầu (YYYY-MM-DD)')
+@click.option('--date-to', type=click.DateTime(formats=['%Y-%m-%d']), help='Ngày kết thúc (YYYY-MM-DD)')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='File kết quả (mặc định theo khoảng ngày)')
+@click.option('--gzip', 'compress', is_flag=True, help='Nén file kết quả bằng gzip')
+def export_histories_command(date_from, date_to, output, compress):
+    """Xuất lịch sử dịch vụ ra CSV."""
+    date_from = date_from.date() if date_from else None
+    date_to = date_to.date() if date_to else None
+    chunks = iter_history_csv(*history_date_criteria(date_from, date_to))
+    if compress:
+        chunks = gzip_chunks(chunks)
+    if not output:
+        output = export_filename(date_from and date_from.isoformat(), date_to and date_to.isoformat())
+        output += '.gz' if compress else ''
+    with open(output, 'wb') as file:
+        for chunk in chunks:
+            file.write(chunk)
+    click.echo(f'Đã xuất lịch sử dịch vụ ra {output}')
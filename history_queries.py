@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+from sqlalchemy import tuple_
+from sqlalchemy.orm import joinedload, selectinload
+from models import db, ServiceHistory
+from timezone_utils import local_date, local_day_start
+
+
+def service_history_listing(*criteria, **filters):
+    """Truy vấn lịch sử dịch vụ để hiển thị danh sách.
+
+    Khách hàng, dịch vụ và nhân viên được nạp cùng câu truy vấn (JOIN),
+    ảnh được nạp bằng một câu SELECT ... IN cho cả trang, nên số truy vấn
+    của một trang không phụ thuộc vào số dòng.
+    """
+    query = ServiceHistory.query.options(
+        joinedload(ServiceHistory.customer),
+        joinedload(ServiceHistory.service),
+        joinedload(ServiceHistory.employee),
+        selectinload(ServiceHistory.images),
+    )
+    if criteria:
+        query = query.filter(*criteria)
+    if filters:
+        query = query.filter_by(**filters)
+    return query.order_by(ServiceHistory.service_date.desc(), ServiceHistory.id.desc())
+
+
+def history_date_criteria(date_from=None, date_to=None):
+    """Điều kiện lọc service_date theo khoảng ngày (giờ salon, tính trọn cả hai ngày đầu cuối)"""
+    criteria = []
+    if date_from:
+        criteria.append(ServiceHistory.service_date >= local_day_start(date_from))
+    if date_to:
+        criteria.append(ServiceHistory.service_date < local_day_start(date_to + timedelta(days=1)))
+    return criteria
+
+
+def encode_history_cursor(history):
+    """Mã hóa vị trí (service_date, id) của một lịch sử thành chuỗi cursor"""
+    return f"{history.service_date.isoformat()}_{history.id}"
+
+
+def decode_history_cursor(value):
+    """Giải mã cursor, trả về (service_date, id) hoặc None nếu không hợp lệ"""
+    try:
+        date_part, id_part = value.rsplit('_', 1)
+        return datetime.fromisoformat(date_part), int(id_part)
+    except (AttributeError, ValueError):
+        return None
+
+
+def service_history_feed(*criteria, cursor=None, per_page=50):
+    """Lấy một trang lịch sử dịch vụ theo keyset (service_date, id), nhóm theo ngày.
+
+    Mỗi trang có ít nhất `per_page` lịch sử (nếu còn) và luôn chứa trọn vẹn
+    các ngày; ngày được tính trong SQL theo giờ salon.
+    Trả về (grouped_histories, next_cursor); next_cursor là None nếu hết dữ liệu.
+    """
+    keyset = list(criteria)
+    if cursor:
+        keyset.append(tuple_(ServiceHistory.service_date, ServiceHistory.id) < tuple_(*cursor))
+
+    service_day = local_date(ServiceHistory.service_date).label('service_day')
+
+    # Ngày của dòng thứ per_page là ngày cuối cùng của trang này
+    boundary_day = db.session.query(service_day).filter(*keyset).order_by(
+        ServiceHistory.service_date.desc(), ServiceHistory.id.desc()
+    ).offset(per_page - 1).limit(1).scalar()
+
+    if boundary_day is not None:
+        keyset.append(ServiceHistory.service_date >= local_day_start(boundary_day))
+
+    grouped_histories = {}
+    last_history = None
+    for history, day in service_history_listing(*keyset).add_columns(service_day):
+        grouped_histories.setdefault(day.strftime('%Y-%m-%d'), []).append(history)
+        last_history = history
+
+    next_cursor = None
+    if boundary_day is not None:
+        has_older = db.session.query(ServiceHistory.id).filter(
+            *criteria, ServiceHistory.service_date < local_day_start(boundary_day)
+        ).limit(1).first()
+        if has_older:
+            next_cursor = encode_history_cursor(last_history)
+
+    return grouped_histories, next_cursor
@@ -0,0 +1,68 @@
+import io
+from collections import namedtuple
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Ảnh đã xử lý: nội dung file và kích thước
+ProcessedImage = namedtuple('ProcessedImage', 'data width height')
+
+
+class ImageProcessingError(ValueError):
+    """File tải lên không phải ảnh hợp lệ"""
+
+
+def _open_image(stream, max_dimension):
+    try:
+        image = Image.open(stream)
+        # JPEG có thể giải mã thẳng ở kích thước nhỏ hơn (1/2, 1/4, 1/8), nhanh hơn nhiều so với giải mã đầy đủ
+        image.draft('RGB', (max_dimension, max_dimension))
+        image.load()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        raise ImageProcessingError('File không phải ảnh hợp lệ.')
+    return image
+
+
+def _to_rgb(image):
+    """Chuyển về RGB; phần trong suốt được phủ nền trắng"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    if image.mode != 'RGB':
+        return image.convert('RGB')
+    return image
+
+
+def _encode(image, quality):
+    buffer = io.BytesIO()
+    # Không truyền exif nên toàn bộ EXIF (GPS, thông tin máy) bị loại bỏ
+    image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return ProcessedImage(buffer.getvalue(), image.width, image.height)
+
+
+def process_image(stream, max_dimension, quality, variant_sizes):
+    """Chuẩn hóa ảnh tải lên: xoay theo EXIF, bỏ EXIF, giới hạn kích thước, nén lại JPEG.
+
+    Trả về (ảnh chính, {tên biến thể: ảnh}) với các biến thể thu nhỏ theo `variant_sizes`
+    ({tên: cạnh dài nhất}), được tạo từ ảnh chính đã thu nhỏ nên rất nhanh.
+    """
+    image = _open_image(stream, max_dimension)
+    image = ImageOps.exif_transpose(image)
+    image = _to_rgb(image)
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    main = _encode(image, quality)
+
+    variants = {}
+    for name, size in sorted(variant_sizes.items(), key=lambda item: -item[1]):
+        variant = image.copy()
+        variant.thumbnail((size, size), Image.LANCZOS)
+        variants[name] = _encode(variant, quality)
+    return main, variants
+
+
+def resize_to_width(stream, width, quality):
+    """Thu nhỏ ảnh đã chuẩn hóa về chiều rộng `width` (giữ tỉ lệ, không phóng to), dùng cho srcset"""
+    image = _open_image(stream, width)
+    image = _to_rgb(image)
+    image.thumbnail((width, image.height), Image.LANCZOS)
+    return _encode(image, quality)
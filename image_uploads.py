@@ -0,0 +1,198 @@
+import io
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from models import db, ServiceHistoryImage
+from image_processing import ImageProcessingError, process_image
+from storage import content_hash
+from storage_outbox import unreferenced_objects, enqueue_deletions
+from metrics import record_processed_image
+
+# Kết quả tải lên của một file: các cột của ServiceHistoryImage, hoặc lỗi
+UploadOutcome = namedtuple('UploadOutcome', 'filename columns error')
+
+# Các cột mô tả ảnh đã lưu, sao chép được sang dòng khác khi trùng nội dung
+STORED_COLUMNS = ('image_url', 'cloudinary_public_id', 'storage_backend', 'storage_key', 'content_hash',
+                  'width', 'height', 'byte_size', 'variants')
+
+# Pool dùng chung cho mọi request của worker, nên số upload đồng thời luôn bị giới hạn
+_upload_pool = None
+_upload_pool_lock = threading.Lock()
+
+
+def _get_upload_pool(workers):
+    global _upload_pool
+    with _upload_pool_lock:
+        if _upload_pool is None:
+            _upload_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-upload')
+        return _upload_pool
+
+
+def upload_options(config):
+    """Các tham số xử lý/tải ảnh lấy từ cấu hình, để dùng được trong thread không có app context"""
+    return {
+        'max_dimension': config['IMAGE_MAX_DIMENSION'],
+        'quality': config['IMAGE_QUALITY'],
+        'variant_sizes': config['IMAGE_VARIANTS'],
+        'timeout': config['UPLOAD_TIMEOUT'],
+        'retries': config['UPLOAD_RETRIES'],
+        'retry_backoff': config['UPLOAD_RETRY_BACKOFF'],
+    }
+
+
+def store_image(storage, data, digest, options):
+    """Chuẩn hóa ảnh và lưu ảnh chính cùng các biến thể vào backend; trả về các cột của ServiceHistoryImage.
+
+    Khóa lưu trữ là mã băm nội dung file gốc (`digest`), nên lưu lại cùng một ảnh không tạo file mới.
+    """
+    main, variants = process_image(io.BytesIO(data), options['max_dimension'], options['quality'],
+                                   options['variant_sizes'])
+    stored = storage.put(f'{digest}.jpg', main.data, 'image/jpeg')
+    recorded = {}
+    for name, variant in variants.items():
+        url = storage.variant_url(stored.key, variant.width, variant.height)
+        key = None
+        if url is None:
+            key, url = storage.put(f'{digest}_{name}.jpg', variant.data, 'image/jpeg')
+        recorded[name] = {'url': url, 'key': key, 'width': variant.width, 'height': variant.height}
+    record_processed_image(len(data), len(main.data) + sum(len(variant.data) for variant in variants.values()))
+    return {
+        'image_url': stored.url,
+        'cloudinary_public_id': stored.key if storage.name == 'cloudinary' else None,
+        'storage_backend': storage.name,
+        'storage_key': stored.key,
+        'content_hash': digest,
+        'width': main.width,
+        'height': main.height,
+        'byte_size': len(main.data),
+        'variants': recorded,
+    }
+
+
+def transfer_image(storage, data, columns):
+    """Lưu ảnh đã chuẩn hóa (bytes của file đã lưu) sang backend khác mà không xử lý lại.
+
+    `columns` là các cột hiện tại của ảnh; kích thước, mã băm và các biến thể được giữ nguyên, chỉ đổi
+    vị trí lưu. Backend đích phải tạo được biến thể bằng URL (variant_url), như Cloudinary.
+    """
+    stored = storage.put(f"{columns['content_hash']}.jpg", data, 'image/jpeg')
+    recorded = {}
+    for name, variant in (columns['variants'] or {}).items():
+        url = storage.variant_url(stored.key, variant['width'], variant['height'])
+        if url is None:
+            raise ValueError(f'Backend {storage.name} không tạo được biến thể {name} từ URL')
+        recorded[name] = {'url': url, 'key': None, 'width': variant['width'], 'height': variant['height']}
+    return dict(columns, image_url=stored.url,
+                cloudinary_public_id=stored.key if storage.name == 'cloudinary' else None,
+                storage_backend=storage.name, storage_key=stored.key, variants=recorded)
+
+
+def store_with_retry(store, filename, options, *args):
+    """Gọi store(*args) có thử lại khi lỗi lưu trữ (mạng); trả về UploadOutcome"""
+    attempts = options['retries'] + 1
+    for attempt in range(attempts):
+        try:
+            return UploadOutcome(filename, store(*args), None)
+        except ImageProcessingError as e:
+            return UploadOutcome(filename, None, str(e))
+        except Exception as e:
+            if attempt + 1 == attempts:
+                return UploadOutcome(filename, None, f'Lỗi khi tải lên: {e}')
+            time.sleep(options['retry_backoff'] * 2 ** attempt)
+
+
+def store_image_with_retry(storage, filename, data, digest, options):
+    """store_image có thử lại khi lỗi lưu trữ (mạng); chạy trong thread của pool"""
+    return store_with_retry(store_image, filename, options, storage, data, digest, options)
+
+
+def find_stored_images(storage, digests):
+    """Ảnh đã lưu trên backend `storage` có cùng nội dung: {content_hash: các cột để sao chép}"""
+    if not digests:
+        return {}
+    rows = db.session.query(*(getattr(ServiceHistoryImage, column) for column in STORED_COLUMNS)).filter(
+        ServiceHistoryImage.content_hash.in_(set(digests)),
+        ServiceHistoryImage.storage_backend == storage.name,
+    )
+    return {row.content_hash: row._asdict() for row in rows}
+
+
+def upload_images(storage, files, config):
+    """Xử lý và lưu nhiều ảnh song song.
+
+    `files` là danh sách (tên file, bytes). Ảnh trùng nội dung với ảnh đã lưu chỉ sao chép thông tin,
+    không xử lý hay tải lên lại. Trả về UploadOutcome theo đúng thứ tự của `files`; file quá thời hạn
+    (UPLOAD_TIMEOUT cho mỗi lần thử, cộng thời gian thử lại) được báo lỗi.
+
+    File đang tải dở khi hết hạn không dừng được: nếu tải xong sau đó, object không được dòng nào dùng
+    và sẽ bị `flask media gc` xóa (object đủ cũ, không còn tham chiếu).
+    """
+    options = upload_options(config)
+    digests = [content_hash(data) for _, data in files]
+    existing = find_stored_images(storage, digests)
+
+    # Mỗi nội dung chỉ xử lý một lần, kể cả khi cùng một ảnh được gửi nhiều lần trong một request
+    pool = _get_upload_pool(config['UPLOAD_WORKERS'])
+    futures = {}
+    for (filename, data), digest in zip(files, digests):
+        if digest not in existing and digest not in futures:
+            futures[digest] = pool.submit(store_image_with_retry, storage, filename, data, digest, options)
+
+    if futures:
+        # Hạn chờ chung: các file chạy song song nên chỉ cần đủ cho từng lượt file chậm nhất (kể cả thử lại)
+        attempts = options['retries'] + 1
+        per_file = attempts * options['timeout'] + options['retry_backoff'] * (2 ** options['retries'] - 1)
+        rounds = -(-len(futures) // config['UPLOAD_WORKERS'])
+        wait(futures.values(), timeout=per_file * rounds)
+
+    outcomes = []
+    for (filename, _), digest in zip(files, digests):
+        if digest in existing:
+            outcomes.append(UploadOutcome(filename, dict(existing[digest]), None))
+            continue
+        future = futures[digest]
+        if not future.done():
+            # Chỉ hủy được file chưa bắt đầu; file đang tải xong muộn để lại object mồ côi cho `flask media gc`
+            future.cancel()
+            outcomes.append(UploadOutcome(filename, None, 'Quá thời gian tải lên'))
+            continue
+        outcome = future.result()
+        outcomes.append(UploadOutcome(filename, dict(outcome.columns) if outcome.columns else None, outcome.error))
+    return outcomes
+
+
+def stored_object_keys(storage_key, variants):
+    """Các khóa trong backend của một ảnh: ảnh chính và các biến thể được lưu thành file riêng"""
+    keys = [storage_key]
+    keys.extend(variant['key'] for variant in (variants or {}).values() if variant.get('key'))
+    return keys
+
+
+def stored_locations(images):
+    """Vị trí lưu của các ảnh (đối tượng ServiceHistoryImage hoặc dict cột): {(backend, khóa): các khóa}"""
+    locations = {}
+    for image in images:
+        columns = image if isinstance(image, dict) else {
+            'storage_backend': image.storage_backend, 'storage_key': image.storage_key, 'variants': image.variants}
+        if columns['storage_key']:
+            locations[(columns['storage_backend'], columns['storage_key'])] = stored_object_keys(
+                columns['storage_key'], columns['variants'])
+    return locations
+
+
+def release_locations(locations):
+    """Xếp hàng xóa (outbox) các object trong `locations` không còn dòng nào dùng, trong transaction hiện tại.
+
+    File chỉ thực sự bị xóa sau khi transaction commit, bởi `flask media process-deletions`.
+    """
+    enqueue_deletions(unreferenced_objects(locations))
+
+
+def release_images(images):
+    """Xóa các dòng ảnh khỏi session và xếp hàng xóa các object không còn dòng nào dùng"""
+    locations = stored_locations(images)
+    for image in images:
+        db.session.delete(image)
+    db.session.flush()
+    release_locations(locations)
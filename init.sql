@@ -536,6 +536,41 @@ ALTER TABLE ONLY public."user"
     ADD CONSTRAINT user_username_key UNIQUE (username);
 
 
+--
+-- Name: ix_service_history_customer_id_service_date; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX ix_service_history_customer_id_service_date ON public.service_history USING btree (customer_id, service_date);
+
+
+--
+-- Name: ix_service_history_employee_id_service_date; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX ix_service_history_employee_id_service_date ON public.service_history USING btree (employee_id, service_date);
+
+
+--
+-- Name: ix_service_history_service_date; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX ix_service_history_service_date ON public.service_history USING btree (service_date);
+
+
+--
+-- Name: ix_service_history_service_id_service_date; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX ix_service_history_service_id_service_date ON public.service_history USING btree (service_id, service_date);
+
+
+--
+-- Name: ix_service_history_image_service_history_id; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX ix_service_history_image_service_history_id ON public.service_history_image USING btree (service_history_id);
+
+
 --
 -- Name: service_history service_history_customer_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
 --
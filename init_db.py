@@ -1,6 +1,7 @@
 from app import app, db
 from models import User, Category, Service, Employee, Customer, Settings, ServiceHistory, ServiceHistoryImage
 from datetime import datetime, date
+from settings_cache import ensure_settings
 
 def init_db():
     with app.app_context():
@@ -10,8 +11,7 @@ def init_db():
         db.create_all()
         
         # Tạo cài đặt mặc định
-        settings = Settings()
-        db.session.add(settings)
+        ensure_settings()
 
         # Kiểm tra xem đã có dữ liệu chưa
         if User.query.first() is None:
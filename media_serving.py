@@ -0,0 +1,61 @@
+import os
+import re
+from flask import current_app, request, abort, Response
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+
+# Tên file không bao giờ đổi nội dung: mã băm sha256 (storage.content_hash) hoặc uuid hex của ảnh cũ,
+# có thể kèm hậu tố biến thể (_thumb, _medium)
+IMMUTABLE_NAME = re.compile(r'^([0-9a-f]{64}|[0-9a-f]{32})(_[a-z0-9]+)?\.[a-z0-9]+$')
+
+MEDIA_SENDFILE_MODES = ('x-accel-redirect', 'x-sendfile')
+
+
+def init_media_serving(app):
+    """Kiểm tra cấu hình phục vụ file upload"""
+    if app.config['MEDIA_SENDFILE'] not in (None,) + MEDIA_SENDFILE_MODES:
+        raise ValueError(f"MEDIA_SENDFILE không hợp lệ: {app.config['MEDIA_SENDFILE']}")
+
+
+def set_cache_headers(response, filename):
+    """Ảnh có tên theo nội dung được cache lâu dài không cần hỏi lại; file khác luôn phải kiểm tra lại"""
+    response.cache_control.public = True
+    if IMMUTABLE_NAME.match(filename):
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = current_app.config['MEDIA_CACHE_MAX_AGE']
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+        response.cache_control.max_age = 0
+    return response
+
+
+def send_media(filename):
+    """Phục vụ một file trong thư mục upload.
+
+    Mặc định ứng dụng tự gửi file, có ETag/Last-Modified (trả 304 khi không đổi) và hỗ trợ Range.
+    Với MEDIA_SENDFILE, ứng dụng chỉ trả header để proxy phía trước (nginx, Apache) gửi file.
+    """
+    config = current_app.config
+    path = safe_join(config['UPLOAD_FOLDER'], filename)
+    if path is None:
+        abort(404)
+    name = os.path.basename(filename)
+
+    mode = config['MEDIA_SENDFILE']
+    if mode == 'x-accel-redirect':
+        # nginx tự trả 404, 304 và Range từ location internal tương ứng, ứng dụng không cần đọc ổ đĩa
+        response = Response()
+        del response.headers['Content-Type']
+        response.headers['X-Accel-Redirect'] = config['MEDIA_ACCEL_PREFIX'].rstrip('/') + '/' + filename
+        return set_cache_headers(response, name)
+
+    # Tên theo mã băm nội dung đã là ETag mạnh, không cần tính từ thời gian sửa/kích thước file
+    match = IMMUTABLE_NAME.match(name)
+    try:
+        response = send_file(path, request.environ, conditional=True,
+                             etag=match.group(1) + (match.group(2) or '') if match else True,
+                             use_x_sendfile=mode == 'x-sendfile', response_class=current_app.response_class)
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+        abort(404)
+    return set_cache_headers(response, name)
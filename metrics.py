@@ -0,0 +1,111 @@
+import os
+import time
+from flask import Response, g, request, abort, current_app
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+# Khi chạy gunicorn nhiều worker, đặt PROMETHEUS_MULTIPROC_DIR (thư mục trống, ghi được) trước khi khởi động
+# để số liệu của các worker được gộp lại; gunicorn.conf.py dọn thư mục này khi khởi động và khi worker thoát.
+
+REQUEST_LATENCY = Histogram(
+    'salon_http_request_duration_seconds', 'Thời gian xử lý request theo endpoint',
+    ['endpoint', 'method'], buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+REQUEST_COUNT = Counter(
+    'salon_http_requests_total', 'Số request theo endpoint và mã trạng thái', ['endpoint', 'method', 'status'])
+
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    'salon_db_pool_checkout_wait_seconds', 'Thời gian chờ lấy kết nối từ pool',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30))
+DB_POOL_IN_USE = Gauge('salon_db_pool_connections_in_use', 'Số kết nối đang được dùng', multiprocess_mode='livesum')
+DB_POOL_OVERFLOW = Gauge('salon_db_pool_overflow', 'Số kết nối vượt pool_size đang mở', multiprocess_mode='livesum')
+DB_POOL_SIZE = Gauge('salon_db_pool_size', 'Kích thước pool (pool_size)', multiprocess_mode='livesum')
+
+CLOUDINARY_DURATION = Histogram(
+    'salon_cloudinary_request_duration_seconds', 'Thời gian gọi API Cloudinary', ['operation', 'outcome'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+IMAGE_BYTES = Counter('salon_image_bytes_total', 'Số byte ảnh đã xử lý (input: file tải lên, output: ảnh đã lưu)',
+                      ['direction'])
+IMAGES_PROCESSED = Counter('salon_images_processed_total', 'Số ảnh đã chuẩn hóa và lưu')
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool ghi thời gian chờ lấy kết nối, số kết nối đang dùng và vượt mức vào metrics"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Pool được tạo lại (engine.dispose) cũng là một instance mới nên vẫn được đăng ký
+        event.listen(self, 'checkin', lambda *args: self.report_usage())
+        DB_POOL_SIZE.set(self.size())
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+            self.report_usage()
+
+    def report_usage(self):
+        DB_POOL_IN_USE.set(self.checkedout())
+        # overflow() âm khi pool còn chưa mở đủ pool_size kết nối
+        DB_POOL_OVERFLOW.set(max(self.overflow(), 0))
+
+
+class timed_cloudinary_call:
+    """Đo thời gian một lần gọi Cloudinary: `with timed_cloudinary_call('upload'): ...`"""
+
+    def __init__(self, operation):
+        self.operation = operation
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        CLOUDINARY_DURATION.labels(self.operation, 'error' if exc_type else 'ok').observe(
+            time.perf_counter() - self.started)
+        return False
+
+
+def record_processed_image(input_bytes, output_bytes):
+    IMAGES_PROCESSED.inc()
+    IMAGE_BYTES.labels('input').inc(input_bytes)
+    IMAGE_BYTES.labels('output').inc(output_bytes)
+
+
+def _start_timer():
+    g._metrics_started = time.perf_counter()
+
+
+def _observe_request(response):
+    started = g.pop('_metrics_started', None)
+    if started is not None:
+        # Chỉ dùng tên endpoint (không dùng URL) để số nhãn không tăng theo id trong đường dẫn
+        endpoint = request.endpoint or 'not_found'
+        REQUEST_LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - started)
+        REQUEST_COUNT.labels(endpoint, request.method, str(response.status_code)).inc()
+    return response
+
+
+def metrics_view():
+    token = current_app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        abort(404)
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        from prometheus_client import REGISTRY as registry
+    return Response(generate_latest(registry), headers={'Content-Type': CONTENT_TYPE_LATEST})
+
+
+def init_metrics(app):
+    """Đăng ký đo request và endpoint /metrics; gọi trước db.init_app để engine dùng pool có đo đạc"""
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI') or ''
+    # SQLite trong bộ nhớ dùng pool riêng (một kết nối dùng chung), không thay được
+    if ':memory:' not in uri:
+        app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {}).setdefault('poolclass', InstrumentedQueuePool)
+    app.before_request(_start_timer)
+    app.after_request(_observe_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -1,69 +1,196 @@
+"""Di chuyển ảnh lịch sử dịch vụ đang lưu trong thư mục upload (backend local) lên Cloudinary.
+
+Ảnh được duyệt theo từng lô theo id (keyset) và tải lên song song, rồi cập nhật DB một lần cho
+mỗi lô. Ảnh đã được chuẩn hóa khi tải lên (khóa theo nội dung) được tải lên nguyên bytes đã lưu;
+chỉ ảnh cũ (lưu trước khi có chuẩn hóa) mới được xử lý lại. Sau mỗi lô, id cuối cùng được ghi
+vào file checkpoint; chạy lại script sẽ tiếp tục từ đó. File local cũ được xếp hàng xóa
+(flask media process-deletions), trừ khi dùng --keep-files.
+
+    python migrate_to_cloudinary.py --dry-run
+    python migrate_to_cloudinary.py --workers 8 --batch-size 200
+"""
+import argparse
+import json
 import os
-import sys
-from pathlib import Path
-from app import app, db
-from models import ServiceHistoryImage
-from cloudinary_utils import upload_to_cloudinary, delete_from_cloudinary
-from werkzeug.utils import secure_filename
-
-def migrate_images():
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app import app
+from models import db, ServiceHistoryImage
+from storage import get_storage, content_hash
+from image_uploads import (upload_options, store_image_with_retry, store_with_retry, transfer_image, find_stored_images,
+                           stored_locations, release_locations, STORED_COLUMNS)
+
+DEFAULT_CHECKPOINT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.migrate_to_cloudinary.json')
+
+
+def load_checkpoint(path):
+    """Tiến độ của lần chạy trước: id ảnh cuối cùng đã xử lý và số liệu cộng dồn"""
+    if not os.path.exists(path):
+        return {'last_id': 0}
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_checkpoint(path, last_id, stats):
+    # Ghi ra file tạm rồi đổi tên, để checkpoint không bị hỏng nếu script bị dừng giữa chừng
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump({'last_id': last_id, **stats}, file)
+    os.replace(temp_path, path)
+
+
+def local_images(after_id):
+    """Điều kiện chọn ảnh còn lưu local có id lớn hơn `after_id`"""
+    return [ServiceHistoryImage.storage_backend == 'local', ServiceHistoryImage.id > after_id]
+
+
+def fetch_batch(after_id, batch_size):
+    """Một lô ảnh local theo id, chỉ lấy các cột cần dùng"""
+    return db.session.query(
+        ServiceHistoryImage.id, *(getattr(ServiceHistoryImage, column) for column in STORED_COLUMNS),
+    ).filter(*local_images(after_id)).order_by(ServiceHistoryImage.id).limit(batch_size).all()
+
+
+def is_normalized(row):
+    """Ảnh đã được chuẩn hóa khi tải lên: khóa lưu trữ là mã băm nội dung file gốc (xem store_image)"""
+    return bool(row.content_hash) and row.storage_key == f'{row.content_hash}.jpg'
+
+
+def read_file(folder, key):
+    path = os.path.join(folder, os.path.basename(key))
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+def migrate_batch(rows, storage, options, pool, folder, dry_run):
+    """Tải lên một lô ảnh; trả về (cập nhật cho từng id, số ảnh lỗi, số byte đã đọc)"""
+    # Nhiều dòng có thể dùng chung một file (ảnh trùng nội dung), mỗi file chỉ đọc và tải lên một lần
+    keys = sorted({row.storage_key for row in rows})
+    contents = dict(zip(keys, pool.map(lambda key: read_file(folder, key), keys)))
+    read_bytes = sum(len(data) for data in contents.values() if data)
+    missing = {key for key, data in contents.items() if data is None}
+    for key in sorted(missing):
+        print(f"Không tìm thấy file: {key}")
+    if dry_run:
+        return {}, sum(1 for row in rows if row.storage_key in missing), read_bytes
+
+    # Ảnh đã chuẩn hóa giữ nguyên mã băm của file gốc, để trùng khớp với các lần tải lên sau
+    normalized = {row.storage_key: row._asdict() for row in rows if is_normalized(row)}
+    digests = {key: normalized[key]['content_hash'] if key in normalized else content_hash(data)
+               for key, data in contents.items() if data is not None}
+    # Ảnh đã có trên Cloudinary (cùng nội dung) chỉ cần sao chép thông tin
+    columns_by_key = {}
+    existing = find_stored_images(storage, digests.values())
+    to_upload = []
+    for key, digest in digests.items():
+        if digest in existing:
+            columns_by_key[key] = existing[digest]
+        else:
+            to_upload.append(key)
+
+    def upload(key):
+        if key in normalized:
+            columns = {column: normalized[key][column] for column in STORED_COLUMNS}
+            return store_with_retry(transfer_image, key, options, storage, contents[key], columns)
+        return store_image_with_retry(storage, key, contents[key], digests[key], options)
+
+    outcomes = pool.map(upload, to_upload)
+    failed_keys = set(missing)
+    for key, outcome in zip(to_upload, outcomes):
+        if outcome.error:
+            print(f"Lỗi khi di chuyển ảnh {key}: {outcome.error}")
+            failed_keys.add(key)
+        else:
+            columns_by_key[key] = outcome.columns
+
+    updates = {row.id: columns_by_key[row.storage_key] for row in rows if row.storage_key in columns_by_key}
+    return updates, sum(1 for row in rows if row.storage_key in failed_keys), read_bytes
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours:d}:{minutes:02d}:{seconds:02d}'
+
+
+def migrate_images(batch_size, workers, dry_run, checkpoint_path, restart, keep_files):
     """Di chuyển ảnh từ thư mục local lên Cloudinary"""
-    # Tạo đối tượng ứng dụng
-    app_ctx = app.app_context()
-    app_ctx.push()
-    
-    try:
-        # Lấy tất cả các bản ghi ảnh cũ
-        images = ServiceHistoryImage.query.filter(
-            ServiceHistoryImage.image_url.like('%static/uploads/%')
-        ).all()
-        
-        if not images:
-            print("Không có ảnh nào cần di chuyển.")
-            return
-            
-        print(f"Đang di chuyển {len(images)} ảnh lên Cloudinary...")
-        
-        for img in images:
-            try:
-                # Lấy đường dẫn file cũ
-                old_path = img.image_url.replace('/static/uploads/', '')
-                old_filepath = os.path.join(app.config['UPLOAD_FOLDER'], old_path)
-                
-                if not os.path.exists(old_filepath):
-                    print(f"Không tìm thấy file: {old_filepath}")
-                    continue
-                
-                # Tải lên Cloudinary
-                with open(old_filepath, 'rb') as f:
-                    upload_result = upload_to_cloudinary(
-                        f,
-                        folder=app.config.get('CLOUDINARY_FOLDER')
-                    )
-                
-                # Cập nhật thông tin ảnh
-                img.image_url = upload_result['url']
-                img.cloudinary_public_id = upload_result['public_id']
-                
-                # Xóa file cũ
-                os.remove(old_filepath)
-                print(f"Đã di chuyển ảnh {old_path} lên Cloudinary")
-                
-            except Exception as e:
-                print(f"Lỗi khi di chuyển ảnh {getattr(img, 'id', 'unknown')}: {str(e)}")
-                db.session.rollback()
-            else:
+    checkpoint = {'last_id': 0} if restart else load_checkpoint(checkpoint_path)
+    last_id = checkpoint['last_id']
+    total = db.session.query(db.func.count(ServiceHistoryImage.id)).filter(*local_images(last_id)).scalar()
+    if not total:
+        print("Không có ảnh nào cần di chuyển.")
+        return
+    print(f"{'[Chạy thử] ' if dry_run else ''}Có {total} ảnh cần di chuyển"
+          f"{f' (tiếp tục sau ảnh #{last_id})' if last_id else ''}.")
+
+    storage = get_storage(app, 'cloudinary')
+    options = upload_options(app.config)
+    folder = app.config['UPLOAD_FOLDER']
+    # Số liệu cộng dồn qua các lần chạy (chạy thử luôn tính từ 0)
+    stats = {key: 0 if dry_run else checkpoint.get(key, 0) for key in ('migrated', 'failed', 'bytes')}
+    run_bytes = 0
+    processed = 0
+    started = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            rows = fetch_batch(last_id, batch_size)
+            if not rows:
+                break
+            updates, failed, read_bytes = migrate_batch(rows, storage, options, pool, folder, dry_run)
+
+            if not dry_run:
+                # Cập nhật cả lô trong một transaction; file cũ được xếp hàng xóa cùng transaction
+                old_locations = stored_locations([row._asdict() for row in rows if row.id in updates])
+                if updates:
+                    db.session.execute(db.update(ServiceHistoryImage),
+                                       [{'id': image_id, **columns} for image_id, columns in updates.items()])
+                    db.session.flush()
+                    if not keep_files:
+                        release_locations(old_locations)
                 db.session.commit()
-                
-        print("\nHoàn thành di chuyển ảnh lên Cloudinary!")
-        
-    except Exception as e:
-        print(f"Lỗi: {str(e)}")
-        db.session.rollback()
-    finally:
-        db.session.close()
-        app_ctx.pop()
+            last_id = rows[-1].id
+            stats.update(migrated=stats['migrated'] + (len(rows) - failed if dry_run else len(updates)),
+                         failed=stats['failed'] + failed, bytes=stats['bytes'] + read_bytes)
+            if not dry_run:
+                save_checkpoint(checkpoint_path, last_id, stats)
+            db.session.expunge_all()
+
+            processed += len(rows)
+            run_bytes += read_bytes
+            elapsed = time.monotonic() - started
+            rate = processed / elapsed if elapsed else 0
+            eta = (total - processed) / rate if rate else 0
+            print(f"{processed}/{total} ảnh ({processed * 100 // total}%) - "
+                  f"{rate:.1f} ảnh/giây, {run_bytes / elapsed / 1024 / 1024 if elapsed else 0:.1f} MB/giây - "
+                  f"còn khoảng {format_duration(eta)}")
+
+    print(f"\n{'Chạy thử xong' if dry_run else 'Hoàn thành di chuyển ảnh lên Cloudinary'}: "
+          f"{stats['migrated']} ảnh {'có thể di chuyển' if dry_run else 'đã di chuyển'}, "
+          f"{stats['failed']} ảnh lỗi, {stats['bytes'] / 1024 / 1024:.1f} MB, "
+          f"trong {format_duration(time.monotonic() - started)}.")
+    if stats['failed'] and not dry_run:
+        print("Các ảnh lỗi được bỏ qua; chạy lại với --restart để thử lại từ đầu.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=100, help='Số ảnh mỗi lô (mỗi lô commit một lần)')
+    parser.add_argument('--workers', type=int, default=app.config['UPLOAD_WORKERS'],
+                        help='Số ảnh tải lên song song')
+    parser.add_argument('--dry-run', action='store_true', help='Chỉ kiểm tra file và ước lượng, không tải lên')
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help='File lưu tiến độ để chạy tiếp')
+    parser.add_argument('--restart', action='store_true', help='Bỏ qua checkpoint, duyệt lại từ đầu')
+    parser.add_argument('--keep-files', action='store_true', help='Không xóa file local sau khi di chuyển')
+    args = parser.parse_args()
+
+    with app.app_context():
+        migrate_images(args.batch_size, args.workers, args.dry_run, args.checkpoint, args.restart,
+                       args.keep_files)
+
 
 if __name__ == '__main__':
-    print("Bắt đầu di chuyển ảnh lên Cloudinary...")
-    migrate_images()
+    main()
@@ -0,0 +1,40 @@
+"""Add service history indexes
+
+Revision ID: 2489fe22fa21
+Revises:
+Create Date: 2026-10-17 09:12:41.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2489fe22fa21'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_service_history_customer_id_service_date', 'service_history', ['customer_id', 'service_date']),
+    ('ix_service_history_employee_id_service_date', 'service_history', ['employee_id', 'service_date']),
+    ('ix_service_history_service_id_service_date', 'service_history', ['service_id', 'service_date']),
+    ('ix_service_history_service_date', 'service_history', ['service_date']),
+    ('ix_service_history_image_service_history_id', 'service_history_image', ['service_history_id']),
+]
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY không chạy được trong transaction và không khóa ghi bảng
+    concurrently = 'CONCURRENTLY ' if op.get_bind().dialect.name == 'postgresql' else ''
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.execute(f"CREATE INDEX {concurrently}IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+
+
+def downgrade():
+    concurrently = 'CONCURRENTLY ' if op.get_bind().dialect.name == 'postgresql' else ''
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.execute(f"DROP INDEX {concurrently}IF EXISTS {name}")
@@ -0,0 +1,50 @@
+"""Add revenue_daily rollup
+
+Revision ID: 461d7c36f48d
+Revises: 5d0170e5019f
+Create Date: 2026-10-17 11:36:02.684159
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from timezone_utils import local_date
+
+
+# revision identifiers, used by Alembic.
+revision = '461d7c36f48d'
+down_revision = '5d0170e5019f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    revenue_daily = op.create_table(
+        'revenue_daily',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('service_id', sa.Integer(), nullable=False),
+        sa.Column('employee_id', sa.Integer(), nullable=False),
+        sa.Column('payment_method', sa.String(length=20), nullable=False),
+        sa.Column('visit_count', sa.Integer(), nullable=False),
+        sa.Column('revenue_total', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'service_id', 'employee_id', 'payment_method'),
+    )
+
+    # Tổng hợp dữ liệu hiện có (tương đương lệnh `flask revenue rebuild`)
+    service_history = sa.table(
+        'service_history', sa.column('id', sa.Integer), sa.column('service_id', sa.Integer),
+        sa.column('employee_id', sa.Integer), sa.column('payment_method', sa.String),
+        sa.column('service_date', sa.DateTime), sa.column('price', sa.Float))
+    service_day = local_date(service_history.c.service_date)
+    op.execute(revenue_daily.insert().from_select(
+        ['day', 'service_id', 'employee_id', 'payment_method', 'visit_count', 'revenue_total'],
+        sa.select(service_day, service_history.c.service_id, service_history.c.employee_id,
+                  service_history.c.payment_method, sa.func.count(service_history.c.id),
+                  sa.func.sum(service_history.c.price))
+        .group_by(service_day, service_history.c.service_id, service_history.c.employee_id,
+                  service_history.c.payment_method)
+    ))
+
+
+def downgrade():
+    op.drop_table('revenue_daily')
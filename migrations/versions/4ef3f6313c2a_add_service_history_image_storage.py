@@ -0,0 +1,84 @@
+"""Add service history image storage columns
+
+Revision ID: 4ef3f6313c2a
+Revises: eab58403b1cd
+Create Date: 2026-10-18 15:12:44.508316
+
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4ef3f6313c2a'
+down_revision = 'eab58403b1cd'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def _stored_location(row):
+    """Backend và khóa của ảnh cũ: public_id trên Cloudinary, hoặc tên file trong thư mục upload"""
+    if row.cloudinary_public_id:
+        return 'cloudinary', row.cloudinary_public_id
+    return 'local', os.path.basename(row.image_url)
+
+
+def _with_variant_keys(backend, variants):
+    # Biến thể lưu thành file riêng (local) cần khóa để xóa cùng ảnh chính
+    if not variants or backend != 'local':
+        return variants
+    return {name: dict(variant, key=os.path.basename(variant['url'])) for name, variant in variants.items()}
+
+
+def upgrade():
+    op.add_column('service_history_image', sa.Column('storage_backend', sa.String(length=20), nullable=True))
+    op.add_column('service_history_image', sa.Column('storage_key', sa.String(length=255), nullable=True))
+    op.add_column('service_history_image', sa.Column('content_hash', sa.String(length=64), nullable=True))
+
+    # Điền backend và khóa cho ảnh hiện có theo từng lô; ảnh cũ không có content_hash nên không được dùng lại
+    bind = op.get_bind()
+    image = sa.table('service_history_image', sa.column('id', sa.Integer), sa.column('image_url', sa.String),
+                     sa.column('cloudinary_public_id', sa.String), sa.column('variants', sa.JSON),
+                     sa.column('storage_backend', sa.String), sa.column('storage_key', sa.String))
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(image.c.id, image.c.image_url, image.c.cloudinary_public_id, image.c.variants)
+            .where(image.c.id > last_id).order_by(image.c.id).limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        values = []
+        for row in rows:
+            backend, key = _stored_location(row)
+            values.append({'image_id': row.id, 'backend': backend, 'key': key,
+                           'new_variants': _with_variant_keys(backend, row.variants)})
+        bind.execute(
+            image.update().where(image.c.id == sa.bindparam('image_id')).values(
+                storage_backend=sa.bindparam('backend'), storage_key=sa.bindparam('key'),
+                variants=sa.bindparam('new_variants', type_=sa.JSON)),
+            values
+        )
+        last_id = rows[-1].id
+
+    if bind.dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_service_history_image_storage_key '
+                       'ON service_history_image (storage_key)')
+            op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_service_history_image_content_hash '
+                       'ON service_history_image (content_hash)')
+    else:
+        op.create_index('ix_service_history_image_storage_key', 'service_history_image', ['storage_key'])
+        op.create_index('ix_service_history_image_content_hash', 'service_history_image', ['content_hash'])
+
+
+def downgrade():
+    op.drop_index('ix_service_history_image_content_hash', table_name='service_history_image')
+    op.drop_index('ix_service_history_image_storage_key', table_name='service_history_image')
+    op.drop_column('service_history_image', 'content_hash')
+    op.drop_column('service_history_image', 'storage_key')
+    op.drop_column('service_history_image', 'storage_backend')
@@ -0,0 +1,40 @@
+"""Add dashboard_counter
+
+Revision ID: 57266c14dc96
+Revises: a3a4bc3b4951
+Create Date: 2026-10-18 10:14:52.418207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '57266c14dc96'
+down_revision = 'a3a4bc3b4951'
+branch_labels = None
+depends_on = None
+
+# Tên bộ đếm -> bảng được đếm (giống dashboard_counters.COUNTED_MODELS)
+COUNTED_TABLES = {
+    'customers': 'customer',
+    'employees': 'employee',
+    'services': 'service',
+    'service_histories': 'service_history',
+}
+
+
+def upgrade():
+    op.create_table(
+        'dashboard_counter',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('value', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+    # Khởi tạo bộ đếm từ dữ liệu hiện có
+    for name, table in COUNTED_TABLES.items():
+        op.execute(f"INSERT INTO dashboard_counter (name, value) SELECT '{name}', count(*) FROM {table}")
+
+
+def downgrade():
+    op.drop_table('dashboard_counter')
@@ -0,0 +1,39 @@
+"""Add customer birth_month_day
+
+Revision ID: 5d0170e5019f
+Revises: d46fdfad7b34
+Create Date: 2026-10-17 10:48:55.271390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d0170e5019f'
+down_revision = 'd46fdfad7b34'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('customer', sa.Column('birth_month_day', sa.SmallInteger(), nullable=True))
+
+    customer = sa.table('customer', sa.column('birth_date', sa.Date),
+                        sa.column('birth_month_day', sa.SmallInteger))
+    op.execute(
+        customer.update().where(customer.c.birth_date.isnot(None)).values(
+            birth_month_day=sa.cast(sa.extract('month', customer.c.birth_date) * 100
+                                    + sa.extract('day', customer.c.birth_date), sa.SmallInteger))
+    )
+
+    concurrently = 'CONCURRENTLY ' if op.get_bind().dialect.name == 'postgresql' else ''
+    with op.get_context().autocommit_block():
+        op.execute(f'CREATE INDEX {concurrently}IF NOT EXISTS ix_customer_birth_month_day '
+                   'ON customer (birth_month_day)')
+
+
+def downgrade():
+    op.drop_index('ix_customer_birth_month_day', table_name='customer')
+    with op.batch_alter_table('customer') as batch_op:
+        batch_op.drop_column('birth_month_day')
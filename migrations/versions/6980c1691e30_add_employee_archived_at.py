@@ -0,0 +1,24 @@
+"""Add employee archived_at
+
+Revision ID: 6980c1691e30
+Revises: e23bd41cc31c
+Create Date: 2026-10-18 19:42:11.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6980c1691e30'
+down_revision = 'e23bd41cc31c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('employee', sa.Column('archived_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('employee', 'archived_at')
@@ -0,0 +1,29 @@
+"""Add cache_version
+
+Revision ID: a3a4bc3b4951
+Revises: 461d7c36f48d
+Create Date: 2026-10-18 08:52:19.330671
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3a4bc3b4951'
+down_revision = '461d7c36f48d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'cache_version',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+
+
+def downgrade():
+    op.drop_table('cache_version')
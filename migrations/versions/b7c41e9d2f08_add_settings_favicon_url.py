@@ -0,0 +1,24 @@
+"""Add settings favicon_url
+
+Revision ID: b7c41e9d2f08
+Revises: 6980c1691e30
+Create Date: 2026-10-18 21:05:37.418062
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7c41e9d2f08'
+down_revision = '6980c1691e30'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('settings', sa.Column('favicon_url', sa.String(length=255), nullable=True))
+
+
+def downgrade():
+    op.drop_column('settings', 'favicon_url')
@@ -0,0 +1,65 @@
+"""Add customer search columns
+
+Revision ID: d46fdfad7b34
+Revises: 2489fe22fa21
+Create Date: 2026-10-17 10:03:27.904412
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from text_utils import fold_text, digits_only
+
+
+# revision identifiers, used by Alembic.
+revision = 'd46fdfad7b34'
+down_revision = '2489fe22fa21'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def upgrade():
+    op.add_column('customer', sa.Column('search_name', sa.String(length=100), nullable=True))
+    op.add_column('customer', sa.Column('phone_digits', sa.String(length=20), nullable=True))
+
+    # Điền dữ liệu cho khách hàng hiện có theo từng lô (cùng hàm chuẩn hóa với ứng dụng)
+    bind = op.get_bind()
+    customer = sa.table('customer', sa.column('id', sa.Integer), sa.column('name', sa.String),
+                        sa.column('phone', sa.String), sa.column('search_name', sa.String),
+                        sa.column('phone_digits', sa.String))
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(customer.c.id, customer.c.name, customer.c.phone)
+            .where(customer.c.id > last_id).order_by(customer.c.id).limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        bind.execute(
+            customer.update().where(customer.c.id == sa.bindparam('customer_id')).values(
+                search_name=sa.bindparam('folded_name'), phone_digits=sa.bindparam('digits')),
+            [{'customer_id': row.id, 'folded_name': fold_text(row.name), 'digits': digits_only(row.phone)}
+             for row in rows]
+        )
+        last_id = rows[-1].id
+
+    if bind.dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        with op.get_context().autocommit_block():
+            op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_customer_search_name_trgm '
+                       'ON customer USING gin (search_name gin_trgm_ops)')
+            op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_customer_phone_digits_trgm '
+                       'ON customer USING gin (phone_digits gin_trgm_ops)')
+    else:
+        op.create_index('ix_customer_search_name_trgm', 'customer', ['search_name'])
+        op.create_index('ix_customer_phone_digits_trgm', 'customer', ['phone_digits'])
+
+
+def downgrade():
+    op.drop_index('ix_customer_phone_digits_trgm', table_name='customer')
+    op.drop_index('ix_customer_search_name_trgm', table_name='customer')
+    with op.batch_alter_table('customer') as batch_op:
+        batch_op.drop_column('phone_digits')
+        batch_op.drop_column('search_name')
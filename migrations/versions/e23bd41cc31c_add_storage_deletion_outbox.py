@@ -0,0 +1,37 @@
+"""Add storage_deletion outbox
+
+Revision ID: e23bd41cc31c
+Revises: 4ef3f6313c2a
+Create Date: 2026-10-18 16:27:05.913442
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e23bd41cc31c'
+down_revision = '4ef3f6313c2a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'storage_deletion',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('backend', sa.String(length=20), nullable=False),
+        sa.Column('storage_key', sa.String(length=255), nullable=False),
+        sa.Column('object_keys', sa.JSON(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_storage_deletion_next_attempt_at', 'storage_deletion', ['next_attempt_at'])
+
+
+def downgrade():
+    op.drop_index('ix_storage_deletion_next_attempt_at', table_name='storage_deletion')
+    op.drop_table('storage_deletion')
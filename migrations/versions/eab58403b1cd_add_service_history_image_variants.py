@@ -0,0 +1,31 @@
+"""Add service history image variants
+
+Revision ID: eab58403b1cd
+Revises: f35b6630fc47
+Create Date: 2026-10-18 13:41:09.215730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'eab58403b1cd'
+down_revision = 'f35b6630fc47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Ảnh cũ để trống các cột này và vẫn hiển thị bằng ảnh gốc
+    op.add_column('service_history_image', sa.Column('width', sa.Integer(), nullable=True))
+    op.add_column('service_history_image', sa.Column('height', sa.Integer(), nullable=True))
+    op.add_column('service_history_image', sa.Column('byte_size', sa.Integer(), nullable=True))
+    op.add_column('service_history_image', sa.Column('variants', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('service_history_image', 'variants')
+    op.drop_column('service_history_image', 'byte_size')
+    op.drop_column('service_history_image', 'height')
+    op.drop_column('service_history_image', 'width')
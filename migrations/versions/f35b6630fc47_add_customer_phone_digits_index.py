@@ -0,0 +1,29 @@
+"""Add customer phone_digits index
+
+Revision ID: f35b6630fc47
+Revises: 57266c14dc96
+Create Date: 2026-10-18 11:02:37.681295
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f35b6630fc47'
+down_revision = '57266c14dc96'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_customer_phone_digits '
+                       'ON customer (phone_digits)')
+    else:
+        op.create_index('ix_customer_phone_digits', 'customer', ['phone_digits'])
+
+
+def downgrade():
+    op.drop_index('ix_customer_phone_digits', table_name='customer')
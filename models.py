@@ -1,6 +1,8 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event
 from werkzeug.security import generate_password_hash, check_password_hash
+from text_utils import fold_text, digits_only
 
 db = SQLAlchemy()
 
@@ -13,10 +15,41 @@ class Customer(db.Model):
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Cột phục vụ tìm kiếm và lọc, tự cập nhật khi lưu (xem _sync_customer_derived_fields)
+    search_name = db.Column(db.String(100))  # Tên đã bỏ dấu, chữ thường
+    phone_digits = db.Column(db.String(20))  # Số điện thoại chỉ gồm chữ số
+    birth_month_day = db.Column(db.SmallInteger, index=True)  # Tháng*100 + ngày sinh, ví dụ 12/05 -> 512
     
     # Relationships
     service_histories = db.relationship('ServiceHistory', backref='customer', lazy=True)
 
+    # Index trigram (pg_trgm) cho tìm kiếm gần đúng theo tên và số điện thoại
+    __table_args__ = (
+        db.Index('ix_customer_search_name_trgm', 'search_name',
+                 postgresql_using='gin', postgresql_ops={'search_name': 'gin_trgm_ops'}),
+        db.Index('ix_customer_phone_digits_trgm', 'phone_digits',
+                 postgresql_using='gin', postgresql_ops={'phone_digits': 'gin_trgm_ops'}),
+        # Tra khách hàng theo đúng số điện thoại (nhập dữ liệu hàng loạt)
+        db.Index('ix_customer_phone_digits', 'phone_digits'),
+    )
+
+def birth_month_day(birth_date):
+    """Khóa tháng-ngày của ngày sinh (tháng*100 + ngày), dùng để lọc sinh nhật bằng index"""
+    if not birth_date:
+        return None
+    return birth_date.month * 100 + birth_date.day
+
+@event.listens_for(Customer, 'before_insert')
+@event.listens_for(Customer, 'before_update')
+def _sync_customer_derived_fields(mapper, connection, target):
+    target.search_name = fold_text(target.name)
+    target.phone_digits = digits_only(target.phone)
+    target.birth_month_day = birth_month_day(target.birth_date)
+
+# Index trigram cần extension pg_trgm khi tạo bảng bằng db.create_all()
+event.listen(Customer.__table__, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
 class Service(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -36,6 +69,8 @@ class Employee(db.Model):
     hire_date = db.Column(db.Date, default=datetime.utcnow().date())
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Thời điểm lưu trữ (nghỉ việc): không hiện trong danh sách và gợi ý, lịch sử cũ vẫn xem được
+    archived_at = db.Column(db.DateTime)
     
     # Relationships
     service_histories = db.relationship('ServiceHistory', backref='employee', lazy=True)
@@ -55,7 +90,7 @@ class ServiceHistory(db.Model):
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
     service_id = db.Column(db.Integer, db.ForeignKey('service.id'), nullable=False)
     employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
-    service_date = db.Column(db.DateTime, nullable=False)
+    service_date = db.Column(db.DateTime, nullable=False, index=True)
     price = db.Column(db.Float, nullable=False)
     payment_method = db.Column(db.String(20), nullable=False)
     notes = db.Column(db.Text)
@@ -65,6 +100,13 @@ class ServiceHistory(db.Model):
     # Relationships
     images = db.relationship('ServiceHistoryImage', backref='service_history', lazy=True, cascade='all, delete-orphan')
 
+    # Index cho các trang chi tiết khách hàng/nhân viên/dịch vụ (lọc theo khóa ngoại, sắp xếp theo ngày)
+    __table_args__ = (
+        db.Index('ix_service_history_customer_id_service_date', 'customer_id', 'service_date'),
+        db.Index('ix_service_history_employee_id_service_date', 'employee_id', 'service_date'),
+        db.Index('ix_service_history_service_id_service_date', 'service_id', 'service_date'),
+    )
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -80,15 +122,31 @@ class User(db.Model):
 
 class ServiceHistoryImage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    service_history_id = db.Column(db.Integer, db.ForeignKey('service_history.id'), nullable=False)
+    service_history_id = db.Column(db.Integer, db.ForeignKey('service_history.id'), nullable=False, index=True)
     image_url = db.Column(db.String(255), nullable=False)
     cloudinary_public_id = db.Column(db.String(255))  # Lưu trữ public_id từ Cloudinary
+    # Nơi lưu ảnh (storage.STORAGE_BACKENDS), khóa trong backend và mã băm nội dung file gốc
+    storage_backend = db.Column(db.String(20))
+    storage_key = db.Column(db.String(255), index=True)
+    content_hash = db.Column(db.String(64), index=True)
+    # Kích thước ảnh sau khi chuẩn hóa (image_processing)
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    byte_size = db.Column(db.Integer)
+    # Ảnh thu nhỏ: {tên biến thể: {'url', 'key', 'width', 'height'}}, key rỗng nếu biến thể là URL biến đổi
+    variants = db.Column(db.JSON)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    def variant_url(self, name):
+        """URL của biến thể `name`, hoặc ảnh gốc nếu không có biến thể đó (ảnh cũ)"""
+        variant = (self.variants or {}).get(name)
+        return variant['url'] if variant else self.image_url
+
 class Settings(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     company_name = db.Column(db.String(100), default='Khởi Nghiệp Salon')
     company_logo_url = db.Column(db.String(255), default='static/images/default_logo.png') # Default logo path
+    favicon_url = db.Column(db.String(255))
     primary_color = db.Column(db.String(7), default='#0ea5e9') # Tailwind primary-500
     address = db.Column(db.String(255), default='Địa chỉ Salon của bạn')
     phone = db.Column(db.String(20), default='0123456789')
@@ -99,4 +157,50 @@ class Settings(db.Model):
     welcome_title = db.Column(db.String(255), default='Chào mừng đến với Khởi Nghiệp Salon')
     welcome_subtitle = db.Column(db.String(255), default='Hệ thống quản lý salon chuyên nghiệp')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow) 
\ No newline at end of file
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow) 
+
+
+class RevenueDaily(db.Model):
+    """Doanh thu tổng hợp theo ngày (giờ salon), dịch vụ, nhân viên và hình thức thanh toán.
+
+    Được cập nhật trong cùng transaction với ServiceHistory (xem revenue_rollup.py).
+    """
+    __tablename__ = 'revenue_daily'
+
+    day = db.Column(db.Date, primary_key=True)
+    service_id = db.Column(db.Integer, primary_key=True)
+    employee_id = db.Column(db.Integer, primary_key=True)
+    payment_method = db.Column(db.String(20), primary_key=True)
+    visit_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue_total = db.Column(db.Float, nullable=False, default=0)
+
+class CacheVersion(db.Model):
+    """Phiên bản dữ liệu dùng chung giữa các worker, để biết khi nào phải làm mới cache trong bộ nhớ"""
+    __tablename__ = 'cache_version'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class DashboardCounter(db.Model):
+    """Bộ đếm tổng số bản ghi cho trang chủ, cập nhật khi thêm/xóa (xem dashboard_counters.py)"""
+    __tablename__ = 'dashboard_counter'
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+class StorageDeletion(db.Model):
+    """Yêu cầu xóa file đã lưu (outbox), ghi trong cùng transaction với việc xóa ảnh.
+
+    Được xử lý sau bởi `flask media process-deletions` (xem storage_outbox.py).
+    """
+    __tablename__ = 'storage_deletion'
+
+    id = db.Column(db.Integer, primary_key=True)
+    backend = db.Column(db.String(20), nullable=False)
+    storage_key = db.Column(db.String(255), nullable=False)
+    # Khóa ảnh chính và các biến thể cần xóa
+    object_keys = db.Column(db.JSON, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,168 @@
+import atexit
+import io
+import multiprocessing
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import click
+from flask import current_app
+from pypdf import PdfReader, PdfWriter
+from models import db, ServiceHistory
+from history_export import export_cli, export_query
+from history_queries import history_date_criteria
+from receipt_renderer import render_chunk
+from settings_cache import get_settings
+from timezone_utils import to_local_datetime
+
+# Số biên nhận mỗi nhóm giao cho một tiến trình: mỗi nhóm là một tài liệu PDF và phải nạp font một lần,
+# nên nhóm càng lớn càng ít lần nạp font, nhưng không nhỏ hơn MIN để đáng chia sang tiến trình khác
+MIN_RECEIPTS_PER_TASK = 100
+MAX_RECEIPTS_PER_TASK = 1000
+
+# Process pool dùng chung của tiến trình hiện tại, tạo khi cần lần đầu và đóng khi thoát (atexit)
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def company_info():
+    """Thông tin salon in trên biên nhận (dict để gửi được sang tiến trình con)"""
+    settings = get_settings()
+    return {'company_name': settings.company_name, 'address': settings.address,
+            'phone': settings.phone, 'email': settings.email}
+
+
+def _get_pool(workers):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None and _pool_workers != workers:
+            _pool.shutdown(wait=False)
+            _pool = None
+        if _pool is None:
+            # spawn thay vì fork: tiến trình con không thừa hưởng kết nối DB hay luồng của web worker
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = workers
+        return _pool
+
+
+def _discard_pool(pool):
+    # Pool hỏng (tiến trình con bị kill) không dùng lại được, lần sau tạo pool mới
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+@atexit.register
+def shutdown_pool():
+    """Đóng process pool (nếu đã tạo) khi tiến trình thoát"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def load_receipts(*criteria):
+    """Dữ liệu biên nhận của các lịch sử dịch vụ thỏa điều kiện, theo thứ tự ngày (một câu truy vấn JOIN)"""
+    receipts = []
+    for history_id, service_date, customer, phone, service, employee, price, payment_method, notes in \
+            db.session.execute(export_query(*criteria)):
+        receipts.append({
+            'id': history_id,
+            'code': f'#{history_id:06d}',
+            'service_date': to_local_datetime(service_date).strftime('%d/%m/%Y %H:%M'),
+            'customer': customer,
+            'phone': phone,
+            'service': service,
+            'employee': employee,
+            'price': price,
+            'payment_method': payment_method,
+            'notes': notes,
+        })
+    return receipts
+
+
+def render_receipts(receipts, workers=None):
+    """Vẽ biên nhận theo từng nhóm, song song trên process pool dùng chung khi có nhiều nhóm.
+
+    Trả về danh sách kết quả của từng nhóm: (bytes PDF, [(id, trang đầu, trang cuối)]).
+    """
+    company = company_info()
+    font_path = current_app.config['PDF_FONT_PATH']
+    workers = workers or current_app.config['PDF_WORKERS']
+    size = min(max(-(-len(receipts) // workers), MIN_RECEIPTS_PER_TASK), MAX_RECEIPTS_PER_TASK)
+    chunks = [receipts[i:i + size] for i in range(0, len(receipts), size)]
+    if len(chunks) <= 1 or workers <= 1:
+        return [render_chunk(company, font_path, chunk) for chunk in chunks]
+
+    # Pool được giữ lại giữa các lần xuất: tiến trình con đã nạp font không phải khởi động lại mỗi request
+    pool = _get_pool(workers)
+    count = len(chunks)
+    try:
+        return list(pool.map(render_chunk, [company] * count, [font_path] * count, chunks))
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+
+
+def merge_pdf(results):
+    """Gộp kết quả các nhóm thành một file PDF"""
+    if len(results) == 1:
+        return results[0][0]
+    writer = PdfWriter()
+    for data, _ in results:
+        writer.append(PdfReader(io.BytesIO(data)))
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def zip_receipts(results):
+    """Tách kết quả thành từng file PDF cho mỗi biên nhận và nén vào một file ZIP"""
+    output = io.BytesIO()
+    # PDF đã được nén sẵn nên chỉ lưu, không nén lại
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_STORED) as archive:
+        for data, pages in results:
+            reader = PdfReader(io.BytesIO(data))
+            for history_id, first_page, last_page in pages:
+                writer = PdfWriter()
+                for page in range(first_page, last_page + 1):
+                    writer.add_page(reader.pages[page])
+                receipt = io.BytesIO()
+                writer.write(receipt)
+                archive.writestr(f'bien_nhan_{history_id}.pdf', receipt.getvalue())
+    return output.getvalue()
+
+
+def build_receipts(criteria, as_zip=False, workers=None):
+    """Tạo file PDF (hoặc ZIP) biên nhận cho các lịch sử dịch vụ thỏa điều kiện; trả về (bytes, số biên nhận)"""
+    receipts = load_receipts(*criteria)
+    if not receipts:
+        return None, 0
+    results = render_receipts(receipts, workers)
+    return (zip_receipts(results) if as_zip else merge_pdf(results)), len(receipts)
+
+
+@export_cli.command('receipts')
+@click.option('--date-from', type=click.DateTime(formats=['%Y-%m-%d']), help='Ngày bắt đầu (YYYY-MM-DD)')
+@click.option('--date-to', type=click.DateTime(formats=['%Y-%m-%d']), help='Ngày kết thúc (YYYY-MM-DD)')
+@click.option('--customer-id', type=int, help='Chỉ xuất lịch sử của một khách hàng')
+@click.option('--zip', 'as_zip', is_flag=True, help='Mỗi biên nhận một file PDF, nén trong file ZIP')
+@click.option('--workers', type=int, help='Số tiến trình vẽ PDF (mặc định PDF_WORKERS)')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='File kết quả')
+def export_receipts_command(date_from, date_to, customer_id, as_zip, workers, output):
+    """Xuất biên nhận dịch vụ ra một file PDF hoặc ZIP."""
+    criteria = history_date_criteria(date_from.date() if date_from else None, date_to.date() if date_to else None)
+    if customer_id:
+        criteria.append(ServiceHistory.customer_id == customer_id)
+    data, count = build_receipts(criteria, as_zip, workers)
+    if not count:
+        click.echo('Không có lịch sử dịch vụ nào thỏa điều kiện.')
+        return
+    output = output or ('bien_nhan.zip' if as_zip else 'bien_nhan.pdf')
+    with open(output, 'wb') as file:
+        file.write(data)
+    click.echo(f'Đã xuất {count} biên nhận ra {output}')
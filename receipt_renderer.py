@@ -0,0 +1,137 @@
+import os
+import unicodedata
+from fpdf import FPDF
+from filters.number_filters import format_number
+
+# Font Unicode cho tiếng Việt; font PDF mặc định (Helvetica) không có dấu tiếng Việt
+DEFAULT_FONT_PATHS = (
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'fonts', 'DejaVuSans.ttf'),
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSans.ttf',
+)
+
+# Bố cục biên nhận (khổ A5): (nhãn, khóa trong dict biên nhận)
+RECEIPT_FIELDS = (
+    ('Mã biên nhận', 'code'),
+    ('Ngày', 'service_date'),
+    ('Khách hàng', 'customer'),
+    ('Số điện thoại', 'phone'),
+    ('Dịch vụ', 'service'),
+    ('Nhân viên', 'employee'),
+    ('Thanh toán', 'payment_method'),
+)
+
+
+def find_font(path=None):
+    """Đường dẫn font TTF dùng cho PDF: `path` nếu có, nếu không thì font DejaVu có sẵn trên máy"""
+    for candidate in ((path,) if path else DEFAULT_FONT_PATHS):
+        if candidate and os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def _strip_accents(value):
+    value = value.replace('đ', 'd').replace('Đ', 'D')
+    value = unicodedata.normalize('NFD', value)
+    return ''.join(ch for ch in value if not unicodedata.combining(ch)).encode('latin-1', 'replace').decode('latin-1')
+
+
+class ReceiptRenderer:
+    """Vẽ biên nhận dịch vụ ra PDF bằng fpdf2 (thuần Python).
+
+    Thông tin salon, font và bố cục được chuẩn bị một lần khi tạo đối tượng; mỗi tiến trình
+    (web worker hoặc tiến trình con của pool) giữ một ReceiptRenderer và dùng lại cho mọi lô.
+    """
+
+    def __init__(self, company, font_path=None):
+        self.company = company
+        self.font_path = find_font(font_path)
+        self.bold_font_path = None
+        if self.font_path:
+            bold = self.font_path.replace('.ttf', '-Bold.ttf')
+            self.bold_font_path = bold if os.path.exists(bold) else None
+        # Không có font Unicode thì bỏ dấu để vẫn in được bằng font mặc định
+        self.font = 'Receipt' if self.font_path else 'Helvetica'
+        self.text = (lambda value: value) if self.font_path else _strip_accents
+        self.header_lines = [self.text(line) for line in (
+            company.get('address') or '',
+            ' - '.join(value for value in (company.get('phone'), company.get('email')) if value),
+        ) if line]
+
+    def _new_document(self):
+        pdf = FPDF(format=(148, 210))  # A5
+        pdf.set_auto_page_break(auto=True, margin=12)
+        pdf.set_title(self.text('Biên nhận dịch vụ'))
+        if self.font_path:
+            pdf.add_font('Receipt', '', self.font_path)
+            pdf.add_font('Receipt', 'B', self.bold_font_path or self.font_path)
+        return pdf
+
+    def _draw(self, pdf, receipt):
+        text = self.text
+        pdf.add_page()
+        width = pdf.epw
+
+        pdf.set_font(self.font, 'B', 14)
+        pdf.cell(width, 8, text(self.company.get('company_name') or ''), align='C', new_x='LMARGIN', new_y='NEXT')
+        pdf.set_font(self.font, '', 9)
+        for line in self.header_lines:
+            pdf.cell(width, 5, line, align='C', new_x='LMARGIN', new_y='NEXT')
+        pdf.ln(4)
+
+        pdf.set_font(self.font, 'B', 13)
+        pdf.cell(width, 8, text('BIÊN NHẬN DỊCH VỤ'), align='C', new_x='LMARGIN', new_y='NEXT')
+        pdf.ln(3)
+
+        for label, key in RECEIPT_FIELDS:
+            pdf.set_font(self.font, 'B', 10)
+            pdf.cell(35, 7, text(label + ':'))
+            pdf.set_font(self.font, '', 10)
+            # Các trường ngắn dùng cell (nhanh hơn multi_cell nhiều), chỉ ghi chú mới cần xuống dòng
+            pdf.cell(width - 35, 7, text(str(receipt.get(key) or '')), new_x='LMARGIN', new_y='NEXT')
+        if receipt.get('notes'):
+            pdf.set_font(self.font, 'B', 10)
+            pdf.cell(35, 7, text('Ghi chú:'))
+            pdf.set_font(self.font, '', 10)
+            pdf.multi_cell(width - 35, 7, text(receipt['notes']), new_x='LMARGIN', new_y='NEXT')
+
+        pdf.ln(3)
+        pdf.line(pdf.l_margin, pdf.get_y(), pdf.l_margin + width, pdf.get_y())
+        pdf.ln(2)
+        pdf.set_font(self.font, 'B', 12)
+        pdf.cell(35, 9, text('Tổng tiền:'))
+        pdf.cell(width - 35, 9, text(f"{format_number(receipt.get('price'))} VNĐ"), align='R', new_x='LMARGIN', new_y='NEXT')
+
+        pdf.ln(6)
+        pdf.set_font(self.font, '', 9)
+        pdf.cell(width, 5, text('Cảm ơn quý khách!'), align='C', new_x='LMARGIN', new_y='NEXT')
+
+    def render(self, receipts):
+        """Vẽ danh sách biên nhận vào một file PDF.
+
+        Trả về (bytes, [(id, trang đầu, trang cuối)]) với số trang tính từ 0, để có thể tách từng biên nhận.
+        """
+        pdf = self._new_document()
+        pages = []
+        for receipt in receipts:
+            first_page = pdf.page_no()
+            self._draw(pdf, receipt)
+            pages.append((receipt['id'], first_page, pdf.page_no() - 1))
+        return bytes(pdf.output()), pages
+
+
+# ReceiptRenderer của tiến trình hiện tại (web worker hoặc tiến trình con trong pool): (khóa, renderer),
+# tạo lại khi thông tin salon hoặc font thay đổi
+_renderer = (None, None)
+
+
+def cached_renderer(company, font_path):
+    global _renderer
+    key = (tuple(sorted(company.items())), font_path)
+    if _renderer[0] != key:
+        _renderer = (key, ReceiptRenderer(company, font_path))
+    return _renderer[1]
+
+
+def render_chunk(company, font_path, receipts):
+    return cached_renderer(company, font_path).render(receipts)
@@ -0,0 +1,172 @@
+import hmac
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from flask import current_app, g, request, render_template, jsonify, abort, has_app_context, template_rendered, before_render_template
+from sqlalchemy import event
+from models import db
+
+# Chuẩn hóa câu SQL thành "dấu vân tay": bỏ giá trị hằng và gộp danh sách tham số IN (...) có độ dài khác nhau
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PARAM_LISTS = re.compile(r'\((?:\s*(?:\?|%\([^)]+\)s|%s|:\w+|__\[POSTCOMPILE_\w+\])\s*,?)+\)')
+_WHITESPACE = re.compile(r'\s+')
+
+# Endpoint không được đo (trang xem kết quả và file tĩnh)
+SKIPPED_ENDPOINTS = {'debug_requests', 'static', 'serve_uploaded_file', 'uploaded_file', 'resized_image'}
+
+# Kết quả gần nhất của worker hiện tại (mỗi tiến trình gunicorn có bộ đệm riêng), tạo trong init_profiler
+_recent = deque()
+_recent_lock = threading.Lock()
+
+
+def fingerprint(statement):
+    """Dấu vân tay của một câu SQL: các lần chạy chỉ khác tham số có cùng dấu vân tay"""
+    statement = _LITERALS.sub('?', statement)
+    statement = _PARAM_LISTS.sub('(?)', statement)
+    return _WHITESPACE.sub(' ', statement).strip()
+
+
+class RequestProfile:
+    """Số liệu của một request được lấy mẫu"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.statements = Counter()
+        self.statement_time = Counter()
+        self.render_started = []
+
+    def record_query(self, statement, duration):
+        key = fingerprint(statement)
+        self.query_count += 1
+        self.sql_time += duration
+        self.statements[key] += 1
+        self.statement_time[key] += duration
+
+    def repeated_statements(self, threshold):
+        """Câu SELECT lặp lại từ `threshold` lần trở lên: dấu hiệu N+1 (truy vấn trong vòng lặp)"""
+        return [
+            {'statement': statement, 'count': count, 'time_ms': round(self.statement_time[statement] * 1000, 2)}
+            for statement, count in self.statements.most_common()
+            if count >= threshold and statement.upper().startswith('SELECT')
+        ]
+
+
+def _current_profile():
+    # Sự kiện SQL có thể đến từ thread không có app context (pool tải ảnh, lệnh CLI)
+    if not has_app_context():
+        return None
+    return g.get('_request_profile')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile() is not None:
+        conn.info.setdefault('profiler_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile()
+    if profile is None:
+        return
+    started = conn.info.get('profiler_started')
+    if started:
+        profile.record_query(statement, time.perf_counter() - started.pop())
+
+
+def _before_render(sender, template, context, **extra):
+    profile = _current_profile()
+    if profile is not None:
+        profile.render_started.append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    profile = _current_profile()
+    if profile is not None and profile.render_started:
+        duration = time.perf_counter() - profile.render_started.pop()
+        # Template lồng nhau (render_template trong template) chỉ tính một lần ở lớp ngoài cùng
+        if not profile.render_started:
+            profile.render_time += duration
+
+
+def _start_profile():
+    if request.endpoint in SKIPPED_ENDPOINTS:
+        return
+    if random.random() < current_app.config['PROFILER_SAMPLE_RATE']:
+        g._request_profile = RequestProfile()
+
+
+def _finish_profile(response):
+    profile = g.pop('_request_profile', None)
+    if profile is None:
+        return response
+    config = current_app.config
+    total = time.perf_counter() - profile.started
+    repeated = profile.repeated_statements(config['PROFILER_N_PLUS_ONE_THRESHOLD'])
+
+    response.headers.add('Server-Timing', f'db;dur={profile.sql_time * 1000:.1f};desc="{profile.query_count} queries"')
+    response.headers.add('Server-Timing', f'render;dur={profile.render_time * 1000:.1f}')
+    response.headers.add('Server-Timing', f'total;dur={total * 1000:.1f}')
+    if repeated:
+        current_app.logger.warning(
+            f"Possible N+1 in {request.method} {request.path}: "
+            + '; '.join(f"{item['count']}x {item['statement'][:120]}" for item in repeated))
+
+    with _recent_lock:
+        _recent.append({
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'method': request.method,
+            # Không lưu query string: có thể chứa tên, số điện thoại khách hàng đang tìm
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'sql_ms': round(profile.sql_time * 1000, 2),
+            'render_ms': round(profile.render_time * 1000, 2),
+            'query_count': profile.query_count,
+            'distinct_queries': len(profile.statements),
+            'n_plus_one': repeated,
+        })
+    return response
+
+
+def debug_requests():
+    """Các request được lấy mẫu gần nhất của worker này, mới nhất trước"""
+    token = current_app.config['PROFILER_TOKEN']
+    given = request.headers.get('X-Profiler-Token') or request.args.get('token') or ''
+    if not token or not hmac.compare_digest(given.encode(), token.encode()):
+        abort(404)
+    with _recent_lock:
+        items = list(reversed(_recent))
+    if request.args.get('format') == 'json':
+        return jsonify({'success': True, 'requests': items})
+    return render_template('debug/requests.html', requests=items,
+                           sample_rate=current_app.config['PROFILER_SAMPLE_RATE'])
+
+
+def init_profiler(app):
+    """Bật đo thời gian SQL/render cho từng request nếu PROFILER_ENABLED.
+
+    Chỉ các request được lấy mẫu (PROFILER_SAMPLE_RATE) mới được đo; khi tắt, không có listener nào
+    được đăng ký nên không tốn chi phí. Trang /_debug/requests chỉ được đăng ký khi có PROFILER_TOKEN.
+    """
+    if not app.config['PROFILER_ENABLED']:
+        return
+    global _recent
+    _recent = deque(maxlen=app.config['PROFILER_HISTORY'])
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
+    if app.config['PROFILER_TOKEN']:
+        app.add_url_rule('/_debug/requests', 'debug_requests', debug_requests)
+    else:
+        app.logger.warning('PROFILER_TOKEN chưa được đặt: trang /_debug/requests bị tắt, chỉ có header Server-Timing')
@@ -0,0 +1,134 @@
+import os
+import threading
+from functools import lru_cache
+from flask import current_app, url_for, abort
+from werkzeug.security import safe_join
+from image_processing import ImageProcessingError, resize_to_width
+from media_serving import send_media
+from storage import get_storage
+
+# Thư mục con trong thư mục upload chứa ảnh thu nhỏ theo chiều rộng (<chiều rộng>/<khóa ảnh>)
+RESIZED_FOLDER = '_resized'
+
+# Dung lượng cache ảnh thu nhỏ ước lượng trong process, tính lại mỗi lần dọn cache
+_cache_bytes = None
+_cache_lock = threading.Lock()
+
+
+@lru_cache(maxsize=4096)
+def _cloudinary_variant_url(key, width):
+    # Khóa theo nội dung nên URL biến đổi của một ảnh không bao giờ đổi
+    return get_storage(current_app, 'cloudinary').variant_url(key, width, None)
+
+
+def image_width_url(image, width):
+    """URL của ảnh thu nhỏ về chiều rộng `width`, hoặc None nếu backend không tạo được ảnh theo kích thước"""
+    if image.storage_backend == 'cloudinary':
+        return _cloudinary_variant_url(image.storage_key, width)
+    if image.storage_backend == 'local':
+        return url_for('resized_image', width=width, filename=image.storage_key)
+    return None
+
+
+def srcset_candidates(image):
+    """Các ảnh cho srcset của một ServiceHistoryImage: [(URL, chiều rộng)] từ nhỏ đến lớn.
+
+    Cloudinary và ảnh local được thu nhỏ theo IMAGE_SRCSET_WIDTHS; backend khác (S3) chỉ dùng các
+    biến thể đã lưu. Ảnh cũ chưa có kích thước không có srcset.
+    """
+    if not image.storage_key or not image.width:
+        return []
+    if image.storage_backend == 'local':
+        original = url_for('serve_uploaded_file', filename=image.storage_key)
+    else:
+        original = image.image_url
+
+    candidates = []
+    for width in current_app.config['IMAGE_SRCSET_WIDTHS']:
+        if width >= image.width:
+            break
+        url = image_width_url(image, width)
+        if url is None:
+            candidates = [(variant['url'], variant['width']) for variant in (image.variants or {}).values()
+                          if variant['width'] < image.width]
+            break
+        candidates.append((url, width))
+    candidates.append((original, image.width))
+    return sorted(candidates, key=lambda candidate: candidate[1])
+
+
+def _cache_files(folder):
+    for root, _, names in os.walk(folder):
+        for name in names:
+            # File tạm của request khác đang ghi dở (xem send_resized_image) không thuộc cache
+            if name.endswith('.tmp'):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            yield stat.st_mtime, stat.st_size, path
+
+
+def _evict(folder, max_bytes):
+    """Xóa các ảnh lâu không dùng nhất (mtime cũ nhất) tới khi cache còn dưới 90% giới hạn; trả về dung lượng còn lại"""
+    files = sorted(_cache_files(folder))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in files:
+        if total <= max_bytes * 0.9:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    return total
+
+
+def _record_cached(folder, size, max_bytes):
+    global _cache_bytes
+    with _cache_lock:
+        if _cache_bytes is None:
+            # Lần đầu trong process: đếm cả file vừa ghi
+            _cache_bytes = sum(size for _, size, _ in _cache_files(folder))
+        else:
+            _cache_bytes += size
+        if _cache_bytes > max_bytes:
+            _cache_bytes = _evict(folder, max_bytes)
+
+
+def send_resized_image(filename, width):
+    """Phục vụ ảnh local thu nhỏ về chiều rộng `width`; tạo khi được yêu cầu lần đầu và lưu vào cache.
+
+    Cache nằm trên đĩa, giới hạn bởi IMAGE_RESIZE_CACHE_MAX_BYTES và dọn theo LRU: mỗi lần dùng lại,
+    thời gian sửa của file được cập nhật, khi vượt giới hạn thì xóa các file cũ nhất.
+    """
+    config = current_app.config
+    if width not in config['IMAGE_SRCSET_WIDTHS']:
+        abort(404)
+    source = safe_join(config['UPLOAD_FOLDER'], filename)
+    # Ảnh gốc đã bị xóa thì bản thu nhỏ cũng không còn được phục vụ
+    if source is None or not os.path.isfile(source):
+        abort(404)
+
+    relative = f'{RESIZED_FOLDER}/{width}/{filename}'
+    cache_folder = os.path.join(config['UPLOAD_FOLDER'], RESIZED_FOLDER)
+    path = os.path.join(config['UPLOAD_FOLDER'], relative)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        # Chưa có trong cache, hoặc vừa bị request khác dọn khỏi cache: tạo lại
+        try:
+            with open(source, 'rb') as file:
+                resized = resize_to_width(file, width, config['IMAGE_QUALITY'])
+        except ImageProcessingError:
+            abort(404)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Tên file tạm riêng cho từng worker và thread, để các request cùng tạo một ảnh không ghi đè nhau
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(resized.data)
+        os.replace(temp_path, path)
+        _record_cached(cache_folder, len(resized.data), config['IMAGE_RESIZE_CACHE_MAX_BYTES'])
+    return send_media(relative)
@@ -0,0 +1,137 @@
+from collections import defaultdict
+from datetime import timedelta
+import click
+from flask.cli import AppGroup
+from sqlalchemy import delete, event, func, inspect, insert, select
+from sqlalchemy.orm import Session
+from models import db, ServiceHistory, RevenueDaily
+from db_utils import upsert_insert
+from cache_versions import bump_cache_version
+from timezone_utils import local_date, local_day_start, to_local_date, salon_today
+
+# Các thuộc tính của ServiceHistory ảnh hưởng tới bảng tổng hợp
+ROLLUP_ATTRIBUTES = ('service_date', 'service_id', 'employee_id', 'payment_method', 'price')
+
+# Tên phiên bản cache, tăng khi dữ liệu của các ngày đã qua thay đổi (xem revenue_series.py)
+REVENUE_CACHE_VERSION = 'revenue_closed_days'
+
+revenue_cli = AppGroup('revenue', help='Quản lý bảng doanh thu tổng hợp.')
+
+
+def _rollup_key(values):
+    return (to_local_date(values['service_date']), int(values['service_id']),
+            int(values['employee_id']), values['payment_method'])
+
+
+def _current_values(history):
+    return {name: getattr(history, name) for name in ROLLUP_ATTRIBUTES}
+
+
+def _committed_values(history):
+    """Giá trị của các thuộc tính trước khi bị thay đổi trong flush này"""
+    state = inspect(history)
+    values = {}
+    for name in ROLLUP_ATTRIBUTES:
+        attribute_history = state.attrs[name].history
+        if attribute_history.deleted:
+            values[name] = attribute_history.deleted[0]
+        elif attribute_history.unchanged:
+            values[name] = attribute_history.unchanged[0]
+        else:
+            values[name] = getattr(history, name)
+    return values
+
+
+def _has_rollup_changes(history):
+    state = inspect(history)
+    return any(state.attrs[name].history.has_changes() for name in ROLLUP_ATTRIBUTES)
+
+
+def apply_revenue_deltas(connection, deltas):
+    """Cộng dồn các thay đổi {(day, service_id, employee_id, payment_method): [count, total]} vào revenue_daily"""
+    rows = [
+        {'day': day, 'service_id': service_id, 'employee_id': employee_id, 'payment_method': payment_method,
+         'visit_count': count, 'revenue_total': total}
+        for (day, service_id, employee_id, payment_method), (count, total) in deltas.items()
+        if count or total
+    ]
+    if not rows:
+        return
+
+    statement = upsert_insert(connection, RevenueDaily)
+    table = RevenueDaily.__table__
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.day, table.c.service_id, table.c.employee_id, table.c.payment_method],
+        set_={
+            'visit_count': table.c.visit_count + statement.excluded.visit_count,
+            'revenue_total': table.c.revenue_total + statement.excluded.revenue_total,
+        },
+    )
+    connection.execute(statement, rows)
+
+    # Bỏ các dòng không còn lượt khách nào
+    days = {row['day'] for row in rows}
+    connection.execute(delete(RevenueDaily).where(RevenueDaily.day.in_(days), RevenueDaily.visit_count <= 0))
+
+    # Số liệu của ngày đã qua có thể đang được cache, báo cho các worker làm mới
+    if min(days) < salon_today():
+        bump_cache_version(connection, REVENUE_CACHE_VERSION)
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_revenue_rollup(session, flush_context):
+    deltas = defaultdict(lambda: [0, 0.0])
+
+    def add(values, sign):
+        entry = deltas[_rollup_key(values)]
+        entry[0] += sign
+        entry[1] += sign * float(values['price'])
+
+    for obj in session.new:
+        if isinstance(obj, ServiceHistory):
+            add(_current_values(obj), 1)
+    for obj in session.dirty:
+        if isinstance(obj, ServiceHistory) and _has_rollup_changes(obj):
+            add(_committed_values(obj), -1)
+            add(_current_values(obj), 1)
+    for obj in session.deleted:
+        if isinstance(obj, ServiceHistory):
+            add(_committed_values(obj), -1)
+
+    if deltas:
+        apply_revenue_deltas(session.connection(), deltas)
+
+
+def rebuild_revenue_daily(connection, date_from=None, date_to=None):
+    """Tính lại revenue_daily từ service_history, cho toàn bộ hoặc một khoảng ngày (giờ salon, tính cả hai đầu)"""
+    service_day = local_date(ServiceHistory.service_date)
+    source = select(
+        service_day, ServiceHistory.service_id, ServiceHistory.employee_id, ServiceHistory.payment_method,
+        func.count(ServiceHistory.id), func.coalesce(func.sum(ServiceHistory.price), 0),
+    )
+    clear = delete(RevenueDaily)
+    if date_from:
+        source = source.where(ServiceHistory.service_date >= local_day_start(date_from))
+        clear = clear.where(RevenueDaily.day >= date_from)
+    if date_to:
+        source = source.where(ServiceHistory.service_date < local_day_start(date_to + timedelta(days=1)))
+        clear = clear.where(RevenueDaily.day <= date_to)
+    source = source.group_by(service_day, ServiceHistory.service_id, ServiceHistory.employee_id,
+                             ServiceHistory.payment_method)
+
+    connection.execute(clear)
+    connection.execute(insert(RevenueDaily).from_select(
+        ['day', 'service_id', 'employee_id', 'payment_method', 'visit_count', 'revenue_total'], source))
+    bump_cache_version(connection, REVENUE_CACHE_VERSION)
+
+
+@revenue_cli.command('rebuild')
+@click.option('--date-from', type=click.DateTime(formats=['%Y-%m-%d']), help='Ngày bắt đầu (YYYY-MM-DD)')
+@click.option('--date-to', type=click.DateTime(formats=['%Y-%m-%d']), help='Ngày kết thúc (YYYY-MM-DD)')
+def rebuild_command(date_from, date_to):
+    """Tính lại bảng doanh thu tổng hợp từ lịch sử dịch vụ."""
+    with db.engine.begin() as connection:
+        rebuild_revenue_daily(connection,
+                              date_from.date() if date_from else None,
+                              date_to.date() if date_to else None)
+    click.echo('Đã tính lại bảng doanh thu tổng hợp.')
@@ -0,0 +1,107 @@
+from collections import defaultdict
+from models import db, RevenueDaily, Service, Employee
+from cache_versions import read_cache_version
+from revenue_rollup import REVENUE_CACHE_VERSION
+from timezone_utils import date_bucket, bucket_start, next_bucket_start, salon_today
+
+# Các cách tách chuỗi doanh thu
+SPLIT_COLUMNS = {
+    'service': RevenueDaily.service_id,
+    'employee': RevenueDaily.employee_id,
+    'payment_method': RevenueDaily.payment_method,
+}
+
+# Số liệu của các kỳ đã đóng: {(granularity, split, filters): {bucket_start: [dòng]}}
+_closed_buckets = {}
+_closed_buckets_version = None
+MAX_CACHED_SERIES = 256
+
+
+def _query_buckets(granularity, split, filters, start, end):
+    """Tổng hợp revenue_daily theo kỳ trong khoảng ngày [start, end)"""
+    bucket = date_bucket(granularity, RevenueDaily.day).label('bucket')
+    columns = [bucket]
+    if split:
+        columns.append(SPLIT_COLUMNS[split].label('key'))
+    query = db.session.query(
+        *columns,
+        db.func.sum(RevenueDaily.visit_count).label('count'),
+        db.func.sum(RevenueDaily.revenue_total).label('total'),
+    ).filter(RevenueDaily.day >= start, RevenueDaily.day < end, *filters)
+    query = query.group_by(*columns).order_by(bucket)
+
+    rows = defaultdict(list)
+    for row in query:
+        values = {'count': int(row.count or 0), 'total': float(row.total or 0)}
+        if split:
+            values['key'] = row.key
+        rows[row.bucket].append(values)
+    return rows
+
+
+def _cached_closed_buckets(cache_key):
+    global _closed_buckets_version
+    version = read_cache_version(REVENUE_CACHE_VERSION)
+    if version != _closed_buckets_version or len(_closed_buckets) > MAX_CACHED_SERIES:
+        _closed_buckets.clear()
+        _closed_buckets_version = version
+    return _closed_buckets.setdefault(cache_key, {})
+
+
+def revenue_series(granularity, date_from, date_to, split=None, service_id=None, employee_id=None):
+    """Chuỗi doanh thu và số lượt khách theo kỳ (day/week/month) trong khoảng [date_from, date_to].
+
+    Kỳ đã đóng và nằm trọn trong khoảng được cache trong bộ nhớ của worker; chỉ kỳ đang
+    mở (chứa hôm nay) và các kỳ bị cắt ở hai đầu khoảng mới phải truy vấn lại.
+    Cache bị xóa khi số liệu của ngày đã qua thay đổi (phiên bản REVENUE_CACHE_VERSION).
+    """
+    filters = []
+    if service_id:
+        filters.append(RevenueDaily.service_id == service_id)
+    if employee_id:
+        filters.append(RevenueDaily.employee_id == employee_id)
+
+    open_bucket = bucket_start(granularity, salon_today())
+    cached = _cached_closed_buckets((granularity, split, service_id, employee_id))
+
+    # Chia khoảng thành các kỳ: kỳ lấy từ cache và các đoạn phải tính lại
+    range_end = next_bucket_start('day', date_to)
+    buckets = []
+    closed = []
+    missing = []
+    fresh_ranges = []
+    start = bucket_start(granularity, date_from)
+    while start <= date_to:
+        end = next_bucket_start(granularity, start)
+        buckets.append(start)
+        if start >= date_from and end <= range_end and start < open_bucket:
+            closed.append(start)
+            if start not in cached:
+                missing.append((start, end))
+        else:
+            fresh_ranges.append((max(start, date_from), min(end, range_end)))
+        start = end
+
+    if missing:
+        rows = _query_buckets(granularity, split, filters, missing[0][0], missing[-1][1])
+        for bucket, _ in missing:
+            cached[bucket] = rows.get(bucket, [])
+
+    results = {bucket: cached[bucket] for bucket in closed}
+    for start, end in fresh_ranges:
+        results.update(_query_buckets(granularity, split, filters, start, end))
+
+    series = []
+    for bucket in buckets:
+        for row in results.get(bucket, []):
+            series.append(dict(row, bucket=bucket.isoformat()))
+    return series
+
+
+def split_labels(split, keys):
+    """Tên hiển thị cho các khóa tách (dịch vụ, nhân viên)"""
+    if split == 'service':
+        return dict(db.session.query(Service.id, Service.name).filter(Service.id.in_(keys)))
+    if split == 'employee':
+        return dict(db.session.query(Employee.id, Employee.name).filter(Employee.id.in_(keys)))
+    return {key: key for key in keys}
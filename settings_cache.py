@@ -0,0 +1,72 @@
+import threading
+from types import SimpleNamespace
+from flask import g
+from models import db, Settings
+from db_utils import upsert_insert
+from cache_versions import bump_cache_version, read_cache_version
+
+# Tên phiên bản cache, tăng mỗi khi lưu cài đặt
+SETTINGS_CACHE_VERSION = 'settings'
+
+# Id cố định của dòng cài đặt duy nhất
+SETTINGS_ID = 1
+
+# Bản sao cài đặt của worker: (phiên bản, SettingsSnapshot)
+_cached_settings = (None, None)
+_lock = threading.Lock()
+
+
+class SettingsSnapshot(SimpleNamespace):
+    """Bản sao chỉ đọc của Settings, không gắn với session nên dùng được ở mọi request"""
+
+    @classmethod
+    def from_model(cls, settings):
+        return cls(**{column.key: getattr(settings, column.key) for column in Settings.__table__.columns})
+
+
+def ensure_settings():
+    """Tạo dòng cài đặt mặc định nếu chưa có (upsert, chạy nhiều lần hoặc song song vẫn chỉ có một dòng)"""
+    with db.engine.begin() as connection:
+        if connection.execute(db.select(Settings.id).limit(1)).first():
+            return
+        defaults = {column.key: column.default.arg for column in Settings.__table__.columns
+                    if column.default is not None and not callable(column.default.arg)}
+        statement = upsert_insert(connection, Settings).values(id=SETTINGS_ID, **defaults)
+        connection.execute(statement.on_conflict_do_nothing(index_elements=[Settings.id]))
+
+
+def load_settings():
+    """Dòng cài đặt (đối tượng ORM), tạo mặc định nếu chưa có; dùng khi cần sửa"""
+    settings = Settings.query.order_by(Settings.id).first()
+    if settings is None:
+        ensure_settings()
+        settings = Settings.query.order_by(Settings.id).first()
+    return settings
+
+
+def get_settings():
+    """Cài đặt đã cache trong worker.
+
+    Mỗi request chỉ đọc phiên bản trong cache_version (một truy vấn theo khóa chính);
+    bảng settings chỉ được đọc lại khi phiên bản đổi, tức là sau khi có worker lưu cài đặt.
+    """
+    if 'settings' in g:
+        return g.settings
+
+    global _cached_settings
+    version = read_cache_version(SETTINGS_CACHE_VERSION)
+    cached_version, snapshot = _cached_settings
+    if snapshot is None or cached_version != version:
+        with _lock:
+            cached_version, snapshot = _cached_settings
+            if snapshot is None or cached_version != version:
+                # Đọc phiên bản trước rồi mới đọc dữ liệu, nên bản sao không bao giờ cũ hơn phiên bản ghi kèm
+                snapshot = SettingsSnapshot.from_model(load_settings())
+                _cached_settings = (version, snapshot)
+    g.settings = snapshot
+    return snapshot
+
+
+def invalidate_settings(connection):
+    """Báo cho mọi worker đọc lại cài đặt, gọi trong transaction lưu cài đặt"""
+    bump_cache_version(connection, SETTINGS_CACHE_VERSION)
@@ -0,0 +1,77 @@
+// Ô chọn có gợi ý: <select data-typeahead-url="..."> chỉ render sẵn lựa chọn hiện tại,
+// các lựa chọn khác được tải từ API khi người dùng gõ vào ô tìm kiếm đi kèm
+// (<input data-typeahead-for="id của select">) hoặc khi mở ô chọn lần đầu.
+(function () {
+    'use strict';
+
+    function optionText(item) {
+        return item.phone ? item.text + ' - ' + item.phone : item.text;
+    }
+
+    function renderOptions(select, items) {
+        const selected = select.options[select.selectedIndex];
+        const keep = Array.from(select.options).filter(function (option) {
+            return option.value === '' || option === selected;
+        });
+        select.innerHTML = '';
+        keep.forEach(function (option) { select.appendChild(option); });
+        items.forEach(function (item) {
+            if (selected && String(item.id) === selected.value) {
+                return;
+            }
+            const option = document.createElement('option');
+            option.value = item.id;
+            option.textContent = optionText(item);
+            select.appendChild(option);
+        });
+    }
+
+    function load(select, term) {
+        const url = new URL(select.dataset.typeaheadUrl, window.location.origin);
+        url.searchParams.set('q', term);
+        const requestId = (select._typeaheadRequest || 0) + 1;
+        select._typeaheadRequest = requestId;
+        return fetch(url)
+            .then(function (response) { return response.json(); })
+            .then(function (data) {
+                // Bỏ qua kết quả của lần gõ cũ về muộn
+                if (data.success && select._typeaheadRequest === requestId) {
+                    renderOptions(select, data.items);
+                }
+            })
+            .catch(function (error) { console.error('Lỗi khi tải gợi ý:', error); });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('select[data-typeahead-url]').forEach(function (select) {
+            let loaded = false;
+            const loadInitial = function () {
+                if (!loaded) {
+                    loaded = true;
+                    load(select, '');
+                }
+            };
+            select.addEventListener('focus', loadInitial);
+            select.addEventListener('mousedown', loadInitial);
+
+            const input = document.querySelector('[data-typeahead-for="' + select.id + '"]');
+            if (!input) {
+                return;
+            }
+            let timer = null;
+            input.addEventListener('input', function () {
+                clearTimeout(timer);
+                timer = setTimeout(function () {
+                    loaded = true;
+                    load(select, input.value.trim()).then(function () {
+                        // Chọn sẵn kết quả đầu tiên nếu chưa có lựa chọn
+                        if (!select.value && select.options.length > 1) {
+                            select.selectedIndex = 1;
+                            select.dispatchEvent(new Event('change'));
+                        }
+                    });
+                }, 250);
+            });
+        });
+    });
+})();
@@ -0,0 +1,229 @@
+import hashlib
+import os
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+import cloudinary.api
+from flask.cli import AppGroup
+from cloudinary.utils import cloudinary_url
+from cloudinary_utils import upload_to_cloudinary, get_cloudinary_public_id
+from metrics import timed_cloudinary_call
+
+# Object đã lưu: khóa trong backend và URL hiển thị
+StoredObject = namedtuple('StoredObject', 'key url')
+
+# Object có trong backend khi liệt kê: khóa, thời điểm ghi (UTC) và kích thước (byte)
+ListedObject = namedtuple('ListedObject', 'key modified size')
+
+STORAGE_BACKENDS = ('local', 'cloudinary', 's3')
+
+media_cli = AppGroup('media', help='Quản lý file ảnh đã lưu.')
+
+# Số object tối đa mỗi lần xóa hàng loạt (giới hạn của Cloudinary và S3 DeleteObjects)
+DELETE_BATCH_SIZE = 100
+# Số object mỗi trang khi liệt kê (tối đa của Cloudinary Admin API)
+LIST_PAGE_SIZE = 500
+
+
+def content_hash(data):
+    """Mã băm nội dung file (sha256), dùng làm khóa lưu trữ: cùng một ảnh luôn có cùng khóa"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class LocalStorage:
+    """Lưu file trong thư mục upload của ứng dụng (phục vụ qua serve_uploaded_file)"""
+    name = 'local'
+
+    def __init__(self, folder, url_prefix='static/uploads/'):
+        self.folder = folder
+        self.url_prefix = url_prefix
+        os.makedirs(folder, exist_ok=True)
+
+    def url(self, key):
+        return self.url_prefix + key
+
+    def put(self, name, data, content_type):
+        path = os.path.join(self.folder, name)
+        # Khóa theo nội dung: file đã có thì chắc chắn giống hệt, không cần ghi lại. Thời gian sửa vẫn được
+        # cập nhật để `flask media gc` không xóa file đang được dùng lại khi transaction chưa commit
+        if os.path.exists(path):
+            os.utime(path)
+        else:
+            # Mỗi tiến trình (gunicorn worker) có thể có thread trùng ident: tên file tạm gồm cả pid
+            temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(temp_path, 'wb') as file:
+                file.write(data)
+            os.replace(temp_path, path)
+        return StoredObject(name, self.url(name))
+
+    def key_for_url(self, url):
+        """Khóa của file từ URL đã lưu, hoặc None nếu URL không thuộc backend này.
+
+        Nhận cả URL cũ: /uploads/<tên> (route uploaded_file, logo lưu trước đây) và /static/uploads/<tên>.
+        """
+        if not url:
+            return None
+        path = urlparse(url).path
+        for prefix in (self.url_prefix, '/' + self.url_prefix.lstrip('/'), '/uploads/'):
+            if path.startswith(prefix):
+                return os.path.basename(path)
+        return None
+
+    def list_objects(self):
+        """Liệt kê các file trong thư mục upload (không gồm thư mục con như cache ảnh thu nhỏ và file tạm)"""
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if not entry.is_file() or entry.name.endswith('.tmp') or entry.name.startswith('.'):
+                    continue
+                stat = entry.stat()
+                yield ListedObject(entry.name, datetime.utcfromtimestamp(stat.st_mtime), stat.st_size)
+
+    def variant_url(self, key, width, height):
+        # Không có biến đổi ảnh khi phục vụ, biến thể phải được lưu thành file riêng
+        return None
+
+    def delete(self, keys):
+        for key in keys:
+            path = os.path.join(self.folder, os.path.basename(key))
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class CloudinaryStorage:
+    """Lưu ảnh trên Cloudinary; biến thể là URL biến đổi kích thước nên không cần lưu thêm file"""
+    name = 'cloudinary'
+
+    def __init__(self, folder=None, timeout=None):
+        self.folder = folder
+        self.timeout = timeout
+
+    def url(self, key):
+        return cloudinary_url(key, secure=True)[0]
+
+    def put(self, name, data, content_type):
+        public_id = os.path.splitext(name)[0]
+        result = upload_to_cloudinary(data, folder=self.folder, timeout=self.timeout, public_id=public_id)
+        return StoredObject(result['public_id'], result['url'])
+
+    def variant_url(self, key, width, height):
+        return cloudinary_url(key, width=width, height=height, crop='limit', format='jpg', secure=True)[0]
+
+    def key_for_url(self, url):
+        return get_cloudinary_public_id(url)
+
+    def list_objects(self):
+        """Liệt kê ảnh trong CLOUDINARY_FOLDER theo từng trang (Admin API)"""
+        # Không có thư mục riêng thì không phân biệt được ảnh của ứng dụng với các ảnh khác trong tài khoản
+        if not self.folder:
+            raise ValueError('Cần cấu hình CLOUDINARY_FOLDER để liệt kê ảnh trên Cloudinary.')
+        options = {'type': 'upload', 'prefix': f'{self.folder}/', 'max_results': LIST_PAGE_SIZE}
+        while True:
+            result = cloudinary.api.resources(**options)
+            for resource in result['resources']:
+                modified = datetime.fromisoformat(resource['created_at'].replace('Z', '+00:00'))
+                yield ListedObject(resource['public_id'], modified.astimezone(timezone.utc).replace(tzinfo=None),
+                                   resource.get('bytes', 0))
+            if not result.get('next_cursor'):
+                return
+            options['next_cursor'] = result['next_cursor']
+
+    def delete(self, keys):
+        keys = list(keys)
+        for start in range(0, len(keys), DELETE_BATCH_SIZE):
+            with timed_cloudinary_call('delete'):
+                cloudinary.api.delete_resources(keys[start:start + DELETE_BATCH_SIZE])
+
+
+class S3Storage:
+    """Lưu file trên S3 hoặc dịch vụ tương thích S3 (MinIO, R2...) bằng boto3"""
+    name = 's3'
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, region=None, public_url=None, timeout=None):
+        import boto3
+        from botocore.config import Config as BotoConfig
+
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix else ''
+        self.client = boto3.client(
+            's3', endpoint_url=endpoint_url, region_name=region,
+            config=BotoConfig(connect_timeout=timeout, read_timeout=timeout, retries={'max_attempts': 1})
+            if timeout else None,
+        )
+        if public_url:
+            self.public_url = public_url.rstrip('/')
+        elif endpoint_url:
+            self.public_url = f"{endpoint_url.rstrip('/')}/{bucket}"
+        else:
+            self.public_url = f"https://{bucket}.s3.{region or 'us-east-1'}.amazonaws.com"
+
+    def url(self, key):
+        return f'{self.public_url}/{key}'
+
+    def put(self, name, data, content_type):
+        key = self.prefix + name
+        # Ảnh theo nội dung không bao giờ đổi nên cho phép trình duyệt/CDN cache lâu dài
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, ContentType=content_type,
+                               CacheControl='public, max-age=31536000, immutable')
+        return StoredObject(key, self.url(key))
+
+    def variant_url(self, key, width, height):
+        return None
+
+    def key_for_url(self, url):
+        if url and url.startswith(self.public_url + '/'):
+            return url[len(self.public_url) + 1:]
+        return None
+
+    def list_objects(self):
+        """Liệt kê các object dưới S3_PREFIX theo từng trang"""
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get('Contents', []):
+                modified = item['LastModified'].astimezone(timezone.utc).replace(tzinfo=None)
+                yield ListedObject(item['Key'], modified, item['Size'])
+
+    def delete(self, keys):
+        keys = list(keys)
+        for start in range(0, len(keys), DELETE_BATCH_SIZE):
+            self.client.delete_objects(Bucket=self.bucket, Delete={
+                'Objects': [{'Key': key} for key in keys[start:start + DELETE_BATCH_SIZE]], 'Quiet': True})
+
+
+def store_file(storage, file):
+    """Lưu nguyên một file tải lên (logo, favicon) với khóa theo nội dung; trả về StoredObject"""
+    data = file.read()
+    extension = os.path.splitext(file.filename)[1].lower()
+    return storage.put(content_hash(data) + extension, data, file.mimetype or 'application/octet-stream')
+
+
+def create_storage(name, config):
+    """Tạo backend lưu trữ `name` từ cấu hình ứng dụng"""
+    if name == 'local':
+        return LocalStorage(config['UPLOAD_FOLDER'])
+    if name == 'cloudinary':
+        return CloudinaryStorage(config.get('CLOUDINARY_FOLDER'), timeout=config['UPLOAD_TIMEOUT'])
+    if name == 's3':
+        return S3Storage(config['S3_BUCKET'], prefix=config.get('S3_PREFIX') or '',
+                         endpoint_url=config.get('S3_ENDPOINT_URL'), region=config.get('S3_REGION'),
+                         public_url=config.get('S3_PUBLIC_URL'), timeout=config['UPLOAD_TIMEOUT'])
+    raise ValueError(f'Backend lưu trữ không hợp lệ: {name}')
+
+
+def init_storage(app):
+    """Khởi tạo các backend lưu trữ của ứng dụng (tạo khi dùng lần đầu)"""
+    if app.config['STORAGE_BACKEND'] not in STORAGE_BACKENDS:
+        raise ValueError(f"Backend lưu trữ không hợp lệ: {app.config['STORAGE_BACKEND']}")
+    app.extensions['storage'] = {}
+
+
+def get_storage(app, name=None):
+    """Backend lưu trữ `name`, mặc định là backend đang dùng (STORAGE_BACKEND).
+
+    Ảnh cũ có thể nằm ở backend khác backend hiện tại, nên khi xóa phải dùng đúng backend của ảnh.
+    """
+    name = name or app.config['STORAGE_BACKEND']
+    backends = app.extensions['storage']
+    if name not in backends:
+        backends[name] = create_storage(name, app.config)
+    return backends[name]
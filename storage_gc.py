@@ -0,0 +1,96 @@
+import os
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from models import db, ServiceHistoryImage, Settings
+from storage import media_cli, get_storage, STORAGE_BACKENDS, DELETE_BATCH_SIZE
+from image_uploads import stored_object_keys
+
+# Số dòng ảnh đọc mỗi lần khi lấy tập khóa đang dùng
+REFERENCE_BATCH_SIZE = 5000
+
+
+def referenced_keys(storage):
+    """Tập khóa object đang được dùng trên backend `storage`: ảnh lịch sử dịch vụ (kể cả biến thể), logo và favicon"""
+    keys = set()
+    rows = db.session.query(ServiceHistoryImage.storage_key, ServiceHistoryImage.variants).filter(
+        ServiceHistoryImage.storage_backend == storage.name,
+        ServiceHistoryImage.storage_key.isnot(None),
+    ).yield_per(REFERENCE_BATCH_SIZE)
+    for row in rows:
+        keys.update(stored_object_keys(row.storage_key, row.variants))
+    for urls in db.session.query(Settings.company_logo_url, Settings.favicon_url):
+        for url in urls:
+            key = storage.key_for_url(url)
+            if key:
+                keys.add(key)
+    return keys
+
+
+def _still_referenced(storage, keys):
+    """Các khóa trong `keys` vừa được dùng lại sau khi lấy tập khóa đang dùng (ảnh trùng nội dung mới lưu)"""
+    # Khóa theo nội dung có dạng <mã băm>.jpg hoặc <mã băm>_<biến thể>.jpg
+    digests = {os.path.splitext(os.path.basename(key))[0].split('_')[0] for key in keys}
+    rows = db.session.query(ServiceHistoryImage.storage_key, ServiceHistoryImage.variants).filter(
+        ServiceHistoryImage.storage_backend == storage.name,
+        db.or_(ServiceHistoryImage.storage_key.in_(keys), ServiceHistoryImage.content_hash.in_(digests)),
+    )
+    used = set()
+    for row in rows:
+        used.update(stored_object_keys(row.storage_key, row.variants))
+    return used
+
+
+def _delete_batch(storage, batch, dry_run, stats):
+    used = _still_referenced(storage, [obj.key for obj in batch])
+    orphans = [obj for obj in batch if obj.key not in used]
+    if dry_run:
+        for obj in orphans:
+            click.echo(f'{obj.key}\t{obj.size}\t{obj.modified:%Y-%m-%d %H:%M}')
+    elif orphans:
+        storage.delete([obj.key for obj in orphans])
+    stats['orphans'] += len(orphans)
+    stats['bytes'] += sum(obj.size for obj in orphans)
+
+
+def collect_garbage(storage, min_age, dry_run=False, batch_size=DELETE_BATCH_SIZE):
+    """Xóa các object trên backend không còn được dùng (mồ côi); trả về số liệu thống kê.
+
+    Danh sách object được duyệt dần theo trang và so với tập khóa đang dùng lấy từ DB, nên bộ nhớ chỉ phụ
+    thuộc số ảnh còn dùng. Object mới hơn `min_age` được bỏ qua, vì có thể thuộc về một lần tải lên
+    chưa commit.
+    """
+    referenced = referenced_keys(storage)
+    cutoff = datetime.utcnow() - min_age
+    stats = {'scanned': 0, 'referenced': 0, 'recent': 0, 'orphans': 0, 'bytes': 0}
+    batch = []
+    for obj in storage.list_objects():
+        stats['scanned'] += 1
+        if obj.key in referenced:
+            stats['referenced'] += 1
+        elif obj.modified > cutoff:
+            stats['recent'] += 1
+        else:
+            batch.append(obj)
+            if len(batch) == batch_size:
+                _delete_batch(storage, batch, dry_run, stats)
+                batch = []
+    if batch:
+        _delete_batch(storage, batch, dry_run, stats)
+    # Giải phóng transaction đọc (và khóa của các bảng trên SQLite)
+    db.session.rollback()
+    return stats
+
+
+@media_cli.command('gc')
+@click.option('--backend', type=click.Choice(STORAGE_BACKENDS), help='Backend cần dọn (mặc định: STORAGE_BACKEND).')
+@click.option('--min-age', default=24.0, show_default=True, help='Chỉ xóa object cũ hơn số giờ này.')
+@click.option('--dry-run', is_flag=True, help='Chỉ liệt kê các object mồ côi (khóa, kích thước, thời điểm), không xóa.')
+def gc_command(backend, min_age, dry_run):
+    """Xóa các file ảnh không còn được dùng trong backend lưu trữ."""
+    storage = get_storage(current_app, backend)
+    stats = collect_garbage(storage, timedelta(hours=min_age), dry_run)
+    click.echo(f"{'[Chạy thử] ' if dry_run else ''}{storage.name}: đã duyệt {stats['scanned']} object, "
+               f"{stats['referenced']} đang dùng, {stats['recent']} mới hơn {min_age:g} giờ, "
+               f"{stats['orphans']} object mồ côi {'có thể xóa' if dry_run else 'đã xóa'} "
+               f"({stats['bytes'] / 1024 / 1024:.1f} MB).", err=dry_run)
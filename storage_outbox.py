@@ -0,0 +1,102 @@
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from models import db, ServiceHistoryImage, StorageDeletion
+from storage import media_cli, get_storage
+
+# Số yêu cầu xóa tối đa mỗi lô (giới hạn của delete_resources trên Cloudinary)
+OUTBOX_BATCH_SIZE = 100
+
+
+def unreferenced_objects(locations):
+    """Các vị trí trong `locations` ({(backend, khóa): các khóa}) không còn dòng ServiceHistoryImage nào dùng.
+
+    Nhiều dòng có thể dùng chung một object (ảnh trùng nội dung), nên object chỉ được xóa khi
+    dòng cuối cùng không còn dùng nó. Gọi sau khi đã flush các thay đổi của session.
+    """
+    if not locations:
+        return {}
+    still_used = {tuple(row) for row in db.session.query(
+        ServiceHistoryImage.storage_backend, ServiceHistoryImage.storage_key
+    ).filter(ServiceHistoryImage.storage_key.in_({key for _, key in locations})).distinct()}
+    return {location: keys for location, keys in locations.items() if location not in still_used}
+
+
+def enqueue_deletions(locations):
+    """Ghi yêu cầu xóa các object vào outbox, trong transaction hiện tại của session"""
+    if not locations:
+        return
+    db.session.execute(db.insert(StorageDeletion), [
+        {'backend': backend, 'storage_key': key, 'object_keys': keys,
+         'attempts': 0, 'next_attempt_at': datetime.utcnow(), 'created_at': datetime.utcnow()}
+        for (backend, key), keys in locations.items()
+    ])
+
+
+def retry_delay(attempts):
+    """Thời gian chờ trước lần thử tiếp theo, tăng gấp đôi sau mỗi lần lỗi"""
+    base = current_app.config['OUTBOX_RETRY_DELAY']
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), current_app.config['OUTBOX_MAX_RETRY_DELAY']))
+
+
+def _claim_batch(batch_size):
+    """Lấy một lô yêu cầu đến hạn; trên PostgreSQL các worker chạy song song không lấy trùng dòng"""
+    now = datetime.utcnow()
+    grace_period = timedelta(seconds=current_app.config['OUTBOX_GRACE_PERIOD'])
+    return (StorageDeletion.query
+            .filter(StorageDeletion.next_attempt_at <= now, StorageDeletion.created_at <= now - grace_period)
+            .order_by(StorageDeletion.next_attempt_at, StorageDeletion.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .all())
+
+
+def process_deletions(batch_size=OUTBOX_BATCH_SIZE):
+    """Xóa các object trong outbox theo lô cho tới khi hết yêu cầu đến hạn; trả về (số đã xóa, số lỗi)"""
+    deleted = failed = 0
+    while True:
+        batch = _claim_batch(batch_size)
+        if not batch:
+            db.session.commit()
+            return deleted, failed
+
+        # Object được dùng lại sau khi xếp hàng (tải lên lại cùng ảnh) thì bỏ qua, không xóa
+        pending = unreferenced_objects({(row.backend, row.storage_key): row.object_keys for row in batch})
+        by_backend = defaultdict(list)
+        for row in batch:
+            if (row.backend, row.storage_key) in pending:
+                by_backend[row.backend].append(row)
+            else:
+                db.session.delete(row)
+
+        for backend, rows in by_backend.items():
+            try:
+                get_storage(current_app, backend).delete([key for row in rows for key in row.object_keys])
+            except Exception as e:
+                current_app.logger.error(f"Error deleting stored images from {backend}: {str(e)}")
+                for row in rows:
+                    row.attempts += 1
+                    row.last_error = str(e)
+                    row.next_attempt_at = datetime.utcnow() + retry_delay(row.attempts)
+                failed += len(rows)
+            else:
+                for row in rows:
+                    db.session.delete(row)
+                deleted += len(rows)
+        db.session.commit()
+
+
+@media_cli.command('process-deletions')
+@click.option('--loop', is_flag=True, help='Chạy liên tục như một worker.')
+@click.option('--interval', default=5.0, show_default=True, help='Số giây nghỉ giữa hai lần kiểm tra khi chạy liên tục.')
+def process_deletions_command(loop, interval):
+    """Xóa các file ảnh đã được xếp hàng trong outbox."""
+    while True:
+        deleted, failed = process_deletions()
+        if deleted or failed or not loop:
+            click.echo(f'Đã xóa {deleted} ảnh, {failed} ảnh lỗi (sẽ thử lại).')
+        if not loop:
+            return
+        time.sleep(interval)
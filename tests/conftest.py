@@ -0,0 +1,49 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# Cấu hình phải được đặt trước khi import app (Config đọc biến môi trường lúc import)
+_workdir = tempfile.mkdtemp(prefix='salon-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+os.environ['STORAGE_BACKEND'] = 'local'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from app import app as flask_app
+from models import db
+
+
+@pytest.fixture
+def app(tmp_path):
+    flask_app.config.update(TESTING=True, UPLOAD_FOLDER=str(tmp_path / 'uploads'))
+    os.makedirs(flask_app.config['UPLOAD_FOLDER'])
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def count_queries(app):
+    """Số câu SQL chạy trong một request: count_queries(client.get, url)"""
+    def count(send, *args, **kwargs):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            response = send(*args, **kwargs)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        assert response.status_code == 200, response.status_code
+        return len(statements)
+    return count
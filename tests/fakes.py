@@ -0,0 +1,102 @@
+import io
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image
+from storage import StoredObject
+
+UPLOAD_DELAY = 0.3
+
+
+class FakeStorage:
+    """Backend giả: mỗi lần lưu mất UPLOAD_DELAY giây, có thể lỗi (như HTTP 5xx) với một số ảnh"""
+
+    name = 'local'
+
+    def __init__(self, fail_once=(), fail_always=()):
+        self.fail_once = set(fail_once)
+        self.fail_always = set(fail_always)
+        self.calls = []
+        self.stored = []
+        self.lock = threading.Lock()
+
+    def put(self, name, data, content_type):
+        time.sleep(UPLOAD_DELAY)
+        # Ảnh được nhận diện qua màu của điểm ảnh đầu tiên
+        color = Image.open(io.BytesIO(data)).convert('RGB').getpixel((0, 0))[0]
+        with self.lock:
+            self.calls.append(color)
+            if color in self.fail_always or color in self.fail_once:
+                self.fail_once.discard(color)
+                raise RuntimeError('503 Service Unavailable')
+            self.stored.append(name)
+        return StoredObject(name, f'/fake/{name}')
+
+    def variant_url(self, key, width, height):
+        return f'/fake/{key}?w={width}'
+
+
+def jpeg(red):
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), (red, 0, 0)).save(buffer, 'JPEG', quality=100)
+    return buffer.getvalue()
+
+
+class CloudinaryStub:
+    """Máy chủ HTTP giả lập API upload của Cloudinary trên 127.0.0.1, chạy trong thread riêng.
+
+    `script` quy định lần lượt phản hồi cho từng public_id: 'ok', 'error' (HTTP 503) hoặc số giây
+    chờ trước khi trả lời (để vượt timeout của client); mặc định là 'ok'.
+    """
+
+    def __init__(self):
+        self.script = {}
+        self.requests = []
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                public_id = re.search(rb'name="public_id"\r\n\r\n([^\r]*)', body).group(1).decode()
+                with stub.lock:
+                    stub.requests.append(public_id)
+                    steps = stub.script.get(public_id) or ['ok']
+                    step = steps.pop(0) if len(steps) > 1 else steps[0]
+                if step == 'error':
+                    self._reply(503, {'error': {'message': '503 Service Unavailable'}})
+                    return
+                if step != 'ok':
+                    time.sleep(step)
+                self._reply(200, {'public_id': public_id,
+                                  'secure_url': f'https://res.cloudinary.com/test/image/upload/{public_id}.jpg'})
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Client đã bỏ cuộc vì hết timeout
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,57 @@
+import random
+from datetime import date
+from click.testing import CliRunner
+from sqlalchemy import func
+from benchmarks.generate_data import PAYMENT_METHODS, SERVICES, customer_rows, generate
+from bulk_import import CUSTOMER_COLUMNS
+from models import db, Customer, Employee, Service, ServiceHistory, RevenueDaily, DashboardCounter, birth_month_day
+from text_utils import fold_text, digits_only
+
+
+def test_customer_rows_follow_import_column_layout():
+    rows = list(customer_rows(random.Random(1), 50, date(2025, 1, 1)))
+
+    for row in rows:
+        customer = dict(zip(CUSTOMER_COLUMNS, row))
+        assert len(row) == len(CUSTOMER_COLUMNS)
+        assert customer['search_name'] == fold_text(customer['name'])
+        assert customer['phone_digits'] == digits_only(customer['phone'])
+        assert customer['birth_month_day'] == birth_month_day(customer['birth_date'])
+    assert len({row[1] for row in rows}) == len(rows)
+
+
+def generate_data(seed=7):
+    result = CliRunner().invoke(generate, ['--customers', '40', '--employees', '3', '--histories', '300',
+                                           '--days', '30', '--seed', str(seed)])
+    assert result.exit_code == 0, result.output
+
+
+def test_generated_data_loads_consistently(app):
+    generate_data()
+
+    assert (Service.query.count(), Employee.query.count(), Customer.query.count(), ServiceHistory.query.count()) == \
+        (len(SERVICES), 3, 40, 300)
+    customer = Customer.query.filter(Customer.birth_date.isnot(None)).first()
+    assert customer.search_name == fold_text(customer.name)
+    assert customer.birth_month_day == birth_month_day(customer.birth_date)
+    methods = {method for method, _ in PAYMENT_METHODS}
+    assert {method for method, in db.session.query(ServiceHistory.payment_method).distinct()} <= methods
+    # Bảng tổng hợp và bộ đếm được tính lại sau khi nạp thẳng
+    assert db.session.query(func.sum(RevenueDaily.revenue_total)).scalar() == \
+        db.session.query(func.sum(ServiceHistory.price)).scalar()
+    assert db.session.get(DashboardCounter, 'service_histories').value == 300
+
+
+def test_generated_data_is_deterministic(app):
+    generate_data()
+    first = db.session.query(Customer.name, Customer.phone, ServiceHistory.service_date, ServiceHistory.price) \
+        .join(ServiceHistory).order_by(ServiceHistory.id).all()
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+
+    generate_data()
+    second = db.session.query(Customer.name, Customer.phone, ServiceHistory.service_date, ServiceHistory.price) \
+        .join(ServiceHistory).order_by(ServiceHistory.id).all()
+
+    assert first == second
@@ -0,0 +1,102 @@
+import io
+from datetime import date, datetime
+from types import SimpleNamespace
+from models import db, Customer, Service, Employee, ServiceHistory, RevenueDaily, DashboardCounter
+from bulk_import import run_import, CUSTOMER_COLUMNS
+from db_utils import copy_rows
+from revenue_rollup import rebuild_revenue_daily
+from dashboard_counters import reconcile_counters
+
+
+def csv_file(text):
+    return io.BytesIO(text.encode('utf-8-sig'))
+
+
+def snapshot():
+    revenue = sorted(db.session.query(RevenueDaily.day, RevenueDaily.service_id, RevenueDaily.employee_id,
+                                      RevenueDaily.payment_method, RevenueDaily.visit_count,
+                                      RevenueDaily.revenue_total).filter(RevenueDaily.visit_count != 0))
+    counters = dict(db.session.query(DashboardCounter.name, DashboardCounter.value))
+    return revenue, counters
+
+
+def test_import_customers_skips_duplicates_and_reports_errors(app, tmp_path):
+    db.session.add(Customer(name='Khách cũ', phone='0901 111 111'))
+    db.session.commit()
+    stream = csv_file('Họ tên,Số điện thoại,Ngày sinh,Địa chỉ\n'
+                      'Nguyễn Thị Đào,090-2222-222,15/08/1990,Quận 1\n'
+                      'Trùng trong file,0902222222,,\n'
+                      'Trùng trong DB,0901111111,,\n'
+                      'Thiếu số,,,\n'
+                      'Sai ngày sinh,0903333333,31-02-1990,\n'
+                      'Lê Văn Bình,0904444444,03-04,\n')
+
+    # Lô 2 dòng để kiểm tra cả dòng trùng với lô trước đã ghi vào DB
+    report = run_import('customers', stream, 'khach.csv', str(tmp_path / 'errors.csv'), chunk_size=2)
+
+    assert (report.inserted, report.duplicates, report.errors) == (2, 2, 2)
+    customer = Customer.query.filter_by(phone_digits='0902222222').one()
+    assert (customer.search_name, customer.birth_date, customer.birth_month_day) == \
+        ('nguyen thi dao', date(1990, 8, 15), 815)
+    assert Customer.query.filter_by(name='Lê Văn Bình').one().birth_date == date(1900, 4, 3)
+    errors = (tmp_path / 'errors.csv').read_text(encoding='utf-8-sig')
+    assert 'Ngày sinh không hợp lệ' in errors and 'trùng số điện thoại' in errors
+
+
+def test_import_histories_keeps_rollups_in_sync(app, tmp_path):
+    db.session.add_all([Customer(name='Trần Thị Thu', phone='0905555555'), Service(name='Cắt tóc nữ')])
+    db.session.commit()
+    with db.engine.begin() as connection:
+        reconcile_counters(connection)
+    stream = csv_file('SĐT,Dịch vụ,Nhân viên,Ngày,Số tiền,Thanh toán\n'
+                      '0905555555,cắt tóc NỮ,Phan Văn Long,2025-06-01 09:30,150.000,\n'
+                      '0905555555,Nhuộm tóc,Phan Văn Long,02/06/2025,"450,000",Chuyển khoản\n'
+                      '0909999999,Cắt tóc nữ,Phan Văn Long,2025-06-03,100000,\n'
+                      '0905555555,Cắt tóc nữ,Phan Văn Long,không rõ,100000,\n')
+
+    report = run_import('histories', stream, 'lich_su.csv', str(tmp_path / 'errors.csv'), create_missing=True)
+
+    assert (report.inserted, report.errors) == (2, 2)
+    assert sorted((history.service.name, history.employee.name, history.price, history.payment_method)
+                  for history in ServiceHistory.query) == [
+        ('Cắt tóc nữ', 'Phan Văn Long', 150000, 'Tiền mặt'),
+        ('Nhuộm tóc', 'Phan Văn Long', 450000, 'Chuyển khoản'),
+    ]
+    assert Employee.query.count() == 1
+    maintained = snapshot()
+    with db.engine.begin() as connection:
+        rebuild_revenue_daily(connection)
+        reconcile_counters(connection)
+    assert snapshot() == maintained
+
+
+class FakeCopyCursor:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def copy_expert(self, sql, stream):
+        self.calls.append((sql, stream.read()))
+
+
+def test_copy_rows_uses_copy_expert_on_psycopg2():
+    calls = []
+    driver_connection = SimpleNamespace(cursor=lambda: FakeCopyCursor(calls))
+    connection = SimpleNamespace(dialect=SimpleNamespace(name='postgresql', driver='psycopg2'),
+                                 connection=SimpleNamespace(driver_connection=driver_connection))
+    created = datetime(2025, 6, 1, 9, 30)
+    rows = [('Ngô\tAn', '0901', date(1990, 1, 2), None, 'dòng 1\ndòng 2 \\ hết', 'ngo an', '0901', 102,
+             created, created)]
+
+    copy_rows(connection, Customer.__table__, CUSTOMER_COLUMNS, rows)
+
+    assert calls == [(
+        f'COPY customer ({", ".join(CUSTOMER_COLUMNS)}) FROM STDIN',
+        'Ngô\\tAn\t0901\t1990-01-02\t\\N\tdòng 1\\ndòng 2 \\\\ hết\tngo an\t0901\t102\t'
+        '2025-06-01 09:30:00\t2025-06-01 09:30:00\n',
+    )]
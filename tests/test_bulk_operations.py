@@ -0,0 +1,59 @@
+from datetime import datetime
+import pytest
+from models import db, Customer, Service, Employee, ServiceHistory, RevenueDaily, DashboardCounter
+from bulk_operations import delete_customer
+from revenue_rollup import rebuild_revenue_daily
+from dashboard_counters import reconcile_counters
+
+
+@pytest.fixture
+def customers(app):
+    service = Service(name='Cắt tóc nam')
+    employee = Employee(name='Đỗ Văn Tài')
+    rows = [Customer(name='Hồ Minh Khang', phone='0933000001'), Customer(name='Ngô Thị Yến', phone='0933000002')]
+    for customer in rows:
+        for day in (1, 2):
+            db.session.add(ServiceHistory(customer=customer, service=service, employee=employee,
+                                          service_date=datetime(2025, 4, day, 10), price=120000,
+                                          payment_method='Tiền mặt'))
+    db.session.add_all(rows)
+    db.session.commit()
+    return rows
+
+
+def snapshot():
+    revenue = sorted(db.session.query(RevenueDaily.day, RevenueDaily.service_id, RevenueDaily.employee_id,
+                                      RevenueDaily.payment_method, RevenueDaily.visit_count,
+                                      RevenueDaily.revenue_total).filter(RevenueDaily.visit_count != 0))
+    counters = dict(db.session.query(DashboardCounter.name, DashboardCounter.value))
+    return revenue, counters
+
+
+def test_delete_customer_keeps_rollups_in_sync(client, customers):
+    response = client.post(f'/customers/{customers[0].id}/delete')
+
+    assert response.status_code == 302
+    assert ServiceHistory.query.count() == 2
+    maintained = snapshot()
+    # Tính lại từ đầu phải cho cùng kết quả với các cập nhật trực tiếp khi xóa
+    with db.engine.begin() as connection:
+        rebuild_revenue_daily(connection)
+        reconcile_counters(connection)
+    assert snapshot() == maintained
+
+
+def test_delete_missing_customer_changes_nothing(app, customers):
+    # Lịch sử của một khách hàng vừa bị xóa (SQLite không kiểm tra khóa ngoại): không được đụng tới
+    missing_id = customers[-1].id + 1
+    history = ServiceHistory.query.first()
+    db.session.add(ServiceHistory(customer_id=missing_id, service_id=history.service_id,
+                                  employee_id=history.employee_id, service_date=datetime(2025, 4, 3, 10),
+                                  price=50000, payment_method='Tiền mặt'))
+    db.session.commit()
+    before = snapshot()
+
+    assert delete_customer(missing_id) is None
+    db.session.commit()
+
+    assert ServiceHistory.query.count() == 5
+    assert snapshot() == before
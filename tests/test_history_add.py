@@ -0,0 +1,88 @@
+import io
+import os
+import pytest
+from models import db, Customer, Service, Employee, ServiceHistory, ServiceHistoryImage, StorageDeletion
+from storage_gc import referenced_keys
+from storage import get_storage
+from settings_cache import load_settings
+from fakes import FakeStorage, jpeg
+
+
+@pytest.fixture
+def form(app):
+    customer = Customer(name='Võ Thị Hạnh', phone='0987654321')
+    service = Service(name='Gội đầu dưỡng sinh')
+    employee = Employee(name='Bùi Quốc Huy')
+    db.session.add_all([customer, service, employee])
+    db.session.commit()
+    app.config.update(UPLOAD_RETRY_BACKOFF=0.01)
+    return {'customer_id': customer.id, 'service_id': service.id, 'employee_id': employee.id,
+            'service_date': '2025-05-01', 'payment_method': 'Tiền mặt', 'amount_raw': '90000'}
+
+
+def post(client, form, images):
+    data = dict(form, images=[(io.BytesIO(content), filename) for filename, content in images])
+    return client.post('/service-histories/add', data=data, content_type='multipart/form-data')
+
+
+def test_history_and_images_are_saved_together(monkeypatch, client, form):
+    storage = FakeStorage()
+    monkeypatch.setattr('app.get_storage', lambda app, name=None: storage)
+
+    response = post(client, form, [('a.jpg', jpeg(10)), ('b.jpg', jpeg(90))])
+
+    assert response.status_code == 302
+    history = ServiceHistory.query.one()
+    assert len(history.images) == 2
+
+
+def test_invalid_form_does_not_upload(monkeypatch, client, form):
+    storage = FakeStorage()
+    monkeypatch.setattr('app.get_storage', lambda app, name=None: storage)
+
+    response = post(client, dict(form, amount_raw='abc'), [('a.jpg', jpeg(10))])
+
+    assert response.status_code == 200
+    assert storage.calls == []
+    assert ServiceHistory.query.count() == 0
+
+
+def test_failed_upload_releases_stored_images(monkeypatch, client, form):
+    storage = FakeStorage(fail_always={90})
+    monkeypatch.setattr('app.get_storage', lambda app, name=None: storage)
+
+    response = post(client, form, [('ok.jpg', jpeg(10)), ('failing.jpg', jpeg(90))])
+
+    assert response.status_code == 200
+    assert ServiceHistory.query.count() == 0
+    assert ServiceHistoryImage.query.count() == 0
+    # Ảnh đã tải lên thành công được xếp hàng xóa vì không có dòng nào dùng
+    assert len(storage.stored) == 1
+    assert [deletion.storage_key for deletion in StorageDeletion.query] == storage.stored
+
+
+def test_gc_keeps_favicon(app):
+    storage = get_storage(app, 'local')
+    settings = load_settings()
+    settings.favicon_url = storage.put('f' * 64 + '.png', b'icon', 'image/png').url
+    db.session.commit()
+
+    assert 'f' * 64 + '.png' in referenced_keys(storage)
+
+
+def test_local_put_temp_file_is_unique_per_process(monkeypatch, app):
+    storage = get_storage(app, 'local')
+    storage.folder = app.config['UPLOAD_FOLDER']
+    replaced = []
+    real_replace = os.replace
+    monkeypatch.setattr('storage.os.replace', lambda src, dst: replaced.append(src) or real_replace(src, dst))
+
+    # Hai worker gunicorn khác pid nhưng cùng thread ident không được ghi chung một file tạm
+    for pid in (101, 202):
+        monkeypatch.setattr('storage.os.getpid', lambda pid=pid: pid)
+        storage.put(f'{pid:064d}.jpg', b'data', 'image/jpeg')
+
+    # <tên>.<pid>.<thread ident>.tmp
+    suffixes = [path.rsplit('.', 3)[1:] for path in replaced]
+    assert [pid for pid, _, _ in suffixes] == ['101', '202']
+    assert len({ident for _, ident, _ in suffixes}) == 1
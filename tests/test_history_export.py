@@ -0,0 +1,65 @@
+import csv
+import gzip
+import io
+from datetime import datetime
+import pytest
+from models import db, Customer, Service, Employee, ServiceHistory
+from history_export import iter_history_csv
+from timezone_utils import to_local_datetime
+
+
+@pytest.fixture
+def histories(app):
+    customer = Customer(name='Đặng Thị Hoa', phone='0977000111')
+    service = Service(name='Uốn tóc')
+    employee = Employee(name='Lý Văn Phúc')
+    rows = [ServiceHistory(customer=customer, service=service, employee=employee,
+                           service_date=datetime(2025, 7, day, 12), price=300000 + day,
+                           payment_method='Tiền mặt', notes='ghi chú, có dấu phẩy' if day == 2 else None)
+            for day in range(1, 6)]
+    db.session.add_all(rows)
+    db.session.commit()
+    return rows
+
+
+def read_csv(content):
+    text = content.decode('utf-8')
+    assert text.startswith('﻿')
+    return list(csv.reader(io.StringIO(text[1:])))
+
+
+def test_export_uses_list_filters(client, histories):
+    response = client.get('/service-histories/export.csv', query_string={'date_from': '2025-07-02',
+                                                                         'date_to': '2025-07-04'})
+
+    assert response.status_code == 200
+    assert 'lich_su_dich_vu_20250702_20250704.csv' in response.headers['Content-Disposition']
+    header, *rows = read_csv(response.data)
+    assert header[0] == 'Mã'
+    assert [row[0] for row in rows] == [str(history.id) for history in histories[1:4]]
+    assert rows[0] == [str(histories[1].id), to_local_datetime(histories[1].service_date).strftime('%Y-%m-%d %H:%M'),
+                       'Đặng Thị Hoa', '0977000111', 'Uốn tóc', 'Lý Văn Phúc', '300002', 'Tiền mặt',
+                       'ghi chú, có dấu phẩy']
+
+
+def test_export_is_generated_in_batches(monkeypatch, histories):
+    monkeypatch.setattr('history_export.EXPORT_BATCH_SIZE', 2)
+
+    chunks = list(iter_history_csv())
+
+    # Mỗi khối gồm tối đa EXPORT_BATCH_SIZE dòng (khối đầu có thêm dòng tiêu đề)
+    assert [len(read_csv(chunks[0])), *(chunk.decode('utf-8').count('\n') for chunk in chunks[1:])] == [3, 2, 1]
+
+
+def test_export_is_gzipped_when_accepted(client, histories):
+    response = client.get('/service-histories/export.csv', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert [row[0] for row in read_csv(gzip.decompress(response.data))[1:]] == \
+        [str(history.id) for history in histories]
+
+
+def test_export_rejects_invalid_date(client, histories):
+    response = client.get('/service-histories/export.csv', query_string={'date_from': '07/2025'})
+
+    assert response.status_code == 302
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+import pytest
+from models import db, Customer, Service, Employee, ServiceHistory, ServiceHistoryImage
+
+
+def add_histories(customer, service, employee, count, start=0):
+    for index in range(start, start + count):
+        history = ServiceHistory(customer=customer, service=service, employee=employee,
+                                 service_date=datetime(2025, 1, 1) + timedelta(days=index), price=100000,
+                                 payment_method='Tiền mặt')
+        for number in range(2):
+            key = f'{index:032x}{number}.jpg'
+            history.images.append(ServiceHistoryImage(image_url=f'/uploads/{key}', storage_backend='local',
+                                                      storage_key=key, width=800, height=600))
+        db.session.add(history)
+    db.session.commit()
+
+
+@pytest.mark.parametrize('endpoint', ['service_history_list', 'customer_view', 'employee_view', 'service_view'])
+def test_listing_query_count_does_not_depend_on_rows(app, client, count_queries, endpoint):
+    customer = Customer(name='Nguyễn Thị Lan', phone='0901234567')
+    service = Service(name='Cắt tóc nữ')
+    employee = Employee(name='Trần Văn Nam')
+    db.session.add_all([customer, service, employee])
+    db.session.commit()
+    url = {
+        'service_history_list': '/service-histories',
+        'customer_view': f'/customers/{customer.id}/view',
+        'employee_view': f'/employees/{employee.id}/view',
+        'service_view': f'/services/{service.id}/view',
+    }[endpoint]
+
+    add_histories(customer, service, employee, 1)
+    # Request đầu tiên nạp cache (cài đặt, bộ đếm) nên không được tính
+    client.get(url)
+    one_row = count_queries(client.get, url)
+
+    rows = app.config['ITEMS_PER_PAGE']
+    add_histories(customer, service, employee, rows - 1, start=1)
+    client.get(url)
+    many_rows = count_queries(client.get, url)
+
+    assert one_row == many_rows
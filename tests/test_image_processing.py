@@ -0,0 +1,79 @@
+import io
+import os
+from datetime import datetime
+import pytest
+from PIL import Image
+from image_processing import ImageProcessingError, process_image
+from models import db, Customer, Service, Employee, ServiceHistory, ServiceHistoryImage
+from storage import get_storage
+
+VARIANTS = {'thumb': 200, 'medium': 800}
+
+
+def encode(image, fmt='JPEG', **options):
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **options)
+    return io.BytesIO(buffer.getvalue())
+
+
+def test_large_photo_is_rotated_resized_and_stripped():
+    photo = Image.new('RGB', (4000, 3000), (200, 10, 10))
+    exif = Image.Exif()
+    exif[0x0112] = 6   # Orientation: xoay 90 độ
+    exif[0x010F] = 'Máy ảnh'
+
+    main, variants = process_image(encode(photo, exif=exif.tobytes()), 1600, 82, VARIANTS)
+
+    result = Image.open(io.BytesIO(main.data))
+    assert (main.width, main.height) == result.size == (1200, 1600)
+    assert not result.getexif()
+    assert {name: (variant.width, variant.height) for name, variant in variants.items()} == \
+        {'thumb': (150, 200), 'medium': (600, 800)}
+
+
+def test_small_transparent_png_is_not_enlarged():
+    icon = Image.new('RGBA', (120, 80), (0, 0, 0, 0))
+
+    main, variants = process_image(encode(icon, 'PNG'), 1600, 82, VARIANTS)
+
+    result = Image.open(io.BytesIO(main.data))
+    assert (result.format, result.size) == ('JPEG', (120, 80))
+    # Phần trong suốt được phủ nền trắng
+    assert all(channel > 245 for channel in result.getpixel((60, 40)))
+    assert (variants['thumb'].width, variants['thumb'].height) == (120, 80)
+
+
+def test_invalid_file_is_rejected():
+    with pytest.raises(ImageProcessingError):
+        process_image(io.BytesIO(b'not an image'), 1600, 82, VARIANTS)
+
+
+def test_image_falls_back_to_original_without_variants():
+    image = ServiceHistoryImage(image_url='https://example.com/a.jpg',
+                                variants={'thumb': {'url': 'https://example.com/a_thumb.jpg', 'key': None,
+                                                    'width': 200, 'height': 150}})
+    legacy = ServiceHistoryImage(image_url='https://example.com/b.jpg')
+
+    assert image.variant_url('thumb') == 'https://example.com/a_thumb.jpg'
+    assert legacy.variant_url('thumb') == 'https://example.com/b.jpg'
+
+
+def test_local_upload_stores_variant_files(app, client):
+    storage = get_storage(app, 'local')
+    storage.folder = app.config['UPLOAD_FOLDER']
+    history = ServiceHistory(customer=Customer(name='Tô Thị Lành', phone='0911222333'),
+                             service=Service(name='Nối mi'), employee=Employee(name='Quách Văn Lộc'),
+                             service_date=datetime(2025, 10, 1, 9), price=250000, payment_method='Tiền mặt')
+    db.session.add(history)
+    db.session.commit()
+
+    response = client.post(f'/service-histories/{history.id}/upload-images',
+                           data={'images': [(encode(Image.new('RGB', (2400, 1200), (10, 200, 10))), 'a.jpg')]},
+                           content_type='multipart/form-data')
+
+    assert response.json['results'][0]['success'] is True
+    image = history.images[0]
+    assert (image.width, image.height) == (1600, 800)
+    assert sorted(image.variants) == sorted(VARIANTS)
+    for key in [image.storage_key] + [variant['key'] for variant in image.variants.values()]:
+        assert os.path.exists(os.path.join(storage.folder, key))
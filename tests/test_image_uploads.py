@@ -0,0 +1,126 @@
+import io
+import time
+from datetime import datetime
+import cloudinary
+import pytest
+from models import db, Customer, Service, Employee, ServiceHistory
+from storage import CloudinaryStorage, content_hash
+from fakes import UPLOAD_DELAY, CloudinaryStub, FakeStorage, jpeg
+
+
+@pytest.fixture
+def history(app):
+    history = ServiceHistory(customer=Customer(name='Lê Thị Mai', phone='0912345678'),
+                             service=Service(name='Sơn gel'), employee=Employee(name='Phạm Minh Đức'),
+                             service_date=datetime(2025, 3, 1), price=200000, payment_method='Chuyển khoản')
+    db.session.add(history)
+    db.session.commit()
+    app.config.update(UPLOAD_RETRY_BACKOFF=0.01)
+    return history
+
+
+def upload(client, history, files):
+    data = {'images': [(io.BytesIO(content), filename) for filename, content in files]}
+    return client.post(f'/service-histories/{history.id}/upload-images', data=data,
+                       content_type='multipart/form-data')
+
+
+def test_uploads_run_concurrently(monkeypatch, client, history):
+    storage = FakeStorage()
+    monkeypatch.setattr('app.get_storage', lambda app, name=None: storage)
+    files = [(f'{red}.jpg', jpeg(red)) for red in (0, 80, 160, 240)]
+
+    started = time.perf_counter()
+    response = upload(client, history, files)
+    elapsed = time.perf_counter() - started
+
+    assert response.status_code == 200
+    assert len(storage.calls) == len(files)
+    # Gần bằng lần tải chậm nhất, không phải tổng thời gian của cả bốn ảnh
+    assert elapsed < UPLOAD_DELAY * 2
+
+
+def test_transient_storage_error_is_retried(monkeypatch, client, history):
+    storage = FakeStorage(fail_once={80})
+    monkeypatch.setattr('app.get_storage', lambda app, name=None: storage)
+
+    response = upload(client, history, [('retry.jpg', jpeg(80))])
+
+    assert response.status_code == 200
+    assert response.json['results'] == [{'filename': 'retry.jpg', 'success': True,
+                                         'id': response.json['new_images'][0]['id']}]
+    assert storage.calls == [80, 80]
+
+
+def test_results_follow_submission_order(monkeypatch, client, history):
+    storage = FakeStorage(fail_always={160})
+    monkeypatch.setattr('app.get_storage', lambda app, name=None: storage)
+    files = [
+        ('first.jpg', jpeg(0)),
+        ('notes.txt', b'not an image'),
+        ('broken.jpg', b'not an image either'),
+        ('failing.jpg', jpeg(160)),
+        ('last.jpg', jpeg(240)),
+    ]
+
+    response = upload(client, history, files)
+
+    assert response.status_code == 200
+    results = response.json['results']
+    assert [result['filename'] for result in results] == [filename for filename, _ in files]
+    assert [result['success'] for result in results] == [True, False, False, False, True]
+    assert '503' in results[3]['message']
+    assert len(history.images) == 2
+
+
+@pytest.fixture
+def cloudinary_stub(monkeypatch, app):
+    # CloudinaryStorage thật (SDK, urllib3, timeout) nhưng gửi tới máy chủ HTTP giả trên máy
+    config = cloudinary.config()
+    with CloudinaryStub() as stub:
+        for name, value in (('cloud_name', 'test'), ('api_key', 'key'), ('api_secret', 'secret'),
+                            ('upload_prefix', stub.url)):
+            monkeypatch.setattr(config, name, value, raising=False)
+        storage = CloudinaryStorage('salon_test', timeout=1)
+        monkeypatch.setattr('app.get_storage', lambda app, name=None: storage)
+        monkeypatch.setitem(app.config, 'UPLOAD_TIMEOUT', 1)
+        yield stub
+
+
+def test_http_error_from_storage_is_retried(client, history, cloudinary_stub):
+    digest = content_hash(jpeg(80))
+    cloudinary_stub.script[digest] = ['error', 'ok']
+
+    response = upload(client, history, [('retry.jpg', jpeg(80))])
+
+    assert [result['success'] for result in response.json['results']] == [True]
+    assert cloudinary_stub.requests == [digest, digest]
+    assert history.images[0].cloudinary_public_id == digest
+
+
+def test_http_errors_are_reported_after_retries(monkeypatch, app, client, history, cloudinary_stub):
+    monkeypatch.setitem(app.config, 'UPLOAD_RETRIES', 1)
+    digest = content_hash(jpeg(80))
+    cloudinary_stub.script[digest] = ['error']
+
+    response = upload(client, history, [('down.jpg', jpeg(80))])
+
+    assert response.json['results'][0]['success'] is False
+    assert '503' in response.json['results'][0]['message']
+    assert cloudinary_stub.requests == [digest, digest]
+
+
+def test_slow_storage_times_out(monkeypatch, app, client, history, cloudinary_stub):
+    monkeypatch.setitem(app.config, 'UPLOAD_RETRIES', 0)
+    slow, fast = content_hash(jpeg(80)), content_hash(jpeg(160))
+    cloudinary_stub.script[slow] = [5]
+
+    started = time.perf_counter()
+    response = upload(client, history, [('slow.jpg', jpeg(80)), ('fast.jpg', jpeg(160))])
+    elapsed = time.perf_counter() - started
+
+    # Request trả về sau khoảng UPLOAD_TIMEOUT, không chờ máy chủ chậm trả lời
+    assert elapsed < 3
+    assert [result['success'] for result in response.json['results']] == [False, True]
+    assert sorted(cloudinary_stub.requests) == sorted([slow, fast])
+    assert [image.cloudinary_public_id for image in history.images] == [fast]
@@ -0,0 +1,78 @@
+import os
+from datetime import datetime
+import pytest
+import image_uploads
+import migrate_to_cloudinary
+from models import db, Customer, Service, Employee, ServiceHistory, ServiceHistoryImage
+from image_uploads import store_image, upload_options
+from storage import StoredObject, get_storage, content_hash
+from fakes import jpeg
+
+
+class RecordingCloudinary:
+    """Backend giả tên 'cloudinary': ghi lại bytes được tải lên, biến thể là URL biến đổi"""
+
+    name = 'cloudinary'
+
+    def __init__(self):
+        self.puts = {}
+
+    def put(self, name, data, content_type):
+        key = os.path.splitext(name)[0]
+        self.puts[key] = data
+        return StoredObject(key, f'https://res.cloudinary.com/test/image/upload/{key}.jpg')
+
+    def variant_url(self, key, width, height):
+        return f'https://res.cloudinary.com/test/image/upload/w_{width},h_{height}/{key}.jpg'
+
+
+@pytest.fixture
+def history(app):
+    history = ServiceHistory(customer=Customer(name='Phan Thị Thảo', phone='0944000222'),
+                             service=Service(name='Gội đầu'), employee=Employee(name='Châu Văn Tú'),
+                             service_date=datetime(2025, 9, 1, 10), price=70000, payment_method='Tiền mặt')
+    db.session.add(history)
+    db.session.commit()
+    return history
+
+
+def test_normalized_images_are_uploaded_unchanged(monkeypatch, app, history, tmp_path):
+    local = get_storage(app, 'local')
+    local.folder = app.config['UPLOAD_FOLDER']
+    original = jpeg(80)
+    digest = content_hash(original)
+    columns = store_image(local, original, digest, upload_options(app.config))
+    history.images.append(ServiceHistoryImage(**columns))
+    # Ảnh cũ: tên file ngẫu nhiên, chưa chuẩn hóa, chưa có mã băm
+    legacy = jpeg(160)
+    with open(os.path.join(local.folder, 'legacy-upload.jpg'), 'wb') as file:
+        file.write(legacy)
+    history.images.append(ServiceHistoryImage(image_url='/uploads/legacy-upload.jpg', storage_backend='local',
+                                              storage_key='legacy-upload.jpg'))
+    db.session.commit()
+    with open(os.path.join(local.folder, columns['storage_key']), 'rb') as file:
+        stored_bytes = file.read()
+
+    cloudinary = RecordingCloudinary()
+    monkeypatch.setattr(migrate_to_cloudinary, 'get_storage', lambda app, name=None: cloudinary)
+    processed = []
+    real_process_image = image_uploads.process_image
+    monkeypatch.setattr(image_uploads, 'process_image',
+                        lambda *args: processed.append(args) or real_process_image(*args))
+
+    migrate_to_cloudinary.migrate_images(batch_size=10, workers=2, dry_run=False,
+                                         checkpoint_path=str(tmp_path / 'checkpoint.json'), restart=True,
+                                         keep_files=False)
+
+    # Chỉ ảnh cũ được xử lý lại; ảnh đã chuẩn hóa giữ nguyên bytes, mã băm, kích thước
+    assert len(processed) == 1
+    assert cloudinary.puts[digest] == stored_bytes
+    migrated = ServiceHistoryImage.query.filter_by(content_hash=digest).one()
+    assert (migrated.storage_backend, migrated.storage_key, migrated.cloudinary_public_id) == \
+        ('cloudinary', digest, digest)
+    assert (migrated.width, migrated.height, migrated.byte_size) == \
+        (columns['width'], columns['height'], columns['byte_size'])
+    assert set(migrated.variants) == set(columns['variants'])
+    assert all(variant['key'] is None and 'w_' in variant['url'] for variant in migrated.variants.values())
+    assert ServiceHistoryImage.query.filter_by(storage_backend='local').count() == 0
+    assert content_hash(legacy) in cloudinary.puts
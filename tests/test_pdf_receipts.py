@@ -0,0 +1,61 @@
+import io
+import zipfile
+from datetime import datetime
+import pytest
+from pypdf import PdfReader
+import pdf_receipts
+from models import db, Customer, Service, Employee, ServiceHistory
+
+
+@pytest.fixture
+def histories(app):
+    customer = Customer(name='Mai Thị Ngọc', phone='0966123456')
+    service = Service(name='Làm móng')
+    employee = Employee(name='Hà Văn Sơn')
+    rows = [ServiceHistory(customer=customer, service=service, employee=employee,
+                           service_date=datetime(2025, 8, 1 + index % 28, 15), price=80000,
+                           payment_method='Tiền mặt') for index in range(6)]
+    db.session.add_all(rows)
+    db.session.commit()
+    return rows
+
+
+@pytest.fixture
+def small_tasks(monkeypatch):
+    # Mỗi nhóm 2 biên nhận để có nhiều nhóm chia cho pool
+    monkeypatch.setattr(pdf_receipts, 'MIN_RECEIPTS_PER_TASK', 2)
+    yield
+    pdf_receipts.shutdown_pool()
+
+
+def test_pool_is_reused_between_exports(monkeypatch, app, client, histories, small_tasks):
+    monkeypatch.setitem(app.config, 'PDF_WORKERS', 2)
+
+    first = client.get('/service-histories/receipts', query_string={'format': 'zip'})
+    pool = pdf_receipts._pool
+    second = client.get('/service-histories/receipts')
+
+    assert pool is not None and pdf_receipts._pool is pool
+    with zipfile.ZipFile(io.BytesIO(first.data)) as archive:
+        assert sorted(archive.namelist()) == sorted(f'bien_nhan_{history.id}.pdf' for history in histories)
+    assert len(PdfReader(io.BytesIO(second.data)).pages) == len(histories)
+
+
+def test_shutdown_pool_closes_it(app, histories, small_tasks):
+    receipts = pdf_receipts.load_receipts()
+    pdf_receipts.render_receipts(receipts, workers=2)
+    pool = pdf_receipts._pool
+
+    pdf_receipts.shutdown_pool()
+
+    assert pdf_receipts._pool is None
+    with pytest.raises(RuntimeError):
+        pool.submit(print)
+
+
+def test_single_chunk_is_rendered_inline(app, histories):
+    results = pdf_receipts.render_receipts(pdf_receipts.load_receipts(), workers=4)
+
+    assert len(results) == 1
+    assert pdf_receipts._pool is None
+    assert [history_id for history_id, _, _ in results[0][1]] == [history.id for history in histories]
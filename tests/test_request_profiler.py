@@ -0,0 +1,53 @@
+from flask import Flask
+import pytest
+from models import db, Customer
+from request_profiler import init_profiler
+
+
+def make_app(tmp_path, token):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'profiler.db'}", PROFILER_ENABLED=True,
+                      PROFILER_SAMPLE_RATE=1.0, PROFILER_HISTORY=10, PROFILER_N_PLUS_ONE_THRESHOLD=5,
+                      PROFILER_TOKEN=token)
+    db.init_app(app)
+
+    @app.route('/customers')
+    def customer_list():
+        return str(Customer.query.count())
+
+    with app.app_context():
+        db.create_all()
+    init_profiler(app)
+    return app
+
+
+def test_debug_page_is_not_registered_without_token(tmp_path):
+    client = make_app(tmp_path, None).test_client()
+
+    response = client.get('/customers')
+
+    assert 'db;dur=' in response.headers['Server-Timing']
+    assert client.get('/_debug/requests?format=json').status_code == 404
+
+
+@pytest.mark.parametrize('headers, query, status', [
+    ({}, {}, 404),
+    ({}, {'token': 'sai'}, 404),
+    ({}, {'token': 'bi-mat'}, 200),
+    ({'X-Profiler-Token': 'bi-mat'}, {}, 200),
+])
+def test_debug_page_requires_token(tmp_path, headers, query, status):
+    client = make_app(tmp_path, 'bi-mat').test_client()
+
+    response = client.get('/_debug/requests', query_string=dict(query, format='json'), headers=headers)
+
+    assert response.status_code == status
+
+
+def test_recorded_path_has_no_query_string(tmp_path):
+    client = make_app(tmp_path, 'bi-mat').test_client()
+    client.get('/customers', query_string={'search': 'Nguyễn Văn A 0901234567'})
+
+    response = client.get('/_debug/requests', query_string={'format': 'json'}, headers={'X-Profiler-Token': 'bi-mat'})
+
+    assert [item['path'] for item in response.json['requests']] == ['/customers']
@@ -0,0 +1,43 @@
+import os
+from PIL import Image
+import responsive_images
+from responsive_images import RESIZED_FOLDER, _evict
+
+
+def write(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(b'x' * size)
+
+
+def test_evict_skips_in_flight_temp_files(tmp_path):
+    folder = tmp_path / RESIZED_FOLDER
+    write(str(folder / '96' / 'old.jpg'), 1000)
+    write(str(folder / '96' / 'new.jpg'), 1000)
+    temp_path = str(folder / '96' / 'other.jpg.123.456.tmp')
+    write(temp_path, 1000)
+    os.utime(folder / '96' / 'old.jpg', (1, 1))
+    os.utime(temp_path, (0, 0))
+
+    remaining = _evict(str(folder), 1500)
+
+    assert remaining == 1000
+    assert os.path.exists(temp_path)
+    assert not os.path.exists(folder / '96' / 'old.jpg')
+
+
+def test_cached_image_evicted_before_touch_is_regenerated(monkeypatch, app, client):
+    Image.new('RGB', (300, 200), 'blue').save(os.path.join(app.config['UPLOAD_FOLDER'], 'photo.jpg'), 'JPEG')
+    assert client.get('/media/96/photo.jpg').status_code == 200
+    cached = os.path.join(app.config['UPLOAD_FOLDER'], RESIZED_FOLDER, '96', 'photo.jpg')
+
+    # Một request khác dọn file khỏi cache ngay trước khi cập nhật thời gian dùng
+    def evicted(path, *args, **kwargs):
+        os.remove(path)
+        raise FileNotFoundError(path)
+    monkeypatch.setattr(responsive_images.os, 'utime', evicted)
+
+    response = client.get('/media/96/photo.jpg')
+
+    assert response.status_code == 200
+    assert os.path.exists(cached)
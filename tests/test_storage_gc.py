@@ -0,0 +1,78 @@
+import os
+import time
+from datetime import datetime, timedelta
+import pytest
+from models import db, Customer, Service, Employee, ServiceHistory, ServiceHistoryImage
+from storage import get_storage
+from storage_gc import collect_garbage, referenced_keys
+from settings_cache import load_settings
+
+
+def write(storage, name, age_hours=48):
+    path = os.path.join(storage.folder, name)
+    with open(path, 'wb') as file:
+        file.write(b'data')
+    modified = time.time() - age_hours * 3600
+    os.utime(path, (modified, modified))
+    return path
+
+
+@pytest.fixture
+def storage(app):
+    storage = get_storage(app, 'local')
+    # Backend được cache trong app; mỗi test dùng thư mục upload riêng
+    storage.folder = app.config['UPLOAD_FOLDER']
+    return storage
+
+
+@pytest.fixture
+def history(app):
+    history = ServiceHistory(customer=Customer(name='Đặng Thu Trang', phone='0977000111'),
+                             service=Service(name='Nhuộm tóc'), employee=Employee(name='Lâm Gia Bảo'),
+                             service_date=datetime(2025, 2, 14), price=500000, payment_method='Thẻ')
+    db.session.add(history)
+    db.session.commit()
+    return history
+
+
+def test_referenced_keys_include_images_variants_and_settings(storage, history):
+    settings = load_settings()
+    history.images.append(ServiceHistoryImage(
+        image_url=storage.url('a' * 64 + '.jpg'), storage_backend='local', storage_key='a' * 64 + '.jpg',
+        variants={'thumb': {'url': 'x', 'key': 'a' * 64 + '_thumb.jpg', 'width': 200, 'height': 150}}))
+    settings.company_logo_url = '/uploads/3f2a9c1e-logo.png'
+    settings.favicon_url = '/static/uploads/favicon.ico'
+    db.session.commit()
+
+    assert referenced_keys(storage) == {'a' * 64 + '.jpg', 'a' * 64 + '_thumb.jpg', '3f2a9c1e-logo.png',
+                                        'favicon.ico'}
+
+
+def test_gc_keeps_legacy_logo_and_favicon(storage, history):
+    # Logo lưu trước khi có backend lưu trữ: url_for('uploaded_file', ...) -> /uploads/<uuid>.png
+    logo = write(storage, '3f2a9c1e-logo.png')
+    favicon = write(storage, 'b81d-favicon.png')
+    orphan = write(storage, 'c' * 64 + '.jpg')
+    recent = write(storage, 'd' * 64 + '.jpg', age_hours=1)
+    settings = load_settings()
+    settings.company_logo_url = '/uploads/3f2a9c1e-logo.png'
+    settings.favicon_url = 'http://salon.example/uploads/b81d-favicon.png'
+    db.session.commit()
+
+    stats = collect_garbage(storage, timedelta(hours=24))
+
+    assert stats['scanned'] == 4
+    assert stats['referenced'] == 2
+    assert stats['recent'] == 1
+    assert stats['orphans'] == 1
+    assert os.path.exists(logo) and os.path.exists(favicon) and os.path.exists(recent)
+    assert not os.path.exists(orphan)
+
+
+def test_gc_dry_run_deletes_nothing(storage, history):
+    orphan = write(storage, 'e' * 64 + '.jpg')
+
+    stats = collect_garbage(storage, timedelta(hours=24), dry_run=True)
+
+    assert stats['orphans'] == 1
+    assert os.path.exists(orphan)
@@ -0,0 +1,70 @@
+import os
+from datetime import datetime, timedelta
+import pytest
+from models import db, Customer, Service, Employee, ServiceHistory, ServiceHistoryImage, StorageDeletion
+from storage import get_storage
+from storage_outbox import enqueue_deletions, process_deletions
+
+KEY = 'a' * 64 + '.jpg'
+THUMB = 'a' * 64 + '_thumb.jpg'
+
+
+@pytest.fixture
+def storage(app):
+    storage = get_storage(app, 'local')
+    storage.folder = app.config['UPLOAD_FOLDER']
+    for name in (KEY, THUMB):
+        storage.put(name, b'data', 'image/jpeg')
+    return storage
+
+
+def enqueue(age):
+    enqueue_deletions({('local', KEY): [KEY, THUMB]})
+    db.session.query(StorageDeletion).update({'created_at': datetime.utcnow() - age})
+    db.session.commit()
+
+
+def test_deletes_queued_objects_after_grace_period(app, storage):
+    enqueue(timedelta(seconds=app.config['OUTBOX_GRACE_PERIOD'] + 1))
+
+    assert process_deletions() == (1, 0)
+    assert not os.path.exists(os.path.join(storage.folder, KEY))
+    assert not os.path.exists(os.path.join(storage.folder, THUMB))
+    assert StorageDeletion.query.count() == 0
+
+
+def test_recent_requests_wait_for_grace_period(app, storage):
+    enqueue(timedelta(seconds=1))
+
+    assert process_deletions() == (0, 0)
+    assert os.path.exists(os.path.join(storage.folder, KEY))
+    assert StorageDeletion.query.count() == 1
+
+
+def test_object_reused_before_processing_is_kept(app, storage):
+    enqueue(timedelta(seconds=app.config['OUTBOX_GRACE_PERIOD'] + 1))
+    # Cùng ảnh được tải lên lại (khóa theo nội dung) và tham chiếu đã commit trước khi worker chạy
+    history = ServiceHistory(customer=Customer(name='Phan Thanh Sơn', phone='0966111222'),
+                             service=Service(name='Cắt tóc nam'), employee=Employee(name='Lý Kim Oanh'),
+                             service_date=datetime(2025, 6, 1), price=100000, payment_method='Tiền mặt')
+    history.images.append(ServiceHistoryImage(image_url=storage.url(KEY), storage_backend='local', storage_key=KEY))
+    db.session.add(history)
+    db.session.commit()
+
+    assert process_deletions() == (0, 0)
+    assert os.path.exists(os.path.join(storage.folder, KEY))
+    assert StorageDeletion.query.count() == 0
+
+
+def test_failed_delete_is_retried_later(monkeypatch, app, storage):
+    enqueue(timedelta(seconds=app.config['OUTBOX_GRACE_PERIOD'] + 1))
+
+    def unavailable(keys):
+        raise RuntimeError('503 Service Unavailable')
+    monkeypatch.setattr(storage, 'delete', unavailable)
+
+    assert process_deletions() == (0, 1)
+    row = StorageDeletion.query.one()
+    assert row.attempts == 1
+    assert '503' in row.last_error
+    assert row.next_attempt_at > datetime.utcnow()
@@ -0,0 +1,27 @@
+from datetime import datetime
+from models import db, Service, Employee
+
+
+def items(client, source, term):
+    response = client.get(f'/api/{source}/typeahead', query_string={'q': term})
+    assert response.status_code == 200
+    return [item['text'] for item in response.json['items']]
+
+
+def test_service_search_ignores_accents(client):
+    db.session.add_all([Service(name='Cắt tóc nam'), Service(name='Nhuộm tóc'), Service(name='Đắp mặt nạ')])
+    db.session.commit()
+
+    assert items(client, 'services', 'cat') == ['Cắt tóc nam']
+    assert items(client, 'services', 'TOC') == ['Cắt tóc nam', 'Nhuộm tóc']
+    assert items(client, 'services', 'dap') == ['Đắp mặt nạ']
+
+
+def test_every_active_employee_is_reachable_by_search(client):
+    db.session.add_all([Employee(name=f'Nguyễn Văn {index:02d}') for index in range(30)])
+    db.session.add(Employee(name='Trương Thị Ánh', archived_at=datetime(2025, 1, 1)))
+    db.session.commit()
+
+    assert len(items(client, 'employees', '')) == 20
+    assert items(client, 'employees', 'van 29') == ['Nguyễn Văn 29']
+    assert items(client, 'employees', 'anh') == []
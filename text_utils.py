@@ -0,0 +1,27 @@
+import unicodedata
+
+
+def fold_text(value):
+    """Chuẩn hóa chuỗi để tìm kiếm: bỏ dấu tiếng Việt, chữ thường, gộp khoảng trắng.
+
+    Ví dụ: 'Nguyễn  Thị Đào' -> 'nguyen thi dao'
+    """
+    if not value:
+        return ''
+    # 'đ' không tách được dấu bằng NFD nên phải thay riêng
+    value = value.replace('đ', 'd').replace('Đ', 'D')
+    value = unicodedata.normalize('NFD', value)
+    value = ''.join(ch for ch in value if not unicodedata.combining(ch))
+    return ' '.join(value.lower().split())
+
+
+def digits_only(value):
+    """Chỉ giữ lại chữ số, dùng cho số điện thoại. Ví dụ: '090 123-4567' -> '0901234567'"""
+    if not value:
+        return ''
+    return ''.join(ch for ch in value if ch.isdigit())
+
+
+def escape_like(value):
+    """Thoát các ký tự đặc biệt của LIKE (dùng kèm escape='\\\\')"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
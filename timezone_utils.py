@@ -0,0 +1,123 @@
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+from sqlalchemy import Date
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from config import Config
+
+
+def salon_timezone():
+    """Múi giờ của salon (Config.TIMEZONE)"""
+    return ZoneInfo(Config.TIMEZONE)
+
+
+def storage_timezone():
+    """Múi giờ của các giá trị service_date lưu trong DB"""
+    return ZoneInfo(Config.SERVICE_DATE_TIMEZONE)
+
+
+def salon_today():
+    """Ngày hôm nay theo giờ salon"""
+    return datetime.now(salon_timezone()).date()
+
+
+def local_day_start(day):
+    """Thời điểm 00:00 của ngày `day` theo giờ salon, quy về giờ lưu trong DB"""
+    local = datetime.combine(day, time.min, tzinfo=salon_timezone())
+    return local.astimezone(storage_timezone()).replace(tzinfo=None)
+
+
+def _storage_offset_minutes():
+    """Độ lệch (phút) giữa giờ salon và giờ lưu trong DB tại thời điểm hiện tại"""
+    now = datetime.now(salon_timezone())
+    offset = now.utcoffset() - now.astimezone(storage_timezone()).utcoffset()
+    return int(offset.total_seconds() // 60)
+
+
+class local_date(FunctionElement):
+    """Ngày theo giờ salon của một cột DateTime, tính ngay trong câu SQL"""
+    type = Date()
+    name = 'local_date'
+    inherit_cache = True
+
+
+@compiles(local_date, 'postgresql')
+def _local_date_postgresql(element, compiler, **kw):
+    column = compiler.process(element.clauses, **kw)
+    if Config.SERVICE_DATE_TIMEZONE == Config.TIMEZONE:
+        return f"CAST({column} AS DATE)"
+    return (f"CAST(timezone('{Config.TIMEZONE}', "
+            f"timezone('{Config.SERVICE_DATE_TIMEZONE}', {column})) AS DATE)")
+
+
+@compiles(local_date)
+def _local_date_default(element, compiler, **kw):
+    # SQLite không có dữ liệu múi giờ nên dùng độ lệch cố định hiện tại
+    column = compiler.process(element.clauses, **kw)
+    offset = _storage_offset_minutes()
+    if not offset:
+        return f"date({column})"
+    return f"date({column}, '{offset:+d} minutes')"
+
+
+def to_local_date(value):
+    """Ngày theo giờ salon của một giá trị service_date lưu trong DB (bản Python của local_date)"""
+    return value.replace(tzinfo=storage_timezone()).astimezone(salon_timezone()).date()
+
+
+BUCKET_GRANULARITIES = ('day', 'week', 'month')
+
+
+class date_bucket(FunctionElement):
+    """Ngày bắt đầu của kỳ (day/week/month) chứa một cột Date; tuần bắt đầu từ thứ Hai (ISO)"""
+    type = Date()
+    name = 'date_bucket'
+    # granularity không nằm trong khóa cache của SQLAlchemy nên không cache câu SQL đã biên dịch
+    inherit_cache = False
+
+    def __init__(self, granularity, column):
+        if granularity not in BUCKET_GRANULARITIES:
+            raise ValueError(f'Kỳ không hợp lệ: {granularity}')
+        self.granularity = granularity
+        super().__init__(column)
+
+
+@compiles(date_bucket, 'postgresql')
+def _date_bucket_postgresql(element, compiler, **kw):
+    column = compiler.process(element.clauses, **kw)
+    if element.granularity == 'day':
+        return column
+    return f"CAST(date_trunc('{element.granularity}', {column}) AS DATE)"
+
+
+@compiles(date_bucket)
+def _date_bucket_default(element, compiler, **kw):
+    column = compiler.process(element.clauses, **kw)
+    if element.granularity == 'day':
+        return f"date({column})"
+    if element.granularity == 'week':
+        return f"date({column}, '-6 days', 'weekday 1')"
+    return f"date({column}, 'start of month')"
+
+
+def bucket_start(granularity, day):
+    """Bản Python của date_bucket"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket_start(granularity, start):
+    """Ngày bắt đầu của kỳ kế tiếp"""
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    if granularity == 'month':
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def to_local_datetime(value):
+    """Giờ salon (không kèm múi giờ) của một giá trị service_date lưu trong DB"""
+    return value.replace(tzinfo=storage_timezone()).astimezone(salon_timezone()).replace(tzinfo=None)
@@ -0,0 +1,38 @@
+from models import Customer, Service, Employee
+from customer_search import search_customers
+from text_utils import fold_text
+
+# Số kết quả mặc định và tối đa cho một lần gợi ý
+TYPEAHEAD_LIMIT = 20
+TYPEAHEAD_MAX_LIMIT = 50
+
+
+def typeahead_customers(term, limit=TYPEAHEAD_LIMIT):
+    """Gợi ý khách hàng theo tên (không dấu) hoặc số điện thoại, dùng index trigram của customer_search"""
+    rows = search_customers(term or '').with_entities(Customer.id, Customer.name, Customer.phone).limit(limit)
+    return [{'id': row.id, 'text': row.name, 'phone': row.phone} for row in rows]
+
+
+def _typeahead_by_name(model, term, limit, *criteria):
+    # Bảng dịch vụ và nhân viên chỉ vài chục dòng: so khớp tên không dấu ngay trong Python
+    # (cùng hàm fold_text với Customer.search_name) thay vì LIKE phân biệt dấu trong SQL
+    rows = model.query.with_entities(model.id, model.name).filter(*criteria).order_by(model.name)
+    folded_term = fold_text((term or '').strip())
+    matches = [row for row in rows if folded_term in fold_text(row.name)]
+    return [{'id': row.id, 'text': row.name} for row in matches[:limit]]
+
+
+def typeahead_services(term, limit=TYPEAHEAD_LIMIT):
+    return _typeahead_by_name(Service, term, limit)
+
+
+def typeahead_employees(term, limit=TYPEAHEAD_LIMIT):
+    # Nhân viên đã nghỉ việc không được gợi ý cho lịch sử mới
+    return _typeahead_by_name(Employee, term, limit, Employee.archived_at.is_(None))
+
+
+TYPEAHEAD_SOURCES = {
+    'customers': typeahead_customers,
+    'services': typeahead_services,
+    'employees': typeahead_employees,
+}